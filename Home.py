@@ -1,4 +1,7 @@
 import streamlit as st
+import pandas as pd
+from common.memo import get_transform_cache
+from common.warmup import start_cache_warmer
 
 st.set_page_config(page_title="Home", page_icon="📊", initial_sidebar_state="collapsed")
 
@@ -49,6 +52,8 @@ def create_button(button_name, page_path):
 def main():
     st.title("Home Page")
 
+    warmer = start_cache_warmer()
+
     # Web Analytics Pages
     with st.expander("Web Analytics Pages", expanded=True):
         create_button("Web App All Users", "pages/7_WebApp_All_Users.py")
@@ -62,5 +67,13 @@ def main():
         create_button("New User Onboarding", "pages/2_NewUser_App_Onboarding_Journey.py")
         create_button("Set Goal Dashboard","pages/Set_Goal_Dashboard.py")
 
+    # Background refresh of every page's default query
+    with st.expander("Cache Warm-up", expanded=False):
+        st.dataframe(pd.DataFrame(warmer.snapshot()), use_container_width=True, hide_index=True)
+
+    # Memoized page tables: entries, hits and misses per page
+    with st.expander("Transform Cache", expanded=False):
+        st.dataframe(pd.DataFrame(get_transform_cache().snapshot()), use_container_width=True, hide_index=True)
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,342 @@
+import argparse
+import json
+import logging
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from common.categories import CATEGORY_ENCODING, frame_bytes, normalize_frame
+from common.data_access import to_frame
+from common.engine import ANALYTICS_ENGINE, ENGINE_MIN_ROWS, ENGINE_THREADS
+from common.funnels import EXPLORE_COLUMNS, NEW_USER_COLUMNS, TOTAL_USERS_COLUMNS
+from common.ordered_funnel import STEP_WINDOW_SECONDS
+from common.row_index import RowIndex
+from common.synthetic import RESULT_KINDS, result_table
+from common.transforms import (
+    distinct_users_pivot,
+    explore_journey_table,
+    filter_events,
+    filter_rows,
+    goal_table,
+    latest_goals,
+    new_user_funnel,
+    new_user_ordered_funnel,
+    percentage_table_style,
+    process_scroll_data,
+    striped_table_style,
+    total_users_funnel,
+    watch_duration_histogram,
+    webapp_event_pivot,
+)
+
+# Times every page's post-query pipeline (common.transforms) on synthetic
+# query results (common.synthetic.result_table) of growing size, step by
+# step, with the peak memory each step allocates. Run from the repository
+# root:
+#
+#   python -m benchmarks.page_pipelines --rows 100k,1M,10M,50M
+#   python -m benchmarks.page_pipelines --compare benchmarks/results/<commit>.json
+#   DASHBOARD_ENGINE=duckdb python -m benchmarks.page_pipelines --output duckdb.json
+#   python -m benchmarks.page_pipelines --no-row-index --output isin.json
+#
+# Results are written to benchmarks/results/<commit>.json together with the
+# commit, library versions and data parameters, so runs on two commits (with
+# the same parameters, on the same machine) can be compared step by step.
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+ROW_SUFFIXES = {"k": 1_000, "m": 1_000_000}
+
+WEBAPP_COLUMNS = ['home_page_view', 'Open_App_Appstore', 'Open_App_Playstore',
+                  'Open_App_Yes_But_Kaise', 'Open_App_Haan_Dost_Hain',
+                  'Open_App_Nudge_1', 'Open_App_Nudge_2', 'Open_App_Nudge_Floating',
+                  'Open_App_Whatsapp_Share_App_With_Friends']
+SCROLL_FORMATS = {
+    'user_count': '{:,.0f}', 'interacted_users': '{:,.0f}', 'bounce_percent': '{:.2f}%',
+    **{f'percent_scrolled_{percent}': '{:.2f}%' for percent in [20, 40, 60, 80, 100]},
+}
+
+
+def parse_rows(text):
+    sizes = []
+    for size in text.split(","):
+        size = size.strip().lower()
+        multiplier = ROW_SUFFIXES.get(size[-1:], 1)
+        sizes.append(int(float(size.rstrip("km")) * multiplier))
+    return sizes
+
+
+# The first half (at least one) of each column's values, as a user picking
+# filters would
+def half_selection(df, columns):
+    return {column: sorted(df[column].dropna().unique())[:max(1, df[column].nunique() // 2)] for column in columns}
+
+
+def set_dates(df, column, format=None):
+    df[column] = pd.to_datetime(df[column], format=format)
+    return df
+
+
+# Each page's pipeline as (step, function) pairs; every function takes the
+# previous step's output. Filter steps use `index` (the dataset's row index,
+# built after the dates step) when given.
+def new_user_onboarding_steps(selection, index=None):
+    def ordered_funnel(df):
+        new_user_ordered_funnel(df, STEP_WINDOW_SECONDS)
+        return df
+
+    return [
+        ("dates", lambda df: set_dates(df, 'event_date', '%Y%m%d')),
+        ("filter_chain", lambda df: filter_rows(df, selection, index)),
+        ("ordered_funnel", ordered_funnel),
+        ("pivot_nunique", lambda df: new_user_funnel(df, NEW_USER_COLUMNS)),
+        ("style", lambda df: percentage_table_style(df).to_html()),
+    ]
+
+
+def total_users_onboarding_steps(selection, index=None):
+    def prepare(df):
+        set_dates(df, 'Dates', '%Y%m%d')
+        df['App_Event'] = df['App_Event'].fillna('No Event')
+        return df
+
+    return [
+        ("dates", prepare),
+        ("pivot_nunique", lambda df: distinct_users_pivot(df, 'Dates', 'App_Event', 'User_ID')),
+        ("funnel", lambda df: total_users_funnel(df, TOTAL_USERS_COLUMNS)),
+        ("style", lambda df: percentage_table_style(df).to_html()),
+    ]
+
+
+def explore_journey_steps(selection, index=None):
+    def watch_duration(df):
+        watch_duration_histogram(df)
+        return df
+
+    return [
+        ("dates", lambda df: set_dates(df, 'event_date')),
+        ("watch_duration_histogram", watch_duration),
+        ("table", lambda df: explore_journey_table(df, EXPLORE_COLUMNS)),
+        ("style", lambda df: percentage_table_style(df).to_html()),
+    ]
+
+
+def set_goal_steps(selection, index=None):
+    return [
+        ("dates", lambda df: set_dates(df, 'event_date')),
+        ("categorize_goal", latest_goals),
+        ("table", goal_table),
+        ("style", lambda df: percentage_table_style(df, count_format='{:,.0f}').to_html()),
+    ]
+
+
+def scroll_depth_steps(selection, index=None):
+    def filter_chain(df):
+        return filter_events(df, df['Dates'].min().date(), df['Dates'].max().date(), selection, index=index)
+
+    return [
+        ("dates", lambda df: set_dates(df, 'Dates')),
+        ("filter_chain", filter_chain),
+        ("process_scroll_data", process_scroll_data),
+        ("style", lambda df: striped_table_style(df.set_index('Dates')[list(SCROLL_FORMATS)], SCROLL_FORMATS).to_html()),
+    ]
+
+
+def webapp_events_steps(selection, index=None):
+    def filter_chain(df):
+        return filter_events(df, df['Dates'].min().date(), df['Dates'].max().date(), selection, index=index)
+
+    return [
+        ("dates", lambda df: set_dates(df, 'Dates')),
+        ("filter_chain", filter_chain),
+        ("pivot_nunique", lambda df: webapp_event_pivot(df, WEBAPP_COLUMNS)),
+        ("style", lambda df: striped_table_style(df, '{:,.0f}').to_html()),
+    ]
+
+
+# kind: (steps, filter columns, date column of the row index)
+PIPELINES = {
+    'new_user_onboarding': (new_user_onboarding_steps, ['install_type', 'App_Version', 'OS_Version', 'Country', 'Region', 'City'], None),
+    'total_users_onboarding': (total_users_onboarding_steps, [], None),
+    'explore_journey': (explore_journey_steps, [], None),
+    'set_goal': (set_goal_steps, [], None),
+    'scroll_depth': (scroll_depth_steps, ['User_Type'], 'Dates'),
+    'webapp_events': (webapp_events_steps, ['Country', 'Region', 'City', 'Device', 'User_Type'], 'Dates'),
+}
+
+
+# One pass over a pipeline: seconds per step, and with `trace` the peak
+# memory (MiB) each step allocated on top of what it started with. Arrow
+# buffers are not seen by tracemalloc; NumPy and Python objects are.
+def run_pipeline(steps, df, trace=False):
+    seconds = {}
+    peaks = {}
+    data = df.copy(deep=False)
+    for name, step in steps:
+        if trace:
+            tracemalloc.start()
+            baseline = tracemalloc.get_traced_memory()[0]
+        started = time.perf_counter()
+        data = step(data)
+        seconds[name] = time.perf_counter() - started
+        if trace:
+            peaks[name] = (tracemalloc.get_traced_memory()[1] - baseline) / 2 ** 20
+            tracemalloc.stop()
+    return seconds, peaks
+
+
+def benchmark(kind, rows, repeat, data_options, row_index=True):
+    table = result_table(kind, rows, **data_options)
+    arrow_bytes = table.nbytes
+    started = time.perf_counter()
+    df = to_frame(table)
+    loaded = time.perf_counter()
+    loaded_bytes = frame_bytes(df)
+    df = normalize_frame(df)
+    normalize_seconds = time.perf_counter() - loaded
+    load_seconds = loaded - started
+    del table
+
+    make_steps, filter_columns, date_column = PIPELINES[kind]
+    selection = half_selection(df, filter_columns)
+    index = None
+    index_seconds = None
+    if row_index and filter_columns:
+        dated = make_steps(selection)[0][1](df.copy(deep=False))
+        started = time.perf_counter()
+        index = RowIndex(dated, filter_columns, date_column)
+        index_seconds = time.perf_counter() - started
+        del dated
+    steps = make_steps(selection, index)
+    timings = {name: [] for name, _ in steps}
+    for _ in range(repeat):
+        seconds, _ = run_pipeline(steps, df)
+        for name, value in seconds.items():
+            timings[name].append(value)
+    _, peaks = run_pipeline(steps, df, trace=True)
+
+    results = [{
+        "kind": kind, "rows": rows, "step": "load", "seconds_min": load_seconds,
+        "seconds_median": load_seconds, "peak_mib": None,
+        "arrow_mib": arrow_bytes / 2 ** 20, "frame_mib": loaded_bytes / 2 ** 20,
+    }, {
+        "kind": kind, "rows": rows, "step": "normalize", "seconds_min": normalize_seconds,
+        "seconds_median": normalize_seconds, "peak_mib": None,
+        "frame_mib": frame_bytes(df) / 2 ** 20,
+        "categorical_columns": [column for column in df.columns if isinstance(df[column].dtype, pd.CategoricalDtype)],
+    }]
+    if index_seconds is not None:
+        results.append({
+            "kind": kind, "rows": rows, "step": "row_index", "seconds_min": index_seconds,
+            "seconds_median": index_seconds, "peak_mib": None,
+        })
+    for name, values in timings.items():
+        results.append({
+            "kind": kind, "rows": rows, "step": name,
+            "seconds_min": min(values), "seconds_median": statistics.median(values),
+            "peak_mib": peaks[name],
+        })
+    total = sum(result["seconds_min"] for result in results[1:])
+    results.append({"kind": kind, "rows": rows, "step": "total", "seconds_min": total, "seconds_median": None, "peak_mib": max(peaks.values())})
+    return results
+
+
+def git(*args):
+    try:
+        return subprocess.run(["git", *args], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environment(data_options, repeat, row_index):
+    return {
+        "commit": git("rev-parse", "HEAD"),
+        "dirty": bool(git("status", "--porcelain", "--untracked-files=no")),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "numpy": np.__version__,
+        "pyarrow": pa.__version__,
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        "categories": CATEGORY_ENCODING,
+        "engine": {"name": ANALYTICS_ENGINE, "min_rows": ENGINE_MIN_ROWS, "threads": ENGINE_THREADS},
+        "row_index": row_index,
+        "repeat": repeat,
+        "data": {key: str(value) for key, value in data_options.items()},
+    }
+
+
+def print_results(results, baseline=None):
+    previous = {(result["kind"], result["rows"], result["step"]): result for result in (baseline or [])}
+    header = f"{'kind':<24} {'rows':>11} {'step':<26} {'min s':>9} {'peak MiB':>9} {'frame MiB':>9}"
+    print(header + ("  vs base" if baseline else ""))
+    for result in results:
+        peak = f"{result['peak_mib']:9.1f}" if result["peak_mib"] is not None else f"{'':>9}"
+        frame = f"{result['frame_mib']:9.1f}" if result.get("frame_mib") is not None else f"{'':>9}"
+        line = f"{result['kind']:<24} {result['rows']:>11,} {result['step']:<26} {result['seconds_min']:9.4f} {peak} {frame}"
+        base = previous.get((result["kind"], result["rows"], result["step"]))
+        if base and base["seconds_min"]:
+            line += f"  {result['seconds_min'] / base['seconds_min']:6.2f}x"
+        print(line)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the pages' post-query pipelines on synthetic GA4 data.")
+    parser.add_argument("--rows", default="100k,1M", help="comma-separated result sizes, e.g. 100k,1M,10M,50M")
+    parser.add_argument("--kinds", default=",".join(RESULT_KINDS), help="comma-separated pipelines to run")
+    parser.add_argument("--users", type=int, default=None, help="distinct users (default: rows / 20)")
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--cities", type=int, default=50)
+    parser.add_argument("--app-versions", type=int, default=8)
+    parser.add_argument("--step-continue-rate", type=float, default=0.9, help="chance of reaching each next funnel step")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", default=None, help="results file (default: benchmarks/results/<commit>.json)")
+    parser.add_argument("--compare", default=None, help="earlier results file to compare against")
+    parser.add_argument("--no-row-index", dest="row_index", action="store_false", help="filter without the row index, as pages did before it")
+    args = parser.parse_args(argv)
+
+    # The cached loaders warn about running outside `streamlit run`
+    logging.getLogger("streamlit").setLevel(logging.ERROR)
+    # Load the Styler templates up front so the first style step is not
+    # charged for it
+    pd.DataFrame({"warm_up": [0]}).style.to_html()
+
+    data_options = {
+        "users": args.users,
+        "days": args.days,
+        "cities": args.cities,
+        "app_versions": args.app_versions,
+        "step_continue_rate": args.step_continue_rate,
+        "seed": args.seed,
+    }
+    results = []
+    for rows in parse_rows(args.rows):
+        for kind in args.kinds.split(","):
+            results.extend(benchmark(kind.strip(), rows, args.repeat, data_options, args.row_index))
+            print(f"{kind} {rows:,} rows done", file=sys.stderr)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)["results"]
+    print_results(results, baseline)
+
+    report = {"environment": environment(data_options, args.repeat, args.row_index), "results": results}
+    output = args.output or os.path.join(RESULTS_DIR, f"{(report['environment']['commit'] or 'unknown')[:12]}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as file:
+        json.dump(report, file, indent=2)
+    print(f"Results written to {output}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+import contextlib
+import contextvars
+import os
+import threading
+
+import streamlit as st
+
+# Every query is dry-run first and refused when it would take the bytes
+# scanned by the page run that issued it over the page's budget; what is
+# left of the budget is also passed to BigQuery as maximum_bytes_billed.
+# Per-page budgets are configured as
+#   DASHBOARD_PAGE_BYTE_BUDGETS="Overview=5000000000,Set Goal Dashboard=20000000000"
+DEFAULT_BYTE_BUDGET = int(os.environ.get("DASHBOARD_BYTE_BUDGET", 50 * 1024 ** 3))
+
+
+def parse_budgets(value):
+    budgets = {}
+    for item in value.split(","):
+        if "=" in item:
+            page, budget = item.rsplit("=", 1)
+            budgets[page.strip()] = int(budget)
+    return budgets
+
+
+PAGE_BYTE_BUDGETS = parse_budgets(os.environ.get("DASHBOARD_PAGE_BYTE_BUDGETS", ""))
+
+
+class BytesBudgetExceeded(Exception):
+    pass
+
+
+# Pages load inside this block: a refused query ends the run with its message
+# instead of a traceback
+@contextlib.contextmanager
+def stop_over_budget():
+    try:
+        yield
+    except BytesBudgetExceeded as error:
+        st.error(str(error))
+        st.stop()
+
+
+def format_bytes(num_bytes):
+    for unit in ["B", "KB", "MB", "GB"]:
+        if num_bytes < 1024:
+            return f"{num_bytes:,.1f} {unit}"
+        num_bytes /= 1024
+    return f"{num_bytes:,.1f} TB"
+
+
+# Bytes estimated and processed by the BigQuery jobs one page run started,
+# plus the jobs it waited on that another session had already started.
+# Jobs run on executor threads, in parallel, so a job's estimate is reserved
+# under the lock before it starts.
+class QueryUsage:
+    def __init__(self, page, budget):
+        self.page = page
+        self.budget = budget
+        self.jobs = 0
+        self.estimated_bytes = 0
+        self.processed_bytes = 0
+        self.shared_jobs = 0
+        self.shared_bytes = 0
+        self._lock = threading.Lock()
+
+    # Reserve a job's estimate against the page budget; returns the most the
+    # job may bill
+    def reserve(self, estimated_bytes):
+        with self._lock:
+            if self.estimated_bytes + estimated_bytes > self.budget:
+                so_far = (
+                    f" on top of {format_bytes(self.estimated_bytes)} already reserved"
+                    if self.estimated_bytes else ""
+                )
+                raise BytesBudgetExceeded(
+                    f"Query for '{self.page}' would scan {format_bytes(estimated_bytes)}{so_far}, "
+                    f"over the page budget of {format_bytes(self.budget)}. Narrow the date range "
+                    f"or raise the budget in DASHBOARD_PAGE_BYTE_BUDGETS."
+                )
+            self.estimated_bytes += estimated_bytes
+            return self.budget - self.estimated_bytes + estimated_bytes
+
+    # Give back the reservation of a job that failed
+    def release(self, estimated_bytes):
+        with self._lock:
+            self.estimated_bytes -= estimated_bytes
+
+    def record(self, processed_bytes):
+        with self._lock:
+            self.jobs += 1
+            self.processed_bytes += processed_bytes or 0
+
+    # A job another session started and this run waited on
+    def record_shared(self, processed_bytes):
+        with self._lock:
+            self.shared_jobs += 1
+            self.shared_bytes += processed_bytes or 0
+
+    def summary(self):
+        shared = (
+            f"; shared {self.shared_jobs} job(s) started by other sessions, "
+            f"{format_bytes(self.shared_bytes)} processed"
+            if self.shared_jobs else ""
+        )
+        if not self.jobs:
+            if shared:
+                return "BigQuery: no bytes scanned by this page" + shared
+            return "BigQuery: served from cache, no bytes scanned"
+        return (
+            f"BigQuery: {format_bytes(self.estimated_bytes)} estimated, "
+            f"{format_bytes(self.processed_bytes)} processed in {self.jobs} job(s) "
+            f"(page budget {format_bytes(self.budget)})" + shared
+        )
+
+
+# The usage of the page run in progress. Executor tasks are submitted with a
+# copy of the caller's context, so queries running on worker threads are
+# charged to the page that started them.
+_current_usage = contextvars.ContextVar("query_usage", default=None)
+
+
+def track_page_usage(page):
+    usage = QueryUsage(page, PAGE_BYTE_BUDGETS.get(page, DEFAULT_BYTE_BUDGET))
+    _current_usage.set(usage)
+    return usage
+
+
+def current_usage():
+    usage = _current_usage.get()
+    if usage is None:
+        usage = QueryUsage("unknown page", DEFAULT_BYTE_BUDGET)
+    return usage
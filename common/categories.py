@@ -0,0 +1,148 @@
+import os
+import re
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+# Low-cardinality string columns (countries, cities, versions, event and
+# action names, devices, user types, ...) are held as categoricals: one
+# small integer code per row instead of a string, so cached frames take a
+# fraction of the memory and isin filters and group keys compare codes.
+# Categories are sorted, so every load of a column gets the same order and
+# day frames concatenate without re-encoding. Columns with missing values
+# stay strings, so pages can still fill them with a new label, and so do
+# date strings, which pages parse with pd.to_datetime (that keeps a
+# categorical a categorical).
+CATEGORY_ENCODING = os.environ.get("DASHBOARD_CATEGORIES", "on") != "off"
+CATEGORY_MAX_VALUES = int(os.environ.get("DASHBOARD_CATEGORY_MAX_VALUES", 1000))
+# Columns with more distinct values than this share of their rows stay strings
+CATEGORY_MAX_RATIO = 0.5
+# User IDs are encoded whatever their cardinality and even with missing
+# values: the categories are the dataset's user dictionary and the codes dense
+# integer user IDs, which common.distinct counts without touching a string
+IDENTITY_COLUMNS = ("user_pseudo_id", "User_ID", "beesi_user_id", "newly_loggedin_user")
+# Rows looked at first to rule out high-cardinality columns such as user IDs
+PROBE_ROWS = 100_000
+DATE_STRING = re.compile(r"^\d{4}-?\d{2}-?\d{2}$")
+
+
+def is_text(series):
+    if isinstance(series.dtype, pd.StringDtype):
+        return True
+    return series.dtype == object and pd.api.types.infer_dtype(series, skipna=True) == "string"
+
+
+def category_dtype(values):
+    return pd.CategoricalDtype(sorted(values))
+
+
+# Several series recoded to categoricals over the sorted union of their
+# categories. The categories are dictionary-encoded together in Arrow, which
+# yields the union and every series' old-to-new code mapping in one hashing
+# pass, so a user dictionary of millions of IDs is never sorted or hashed in
+# Python and the rows are only touched to remap their codes. Series that
+# are not categorical are encoded first; non-text categories take the
+# slower path through a Python set.
+def unify_categories(series_list):
+    series_list = [
+        series if isinstance(series.dtype, pd.CategoricalDtype) else series.astype("category")
+        for series in series_list
+    ]
+    dictionaries = [pa.array(series.cat.categories, from_pandas=True) for series in series_list]
+    if not all(
+        len(array) == 0 or pa.types.is_string(array.type) or pa.types.is_large_string(array.type)
+        for array in dictionaries
+    ):
+        values = set()
+        for series in series_list:
+            values.update(series.cat.categories)
+        dtype = category_dtype(values)
+        return [series.astype(dtype) for series in series_list]
+
+    encoded = pc.dictionary_encode(pa.concat_arrays([array.cast(pa.large_string()) for array in dictionaries]))
+    order = pc.array_sort_indices(encoded.dictionary).to_numpy()
+    rank = np.empty(len(order), dtype=np.int32)
+    rank[order] = np.arange(len(order), dtype=np.int32)
+    mappings = rank[encoded.indices.to_numpy()]
+    dtype = pd.CategoricalDtype(encoded.dictionary.take(order).to_pandas())
+
+    unified = []
+    offset = 0
+    for series, array in zip(series_list, dictionaries):
+        # Code -1 (missing) picks the trailing -1
+        mapping = np.append(mappings[offset:offset + len(array)], -1)
+        offset += len(array)
+        codes = mapping[series.cat.codes.to_numpy()]
+        unified.append(pd.Series(pd.Categorical.from_codes(codes, dtype=dtype), index=series.index, name=series.name))
+    return unified
+
+
+# Arrow's dictionary encoding, with the codes remapped to sorted categories;
+# None when the column has nulls, too many values or only dates (identity
+# columns are always encoded)
+def encode(series, limit, identity=False):
+    array = pa.array(series, from_pandas=True)
+    if isinstance(array, pa.ChunkedArray):
+        array = array.combine_chunks()
+    if not identity and (array.null_count or pc.count_distinct(array.slice(0, PROBE_ROWS)).as_py() > limit):
+        return None
+    encoded = pc.dictionary_encode(array)
+    dictionary = encoded.dictionary
+    if not identity and (len(dictionary) > limit or all(DATE_STRING.match(value) for value in dictionary.to_pylist())):
+        return None
+    order = pc.array_sort_indices(dictionary).to_numpy()
+    rank = np.empty(len(dictionary), dtype=np.int32)
+    rank[order] = np.arange(len(dictionary), dtype=np.int32)
+    indices = encoded.indices
+    codes = rank[pc.fill_null(indices, 0).to_numpy()]
+    if indices.null_count:
+        codes[indices.is_null().to_numpy(zero_copy_only=False)] = -1
+    dtype = pd.CategoricalDtype(dictionary.take(order).to_pandas())
+    return pd.Series(pd.Categorical.from_codes(codes, dtype=dtype), index=series.index, name=series.name)
+
+
+def normalize_frame(df):
+    if not CATEGORY_ENCODING or df.empty:
+        return df
+    limit = min(CATEGORY_MAX_VALUES, max(1, int(len(df) * CATEGORY_MAX_RATIO)))
+    encoded = {}
+    for column in df.columns:
+        series = df[column]
+        if is_text(series):
+            categorical = encode(series, limit, identity=column in IDENTITY_COLUMNS)
+            if categorical is not None:
+                encoded[column] = categorical
+    if not encoded:
+        return df
+    df = df.copy(deep=False)
+    for column, series in encoded.items():
+        df[column] = series
+    return df
+
+
+# pd.concat for frames that may encode a column with different categories
+# (or not at all, e.g. Parquet written before encoding): every frame is
+# recoded to the union of the categories first, so the result stays
+# categorical
+def concat_frames(frames, **kwargs):
+    frames = list(frames)
+    if not frames:
+        return pd.concat(frames, **kwargs)
+    for column in frames[0].columns:
+        dtypes = [frame[column].dtype for frame in frames if column in frame]
+        categorical = [dtype for dtype in dtypes if isinstance(dtype, pd.CategoricalDtype)]
+        if not categorical or (len(categorical) == len(dtypes) and all(dtype == categorical[0] for dtype in categorical)):
+            continue
+        unified = iter(unify_categories([frame[column] for frame in frames if column in frame]))
+        frames = [frame.assign(**{column: next(unified)}) if column in frame else frame for frame in frames]
+    df = pd.concat(frames, **kwargs)
+    for column in df.columns:
+        if column not in IDENTITY_COLUMNS and isinstance(df[column].dtype, pd.CategoricalDtype) and df[column].hasnans:
+            df[column] = df[column].astype(pd.StringDtype("pyarrow"))
+    return df
+
+
+def frame_bytes(df):
+    return int(df.memory_usage(deep=True).sum())
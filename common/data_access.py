@@ -0,0 +1,664 @@
+import datetime
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import pandas as pd
+import pyarrow as pa
+import requests
+import streamlit as st
+from google.auth.transport.requests import AuthorizedSession
+from google.cloud import bigquery
+from google.oauth2 import service_account
+
+from common.budget import current_usage
+from common.categories import concat_frames, frame_bytes, normalize_frame
+from common.executor import SingleFlight, gather
+from common.freshness import FreshnessChecker
+from common.options import build_option_index, counts_option_index
+from common.filters import (
+    FILTER_PUSHDOWN,
+    covers,
+    filter_options_query,
+    filter_params,
+    narrow,
+    normalize_filters,
+    stricter_filters,
+)
+from common.result_cache import make_result_store, result_key
+from common.row_index import RowIndex, frame_fingerprint
+from common.timing import current_timer
+
+# Every page's BigQuery calls go through one process-wide client, so the
+# connection pool is sized for many concurrent sessions rather than one
+HTTP_POOL_SIZE = 32
+
+# Cached results are invalidated when their source tables change (see
+# common.freshness); this expiry only applies when table metadata cannot be
+# read
+QUERY_CACHE_TTL = 3600
+QUERY_CACHE_ENTRIES = 128
+
+# Window the date filters open on; older days are only fetched when selected
+DEFAULT_LOOKBACK_DAYS = 30
+
+# GA4 keeps rewriting a daily shard for up to 72 hours after the day ends, so
+# only days older than this are persisted to disk and never re-queried
+MUTABLE_DAYS = 3
+# Bounds of the day cache: bytes of day frames held in memory, and bytes of
+# day Parquet files kept on disk; the least recently used days go first
+DAY_CACHE_MEMORY_BYTES = int(os.environ.get("DASHBOARD_DAY_CACHE_MEMORY_BYTES", 1024 ** 3))
+DAY_CACHE_MAX_BYTES = int(os.environ.get("DASHBOARD_DAY_CACHE_MAX_BYTES", 2 * 1024 ** 3))
+# Concatenated date ranges the day cache keeps, least recently used first
+DAY_CACHE_RANGES = int(os.environ.get("DASHBOARD_DAY_CACHE_RANGES", 16))
+CACHE_DIR = os.environ.get(
+    "DASHBOARD_CACHE_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".cache"),
+)
+
+
+# Which backend queries run on: "bigquery", or "fake" for the offline DuckDB
+# stand-in over a synthetic GA4 export (see common.fake_bigquery), which
+# needs no credentials
+QUERY_BACKEND = os.environ.get("DASHBOARD_BACKEND", "bigquery")
+
+
+# Parse the service account once per process instead of on every rerun
+@st.cache_resource
+def get_credentials():
+    return service_account.Credentials.from_service_account_info(
+        st.secrets["gcp_service_account"],
+        scopes=bigquery.Client.SCOPE,
+    )
+
+
+# One BigQuery client per process, backed by a pooled, keep-alive HTTP session
+@st.cache_resource
+def get_client():
+    credentials = get_credentials()
+    session = AuthorizedSession(credentials)
+    adapter = requests.adapters.HTTPAdapter(
+        pool_connections=HTTP_POOL_SIZE,
+        pool_maxsize=HTTP_POOL_SIZE,
+    )
+    session.mount("https://", adapter)
+    return bigquery.Client(
+        project=credentials.project_id,
+        credentials=credentials,
+        _http=session,
+    )
+
+
+# The Storage Read client opens a gRPC channel, so only build it the first
+# time a result is actually downloaded
+@st.cache_resource
+def get_bqstorage_client():
+    from google.cloud import bigquery_storage
+
+    return bigquery_storage.BigQueryReadClient(credentials=get_credentials())
+
+
+# Map plain Python values onto typed BigQuery query parameters
+def build_query_parameters(params):
+    query_parameters = []
+    for name, value in sorted(params.items()):
+        if isinstance(value, (list, tuple)):
+            query_parameters.append(bigquery.ArrayQueryParameter(name, "STRING", list(value)))
+        elif isinstance(value, bool):
+            query_parameters.append(bigquery.ScalarQueryParameter(name, "BOOL", value))
+        elif isinstance(value, int):
+            query_parameters.append(bigquery.ScalarQueryParameter(name, "INT64", value))
+        elif isinstance(value, datetime.date):
+            query_parameters.append(bigquery.ScalarQueryParameter(name, "DATE", value))
+        else:
+            query_parameters.append(bigquery.ScalarQueryParameter(name, "STRING", value))
+    return query_parameters
+
+
+# Strings become Arrow-backed pandas strings rather than Python objects, and
+# integers/booleans keep BigQuery's nullability
+def arrow_types_mapper(arrow_type):
+    if pa.types.is_string(arrow_type) or pa.types.is_large_string(arrow_type):
+        return pd.StringDtype("pyarrow")
+    if pa.types.is_integer(arrow_type):
+        return pd.Int64Dtype()
+    if pa.types.is_boolean(arrow_type):
+        return pd.BooleanDtype()
+    return None
+
+
+# Convert a query result in one pass without per-row Python objects
+def to_frame(table):
+    return table.to_pandas(types_mapper=arrow_types_mapper, split_blocks=True, self_destruct=True)
+
+
+# Runs the pages' queries on BigQuery. A backend answers dry runs, runs a
+# query into an Arrow table plus job statistics, and reports when each table
+# of a dataset was last modified.
+class BigQueryBackend:
+    def __init__(self):
+        self.client = get_client()
+
+    def dry_run(self, query, params=None):
+        job_config = bigquery.QueryJobConfig(
+            query_parameters=build_query_parameters(params or {}),
+            dry_run=True,
+            use_query_cache=False,
+        )
+        return self.client.query(query, job_config=job_config).total_bytes_processed or 0
+
+    # Results are read as Arrow record batches through the BigQuery Storage
+    # Read API, which downloads the result table over several streams in
+    # parallel
+    def run(self, query, params=None, maximum_bytes_billed=None):
+        started = time.perf_counter()
+        job_config = bigquery.QueryJobConfig(
+            query_parameters=build_query_parameters(params or {}),
+            maximum_bytes_billed=maximum_bytes_billed,
+        )
+        query_job = self.client.query(query, job_config=job_config)
+        rows = query_job.result()
+        job_done = time.perf_counter()
+        table = rows.to_arrow(bqstorage_client=get_bqstorage_client())
+        return table, {
+            "job_id": query_job.job_id,
+            "job_seconds": job_done - started,
+            "download_seconds": time.perf_counter() - job_done,
+            "bytes_processed": query_job.total_bytes_processed,
+            "cache_hit": query_job.cache_hit,
+        }
+
+    # One free query returning every table's last-modified time (ms)
+    def table_versions(self, project, dataset):
+        rows = self.client.query(
+            f"SELECT table_id, last_modified_time FROM `{project}.{dataset}.__TABLES__`"
+        ).result()
+        return {row.table_id: row.last_modified_time for row in rows}
+
+
+@st.cache_resource
+def get_backend():
+    if QUERY_BACKEND == "fake":
+        from common.fake_bigquery import FakeBigQueryBackend
+
+        return FakeBigQueryBackend()
+    return BigQueryBackend()
+
+
+# Bytes a query would scan, from a dry run (free, and cached per query and
+# parameters so each distinct query is only dry-run once)
+@st.cache_data(max_entries=1024)
+def estimate_bytes(query, params=None):
+    return get_backend().dry_run(query, params)
+
+
+# Queries that would take the current page run over its byte budget are
+# refused before they run. Low-cardinality columns are dictionary-encoded as
+# they are loaded (see common.categories); the timing log reports the
+# frame's memory before and after. Returns the frame and the bytes the job
+# processed.
+def execute_query(query, params=None):
+    usage = current_usage()
+    started = time.perf_counter()
+    estimated_bytes = estimate_bytes(query, params)
+    allowed_bytes = usage.reserve(estimated_bytes)
+    estimated = time.perf_counter()
+    try:
+        table, job = get_backend().run(query, params, maximum_bytes_billed=allowed_bytes)
+    except Exception:
+        usage.release(estimated_bytes)
+        raise
+    converting = time.perf_counter()
+    usage.record(job["bytes_processed"])
+    num_rows, num_bytes = table.num_rows, table.nbytes
+    df = to_frame(table)
+    loaded_bytes = frame_bytes(df)
+    df = normalize_frame(df)
+    current_timer().record_query(
+        job_id=job["job_id"],
+        dry_run_seconds=round(estimated - started, 4),
+        job_seconds=round(job["job_seconds"], 4),
+        download_seconds=round(job["download_seconds"], 4),
+        convert_seconds=round(time.perf_counter() - converting, 4),
+        rows=num_rows,
+        result_bytes=num_bytes,
+        frame_bytes=loaded_bytes,
+        normalized_bytes=frame_bytes(df),
+        bytes_processed=job["bytes_processed"],
+        cache_hit=job["cache_hit"],
+    )
+    return df, job["bytes_processed"]
+
+
+@st.cache_resource
+def get_single_flight():
+    return SingleFlight()
+
+
+# Identical queries that are started while one is already running (e.g. many
+# sessions rerunning a page right after its cache was invalidated) wait for
+# that job instead of launching their own, and count it as shared in their
+# page's usage. See get_single_flight().stats() for how many jobs were
+# suppressed.
+def execute_coalesced(query, params=None):
+    (df, processed_bytes), leader = get_single_flight().call(result_key(query, params), execute_query, query, params)
+    if not leader:
+        current_usage().record_shared(processed_bytes)
+        df = df.copy(deep=False)
+    return df
+
+
+@st.cache_resource
+def get_result_store():
+    return make_result_store(os.path.join(CACHE_DIR, "results"))
+
+
+@st.cache_resource
+def get_freshness_checker():
+    return FreshnessChecker(lambda project, dataset: get_backend().table_versions(project, dataset), QUERY_CACHE_TTL)
+
+
+# Version of the tables a query reads; cached results are keyed on it, so
+# they stay valid until one of those tables changes. Given a date range, only
+# the shards of those days count, so results over past days are not
+# invalidated by intraday updates to today's shard.
+def data_watermark(query, start_date=None, end_date=None):
+    if start_date is None:
+        return get_freshness_checker().watermark(query)
+    if end_date < start_date:
+        start_date, end_date = end_date, start_date
+    return get_freshness_checker().days_version(query, date_span(start_date, end_date))
+
+
+# Serve a whole query result from the shared on-disk result store, running
+# the query only when no process has stored it for the current watermark
+def load_query(query, params=None, watermark=None):
+    store = get_result_store()
+    key = result_key(query, params, watermark if watermark is not None else data_watermark(query))
+    frame = store.get(key)
+    if frame is None:
+        frame = execute_coalesced(query, params)
+        store.put(key, frame)
+    return frame
+
+
+@st.cache_data(max_entries=QUERY_CACHE_ENTRIES)
+def run_cached_query(query, params=None, watermark=None):
+    return load_query(query, params, watermark)
+
+
+# Submit several queries at once and collect them as they finish. `queries`
+# maps a name to either a query string or a (query, params) pair.
+def run_queries(queries):
+    tasks = {}
+    for name, query in queries.items():
+        query, params = query if isinstance(query, tuple) else (query, None)
+        tasks[name] = (load_query, (query, params))
+    return dict(gather(tasks))
+
+
+# Standard load path for every page. Queries over the events_* shards pass the
+# selected date range (and optionally their filter selections, see
+# common.filters) and are served day by day from the local day store;
+# anything else is cached whole until its source tables change. Aggregated
+# results do not carry
+# the filter columns, so they set `exact_filters` and are never narrowed
+# from a cached superset.
+def run_query(query, start_date=None, end_date=None, date_column="event_date", filters=None, exact_filters=False):
+    if start_date is None:
+        return run_cached_query(query, None, data_watermark(query))
+    return run_query_by_day(query, start_date, end_date, date_column, filters, exact_filters)
+
+
+# Option index (see common.options) of each filter dimension over the
+# selected days, taken from the unfiltered query so every option stays
+# selectable. Built once per query, days and data version, and shared by
+# every widget, rerun and session.
+def load_filter_options(query, start_date, end_date, date_column, dimensions):
+    return cached_filter_options(query, start_date, end_date, date_column, tuple(dimensions), data_watermark(query, start_date, end_date))
+
+
+@st.cache_data(max_entries=QUERY_CACHE_ENTRIES)
+def cached_filter_options(query, start_date, end_date, date_column, dimensions, watermark):
+    options_df = run_query(
+        filter_options_query(query, date_column, dimensions),
+        start_date,
+        end_date,
+        date_column,
+        {name: [] for name in dimensions},
+    )
+    return counts_option_index(options_df, dimensions)
+
+
+# Option index of a page's loaded frame, for pages that filter in pandas:
+# built from `df` once per query, days and data version
+def frame_filter_options(df, query, dimensions, start_date=None, end_date=None):
+    return cached_frame_options(df, query, start_date, end_date, tuple(dimensions), data_watermark(query, start_date, end_date))
+
+
+# `_df` is not hashed; the frame is identified by the arguments after it
+@st.cache_data(max_entries=QUERY_CACHE_ENTRIES)
+def cached_frame_options(_df, query, start_date, end_date, dimensions, watermark):
+    return build_option_index(_df, dimensions)
+
+
+# Row index (see common.row_index) of a page's loaded frame over its filter
+# dimensions and, optionally, its date column, for pages that filter in
+# pandas. Built from `df` once per query, days, data version and frame
+# fingerprint, and shared, uncopied, by every rerun and session; every load
+# of those rows has them in the same order.
+def frame_row_index(df, query, dimensions, date_column=None, start_date=None, end_date=None):
+    fingerprint = frame_fingerprint(df, [*dimensions, *([date_column] if date_column else [])])
+    return cached_row_index(df, query, start_date, end_date, tuple(dimensions), date_column, data_watermark(query, start_date, end_date), fingerprint)
+
+
+@st.cache_resource(max_entries=QUERY_CACHE_ENTRIES)
+def cached_row_index(_df, query, start_date, end_date, dimensions, date_column, watermark, fingerprint):
+    return RowIndex(_df, dimensions, date_column)
+
+
+# Parameters for the `_TABLE_SUFFIX BETWEEN @start_suffix AND @end_suffix`
+# predicate that prunes an events_* wildcard scan to the selected days
+def table_suffix_params(start_date, end_date):
+    return {
+        "start_suffix": start_date.strftime("%Y%m%d"),
+        "end_suffix": end_date.strftime("%Y%m%d"),
+    }
+
+
+def default_date_range():
+    end_date = datetime.date.today()
+    return end_date - datetime.timedelta(days=DEFAULT_LOOKBACK_DAYS - 1), end_date
+
+
+def date_span(start_date, end_date):
+    return [start_date + datetime.timedelta(days=offset) for offset in range((end_date - start_date).days + 1)]
+
+
+# Group sorted days into (first, last) runs so each gap is fetched by one query
+def contiguous_ranges(days):
+    ranges = []
+    for day in days:
+        if ranges and day - ranges[-1][1] == datetime.timedelta(days=1):
+            ranges[-1][1] = day
+        else:
+            ranges.append([day, day])
+    return [tuple(day_range) for day_range in ranges]
+
+
+# GA4 dates come back either as 'YYYYMMDD' strings or as DATE values; DATE
+# columns cast to STRING come back as 'YYYY-MM-DD'
+def row_days(dates):
+    if pd.api.types.is_string_dtype(dates):
+        iso = len(dates) > 0 and "-" in str(dates.iloc[0])
+        return pd.to_datetime(dates, format="%Y-%m-%d" if iso else "%Y%m%d").dt.date
+    return pd.to_datetime(dates).dt.date
+
+
+# Process-wide store of per-day query results, so widening the date range
+# only queries the days that are not already held. Results are kept per
+# normalized filter set, and a lookup is served by any cached result whose
+# filters cover the requested ones. Finished days are also materialized as
+# Parquet under `directory`, so they are fetched from BigQuery once and
+# survive restarts; recent days are held together with the version of their
+# shards and dropped as soon as that version changes. Frames narrowed from a
+# superset keep a row index (see common.row_index) while they are held.
+# Held frames are bounded to `memory_bytes` and the Parquet files to
+# `max_bytes`, both evicted least recently used first as ParquetResultStore
+# does: a file's mtime is its last use. The last `max_ranges` date ranges
+# served are kept concatenated, together with the day frames they were
+# built from, so a rerun over unchanged days does not concatenate again.
+class DayCache:
+    def __init__(
+        self,
+        directory,
+        mutable_days=MUTABLE_DAYS,
+        memory_bytes=DAY_CACHE_MEMORY_BYTES,
+        max_bytes=DAY_CACHE_MAX_BYTES,
+        max_ranges=DAY_CACHE_RANGES,
+    ):
+        self.directory = directory
+        self.mutable_days = mutable_days
+        self.memory_bytes = memory_bytes
+        self.max_bytes = max_bytes
+        self.max_ranges = max_ranges
+        self._frames = {}
+        self._indexes = {}
+        # (query, day, filters) -> bytes of the held frame, least recent first
+        self._recency = OrderedDict()
+        self._held_bytes = 0
+        # (query, days, filters) -> (day sources, concatenated frame)
+        self._ranges = OrderedDict()
+        self._lock = threading.Lock()
+
+    def is_finished(self, day):
+        return day < datetime.date.today() - datetime.timedelta(days=self.mutable_days)
+
+    def path(self, query, day, filters=()):
+        query_hash = hashlib.sha1(query.encode("utf-8")).hexdigest()[:16]
+        filters_hash = hashlib.sha1(repr(filters).encode("utf-8")).hexdigest()[:16] if filters else "all"
+        return os.path.join(self.directory, query_hash, filters_hash, day.strftime("%Y%m%d") + ".parquet")
+
+    # Returns (frame, filters the frame was fetched with) or None
+    def get(self, query, day, filters=(), exact=False, version=None):
+        finished = self.is_finished(day)
+        with self._lock:
+            entries = self._frames.get((query, day), {})
+            for cached_filters, (cached_version, frame) in list(entries.items()):
+                if not finished and cached_version != version:
+                    self._forget(query, day, cached_filters)
+            candidates = [
+                cached_filters for cached_filters in entries
+                if cached_filters == filters or (not exact and covers(cached_filters, filters))
+            ]
+            if candidates:
+                # Prefer the narrowest superset, i.e. the one with most filters
+                cached_filters = max(candidates, key=len)
+                self._recency.move_to_end((query, day, cached_filters))
+                return entries[cached_filters][1], cached_filters
+
+        if not finished:
+            return None
+        for cached_filters in dict.fromkeys([filters] if exact else [filters, ()]):
+            path = self.path(query, day, cached_filters)
+            try:
+                frame = pd.read_parquet(path)
+                os.utime(path)
+            except (OSError, ValueError):
+                continue
+            self._remember(query, day, cached_filters, frame)
+            return frame, cached_filters
+        return None
+
+    def put(self, query, day, filters, frame, version=None):
+        self._remember(query, day, filters, frame, version)
+        if self.is_finished(day):
+            self._write(self.path(query, day, filters), frame)
+            self.evict()
+
+    def _remember(self, query, day, filters, frame, version=None):
+        size = frame_bytes(frame)
+        with self._lock:
+            self._forget(query, day, filters)
+            self._frames.setdefault((query, day), {})[filters] = (version, frame)
+            self._recency[(query, day, filters)] = size
+            self._held_bytes += size
+            # The frame just added stays even when it alone is over budget
+            while self._held_bytes > self.memory_bytes and len(self._recency) > 1:
+                self._forget(*next(iter(self._recency)))
+
+    # Drop a held frame and its row index; the caller holds the lock
+    def _forget(self, query, day, filters):
+        entries = self._frames.get((query, day))
+        if entries is not None and entries.pop(filters, None) is not None and not entries:
+            del self._frames[(query, day)]
+        self._indexes.pop((query, day, filters), None)
+        self._held_bytes -= self._recency.pop((query, day, filters), 0)
+        for key, (sources, _) in list(self._ranges.items()):
+            if key[0] == query and any(source[:2] == (day, filters) for source in sources):
+                del self._ranges[key]
+
+    # Concatenated frame of a date range narrowed to `filters`, as last
+    # built from exactly these day frames; `sources` lists each day's
+    # (day, cached filters, held frame)
+    def range_frame(self, query, filters, sources):
+        key = (query, tuple(day for day, _, _ in sources), filters)
+        with self._lock:
+            held = self._ranges.get(key)
+            if held is None or any(
+                (day, cached_filters) != source[:2] or frame is not source[2]
+                for (day, cached_filters, frame), source in zip(sources, held[0])
+            ):
+                return None
+            self._ranges.move_to_end(key)
+            return held[1]
+
+    def put_range(self, query, filters, sources, frame):
+        key = (query, tuple(day for day, _, _ in sources), filters)
+        with self._lock:
+            # A day already evicted again would never match
+            if not all((query, day, cached_filters) in self._recency for day, cached_filters, _ in sources):
+                return
+            self._ranges[key] = (tuple(sources), frame)
+            self._ranges.move_to_end(key)
+            while len(self._ranges) > self.max_ranges:
+                self._ranges.popitem(last=False)
+
+    # Row index over `dimensions` of a frame this cache holds, built on first
+    # use and kept while the frame stays cached
+    def row_index(self, query, day, filters, frame, dimensions):
+        key = (query, day, filters)
+        dimensions = tuple(sorted(dimensions))
+        with self._lock:
+            held = self._indexes.get(key)
+            if held is None or held[0] is not frame:
+                held = self._indexes[key] = (frame, {})
+            index = held[1].get(dimensions)
+        if index is None:
+            index = RowIndex(frame, dimensions)
+            with self._lock:
+                held[1][dimensions] = index
+        return index
+
+    # Write to a temporary file first so readers never see a partial shard
+    def _write(self, path, frame):
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            frame.to_parquet(tmp_path, index=False)
+            os.replace(tmp_path, path)
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    # Keep the Parquet tree within `max_bytes`, removing the least recently
+    # used days and the directories they leave empty. Other processes may be
+    # evicting the same files, so anything already gone is skipped.
+    def evict(self):
+        with self._lock:
+            entries = []
+            for root, _, names in os.walk(self.directory):
+                for name in names:
+                    if not name.endswith(".parquet"):
+                        continue
+                    path = os.path.join(root, name)
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        continue
+                    entries.append((stat.st_mtime, stat.st_size, path))
+
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                except OSError:
+                    continue
+                total -= size
+                for directory in (os.path.dirname(path), os.path.dirname(os.path.dirname(path))):
+                    try:
+                        os.rmdir(directory)
+                    except OSError:
+                        break
+
+
+@st.cache_resource
+def get_day_cache():
+    return DayCache(os.path.join(CACHE_DIR, "days"))
+
+
+# Split a multi-day result into one frame per day, keeping empty days so
+# they are not queried again
+def split_by_day(df, date_column, days):
+    day_values = row_days(df[date_column])
+    frames = {day: df.iloc[0:0] for day in days}
+    for day, group in df.groupby(day_values, sort=False):
+        frames[day] = group.reset_index(drop=True)
+    return frames
+
+
+# Narrow a cached day to `filters` through the row index the cache keeps for it
+def narrow_day(cache, query, day, frame, cached_filters, filters, dimensions):
+    if not stricter_filters(cached_filters, filters):
+        return frame
+    return narrow(frame, cached_filters, filters, cache.row_index(query, day, cached_filters, frame, dimensions))
+
+
+# Run an events_* query for [start_date, end_date], fetching only the days
+# missing from the day cache (new days and recent days whose shards changed
+# since they were cached). The query must restrict _TABLE_SUFFIX with the @start_suffix /
+# @end_suffix parameters and declare an array parameter for every key of
+# `filters`. The returned rows always match `filters`. When every day is
+# held as it was last time, the range concatenated then is served again.
+def run_query_by_day(query, start_date, end_date, date_column, filters=None, exact_filters=False):
+    if end_date < start_date:
+        start_date, end_date = end_date, start_date
+    days = date_span(start_date, end_date)
+    cache = get_day_cache()
+    dimensions = list(filters or {})
+    wanted_filters = normalize_filters(filters)
+    fetch_filters = wanted_filters if FILTER_PUSHDOWN or exact_filters else ()
+    checker = get_freshness_checker()
+    versions = {day: checker.day_version(query, day) for day in days if not cache.is_finished(day)}
+
+    sources = {}
+    missing = []
+    for day in days:
+        cached = cache.get(query, day, fetch_filters, exact_filters, versions.get(day))
+        if cached is None:
+            missing.append(day)
+        else:
+            sources[day] = cached
+    if not missing:
+        df = cache.range_frame(query, wanted_filters, [(day, sources[day][1], sources[day][0]) for day in days])
+        if df is not None:
+            return df.copy(deep=False)
+
+    frames = {
+        day: narrow_day(cache, query, day, frame, cached_filters, wanted_filters, dimensions)
+        for day, (frame, cached_filters) in sources.items()
+    }
+
+    # Every gap in the cached days is fetched by its own job, all in parallel
+    tasks = {}
+    for range_start, range_end in contiguous_ranges(missing):
+        params = {
+            **table_suffix_params(range_start, range_end),
+            **filter_params(dimensions, fetch_filters),
+        }
+        tasks[(range_start, range_end)] = (execute_coalesced, (query, params))
+
+    for (range_start, range_end), df in gather(tasks):
+        fetched = split_by_day(df, date_column, date_span(range_start, range_end))
+        for day, frame in fetched.items():
+            cache.put(query, day, fetch_filters, frame, versions.get(day))
+            sources[day] = (frame, fetch_filters)
+            frames[day] = narrow_day(cache, query, day, frame, fetch_filters, wanted_filters, dimensions)
+
+    df = concat_frames([frames[day] for day in days], ignore_index=True)
+    cache.put_range(query, wanted_filters, [(day, sources[day][1], sources[day][0]) for day in days], df)
+    return df.copy(deep=False)
@@ -0,0 +1,68 @@
+import numpy as np
+import pandas as pd
+
+# Distinct users per group, counted on integer codes rather than strings.
+# User ID columns arrive as categoricals (see common.categories), whose codes
+# are dense integer user IDs; days and steps are coded the same way. Each
+# (group, user) pair becomes one int64 key, pd.unique drops the repeats (a
+# hash of integers, no sort) and np.bincount counts the users left per group,
+# so no Python code runs per group and no string is hashed.
+
+
+# Dense integer codes for `series` (its categorical codes when it has them),
+# -1 where it is missing, and the values the codes stand for
+def codes(series):
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        return series.cat.codes.to_numpy().astype(np.int64), series.cat.categories
+    values, uniques = pd.factorize(series, sort=True)
+    return values.astype(np.int64), pd.Index(uniques)
+
+
+# Codes for the users of `series`; with `count_missing` a missing user is
+# one more user (code len(values)), like len(x.unique()), otherwise -1
+def user_codes(series, count_missing=False):
+    users, values = codes(series)
+    if count_missing:
+        users = np.where(users < 0, len(values), users)
+    return users, len(values) + 1
+
+
+# Distinct users in each of `groups` groups: `group` and `users` are codes
+# per row, rows with a negative code in either are left out
+def count_distinct(group, users, groups, user_count):
+    keep = (group >= 0) & (users >= 0)
+    keys = pd.unique(group[keep] * user_count + users[keep])
+    return np.bincount(keys // user_count, minlength=groups)
+
+
+# Distinct `values` per `index`, like df.groupby(index)[values].nunique()
+def distinct_per(df, index, values, count_missing=False):
+    days, day_values = codes(df[index])
+    users, user_count = user_codes(df[values], count_missing)
+    present = np.bincount(days[days >= 0], minlength=len(day_values)) > 0
+    counts = count_distinct(days, users, len(day_values), user_count)
+    return pd.Series(counts[present], index=pd.Index(day_values[present], name=index), name=values)
+
+
+# Distinct `values` per (`index`, `columns`) pair, shaped like
+# pivot_table(aggfunc='nunique', fill_value=0), and per `index` alone: the
+# same (pivot_df, totals) as the engine's distinct_pivot
+def distinct_pivot(df, index, columns, values, count_missing=False):
+    days, day_values = codes(df[index])
+    steps, step_values = codes(df[columns])
+    users, user_count = user_codes(df[values], count_missing)
+
+    pairs = np.where(steps >= 0, days * len(step_values) + steps, -1)
+    pairs[days < 0] = -1
+    cells = len(day_values) * len(step_values)
+    present = np.bincount(pairs[pairs >= 0], minlength=cells).reshape(len(day_values), len(step_values)) > 0
+    counts = count_distinct(pairs, users, cells, user_count).reshape(len(day_values), len(step_values))
+
+    rows = present.any(axis=1)
+    cols = present.any(axis=0)
+    pivot_df = pd.DataFrame(
+        counts[rows][:, cols],
+        index=pd.Index(day_values[rows], name=index),
+        columns=pd.Index(step_values[cols], name=columns),
+    )
+    return pivot_df, distinct_per(df, index, values, count_missing)
@@ -0,0 +1,134 @@
+import logging
+import os
+import threading
+
+import pyarrow as pa
+import streamlit as st
+
+# Optional columnar engine for the pages' heavy transform steps (see
+# common.transforms): filtering by date range and dimensions, and distinct
+# users per day and step. With DASHBOARD_ENGINE=duckdb those steps run as
+# multi-threaded DuckDB queries over the frame's Arrow data; otherwise, for
+# small frames, or if the engine fails, pandas runs them as before.
+ANALYTICS_ENGINE = os.environ.get("DASHBOARD_ENGINE", "pandas")
+# Below this many rows pandas is faster than handing the frame to DuckDB
+ENGINE_MIN_ROWS = int(os.environ.get("DASHBOARD_ENGINE_MIN_ROWS", 200_000))
+ENGINE_THREADS = int(os.environ.get("DASHBOARD_ENGINE_THREADS", os.cpu_count() or 1))
+
+logger = logging.getLogger(__name__)
+
+
+def quote(column):
+    return '"' + column.replace('"', '""') + '"'
+
+
+class DuckDBEngine:
+    def __init__(self, threads=ENGINE_THREADS):
+        import duckdb
+
+        self._database = duckdb.connect()
+        self._database.execute(f"SET threads TO {int(threads)}")
+        self._lock = threading.Lock()
+
+    # Run `sql` over `columns` of `df`, visible to the query as `frame`. Arrow
+    # backed columns are handed over without copying.
+    def query(self, sql, df, columns, params=None):
+        table = pa.Table.from_pandas(df[list(dict.fromkeys(columns))], preserve_index=False)
+        # One cursor per query, so sessions can query concurrently
+        with self._lock:
+            cursor = self._database.cursor()
+        try:
+            cursor.register("frame", table)
+            result = cursor.execute(sql, params or {}).arrow()
+            if hasattr(result, "read_all"):
+                result = result.read_all()
+        finally:
+            cursor.close()
+        return result
+
+    # Rows within [start_date, end_date] on `date_column` (when given) whose
+    # values are among every non-empty selection in `filters`; with
+    # `missing`, null values match it. Only the boolean mask is computed
+    # here, so the rows keep their dtypes and index.
+    def filter(self, df, filters, date_column=None, start_date=None, end_date=None, missing=None):
+        conditions = []
+        params = {}
+        columns = []
+        if date_column is not None:
+            conditions.append(f"CAST({quote(date_column)} AS DATE) BETWEEN $start_date AND $end_date")
+            params.update(start_date=start_date, end_date=end_date)
+            columns.append(date_column)
+        for index, (column, selected) in enumerate(filters.items()):
+            if not selected:
+                continue
+            value = f"CAST({quote(column)} AS VARCHAR)"
+            if missing is not None:
+                value = f"COALESCE({value}, $missing)"
+                params["missing"] = missing
+            conditions.append(f"list_contains($selected_{index}, {value})")
+            params[f"selected_{index}"] = [str(option) for option in selected]
+            columns.append(column)
+        if not conditions:
+            return df
+        keep = self.query(f"SELECT COALESCE({' AND '.join(conditions)}, false) AS keep FROM frame", df, columns, params)
+        return df[keep.column("keep").to_numpy(zero_copy_only=False)]
+
+    # Distinct `values` per (`index`, `columns`) pair, shaped like
+    # pivot_table(aggfunc='nunique', fill_value=0), and per `index` alone, in
+    # one pass. `count_missing` counts a null value as one more distinct
+    # value, like len(x.unique()).
+    def distinct_pivot(self, df, index, columns, values, count_missing=False):
+        users = f"COUNT(DISTINCT {quote(values)})"
+        if count_missing:
+            users += f" + CAST(COUNT(*) > COUNT({quote(values)}) AS BIGINT)"
+        counts = self.query(f"""
+            SELECT {quote(index)} AS day, {quote(columns)} AS step, {users} AS users,
+                   GROUPING({quote(columns)}) AS total
+            FROM frame
+            WHERE {quote(index)} IS NOT NULL
+            GROUP BY GROUPING SETS (({quote(index)}, {quote(columns)}), ({quote(index)}))
+        """, df, [index, columns, values]).to_pandas()
+        pairs = counts[(counts["total"] == 0) & counts["step"].notna()]
+        pivot_df = pairs.pivot(index="day", columns="step", values="users").fillna(0).astype("int64")
+        pivot_df = pivot_df.sort_index().sort_index(axis=1)
+        pivot_df.index.name = index
+        pivot_df.columns.name = columns
+        totals = counts[counts["total"] == 1].set_index("day")["users"]
+        totals.index.name = index
+        return pivot_df, totals
+
+    # Per day: distinct users, those who scrolled at all, and those who
+    # reached each of `thresholds` (null where nobody did)
+    def scroll_depth(self, df, thresholds, today):
+        reached = ", ".join(
+            f"NULLIF(COUNT(DISTINCT User_ID) FILTER (WHERE max_scroll_percent >= {int(percent)}), 0) AS scrolled_{int(percent)}"
+            for percent in thresholds
+        )
+        counts = self.query(f"""
+            SELECT COALESCE(Dates, CAST($today AS TIMESTAMP)) AS Dates,
+                   COUNT(DISTINCT User_ID) AS user_count,
+                   COUNT(DISTINCT User_ID) FILTER (WHERE max_scroll_percent > 0) AS interacted_users,
+                   {reached}
+            FROM frame
+            GROUP BY 1
+            ORDER BY 1
+        """, df, ["Dates", "User_ID", "max_scroll_percent"], {"today": today}).to_pandas()
+        counts["interacted_users"] = counts["interacted_users"].astype("float64")
+        return counts
+
+
+@st.cache_resource
+def get_engine():
+    return DuckDBEngine()
+
+
+# Run `operation` on the engine when it is enabled and `df` is large enough
+# to be worth it; None tells the caller to use pandas
+def on_engine(df, operation, *args, **kwargs):
+    if ANALYTICS_ENGINE != "duckdb" or len(df) < ENGINE_MIN_ROWS:
+        return None
+    try:
+        return getattr(get_engine(), operation)(df, *args, **kwargs)
+    except Exception:
+        logger.warning("Engine %s failed, falling back to pandas", operation, exc_info=True)
+        return None
@@ -0,0 +1,79 @@
+import contextvars
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+
+import streamlit as st
+
+# Upper bound on BigQuery jobs one process waits on at the same time
+MAX_CONCURRENT_QUERIES = 8
+
+
+# Shared worker pool. Each worker creates its job and then blocks in the
+# client's long-polling result call, so completion is noticed as soon as
+# BigQuery reports it instead of on a fixed sleep interval.
+@st.cache_resource
+def get_query_executor():
+    return ThreadPoolExecutor(max_workers=MAX_CONCURRENT_QUERIES, thread_name_prefix="bigquery")
+
+
+# Run fn(*args) for every {key: (fn, args)} task concurrently and yield
+# (key, result) pairs in completion order. A single task runs inline, so
+# callers that are themselves running on the pool cannot starve it. Tasks
+# run in a copy of the caller's context (see common.budget).
+def gather(tasks):
+    if len(tasks) == 1:
+        (key, (fn, args)), = tasks.items()
+        yield key, fn(*args)
+        return
+    executor = get_query_executor()
+    futures = {
+        executor.submit(contextvars.copy_context().run, fn, *args): key
+        for key, (fn, args) in tasks.items()
+    }
+    for future in as_completed(futures):
+        yield futures[future], future.result()
+
+
+# Coalesces concurrent calls that share a key: the first caller runs the
+# function, later callers block on its future and get the same result (as a
+# shallow copy, so adding columns in one session does not leak into another)
+class SingleFlight:
+    def __init__(self):
+        self.executed = 0
+        self.suppressed = 0
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn, *args):
+        return self.call(key, fn, *args)[0]
+
+    # Like do, returning (result, whether this caller ran fn)
+    def call(self, key, fn, *args):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = Future()
+                self.executed += 1
+            else:
+                self.suppressed += 1
+
+        if not leader:
+            result = call.result()
+            return (result.copy(deep=False) if hasattr(result, "copy") else result), False
+
+        try:
+            result = fn(*args)
+        except BaseException as error:
+            call.set_exception(error)
+            raise
+        else:
+            call.set_result(result)
+            return result, True
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+    def stats(self):
+        with self._lock:
+            return {"executed": self.executed, "suppressed": self.suppressed, "in_flight": len(self._calls)}
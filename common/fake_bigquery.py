@@ -0,0 +1,245 @@
+import os
+import re
+import threading
+import time
+import uuid
+
+from common.hll import encode_sketch
+from common.synthetic import generate_ga4_export
+
+# Offline stand-in for BigQuery: the pages' SQL runs unchanged on an
+# in-process DuckDB database holding a synthetic GA4 export (see
+# common.synthetic), so the app and the benchmarks run without credentials.
+# Select it with DASHBOARD_BACKEND=fake; the data volume is controlled by
+# the variables below.
+FAKE_USERS = int(os.environ.get("DASHBOARD_FAKE_USERS", 5000))
+FAKE_DAYS = int(os.environ.get("DASHBOARD_FAKE_DAYS", 60))
+FAKE_SEED = int(os.environ.get("DASHBOARD_FAKE_SEED", 0))
+
+# Dry runs report this many bytes per row of every table a query reads
+ESTIMATED_ROW_BYTES = 500
+
+# `project.dataset.table` references; events_* maps to the single events
+# table, whose _TABLE_SUFFIX column plays the wildcard's pseudo column
+TABLE_REFERENCE = re.compile(r"`[\w-]+\.\w+\.(\w+)`")
+WILDCARD_REFERENCE = re.compile(r"`[\w-]+\.\w+\.(\w+)_\*`")
+FROM_UNNEST = re.compile(r"(\bFROM|,)(\s*)UNNEST\(", re.IGNORECASE)
+IN_UNNEST_PARAMETER = re.compile(r"\bIN\s+UNNEST\((@\w+)\)", re.IGNORECASE)
+ARRAY_OFFSET = re.compile(r"\[(?:SAFE_)?OFFSET\((\d+)\)\]", re.IGNORECASE)
+STRUCT_FIELD = re.compile(r"^(.*)\s+AS\s+(\w+)$", re.IGNORECASE | re.DOTALL)
+
+# BigQuery functions DuckDB lacks or names differently
+MACROS = [
+    "CREATE MACRO parse_date(format, value) AS CAST(strptime(value, format) AS DATE)",
+    "CREATE MACRO timestamp_millis(millis) AS epoch_ms(millis)",
+]
+
+
+# Index just past the parenthesis that closes the one opened before `start`,
+# skipping quoted strings
+def closing_paren(sql, start):
+    depth = 1
+    index = start
+    quote = None
+    while index < len(sql):
+        char = sql[index]
+        if quote:
+            if char == quote:
+                quote = None
+        elif char in "'\"":
+            quote = char
+        elif char in "([":
+            depth += 1
+        elif char in ")]":
+            depth -= 1
+            if depth == 0:
+                return index + 1
+        index += 1
+    raise ValueError("Unbalanced parentheses in query")
+
+
+def split_arguments(text):
+    parts = []
+    depth = 0
+    quote = None
+    current = []
+    for char in text:
+        if quote:
+            if char == quote:
+                quote = None
+        elif char in "'\"":
+            quote = char
+        elif char in "([":
+            depth += 1
+        elif char in ")]":
+            depth -= 1
+        elif char == "," and depth == 0:
+            parts.append("".join(current))
+            current = []
+            continue
+        current.append(char)
+    parts.append("".join(current))
+    return [part.strip() for part in parts]
+
+
+# Rewrite every `<name>(args)` call with `rewrite(args) -> replacement`
+def rewrite_calls(sql, name, rewrite):
+    pattern = re.compile(r"\b" + re.escape(name) + r"\(", re.IGNORECASE)
+    out = []
+    pos = 0
+    while True:
+        match = pattern.search(sql, pos)
+        if match is None:
+            out.append(sql[pos:])
+            return "".join(out)
+        end = closing_paren(sql, match.end())
+        out.append(sql[pos:match.start()])
+        out.append(rewrite(translate(sql[match.end():end - 1])))
+        pos = end
+
+
+def struct_literal(args):
+    fields = []
+    for argument in split_arguments(args):
+        expression, name = STRUCT_FIELD.match(argument).groups()
+        fields.append(f"'{name}': {expression}")
+    return "{" + ", ".join(fields) + "}"
+
+
+# UNNEST in a FROM clause yields one struct column in DuckDB; unnesting one
+# level deeper exposes the fields (key, value, ...) as columns the way
+# BigQuery does, and an alias names the struct column instead
+def rewrite_from_unnest(sql):
+    out = []
+    pos = 0
+    while True:
+        match = FROM_UNNEST.search(sql, pos)
+        if match is None:
+            out.append(sql[pos:])
+            return "".join(out)
+        end = closing_paren(sql, match.end())
+        argument = translate(sql[match.end():end - 1])
+        out.append(sql[pos:match.start()] + match.group(1) + match.group(2))
+        alias = re.match(r"\s+AS\s+(\w+)", sql[end:], re.IGNORECASE)
+        if alias:
+            out.append(f"unnest({argument}) AS unnest_{alias.group(1)}({alias.group(1)})")
+            end += alias.end()
+        else:
+            out.append(f"(SELECT unnest({argument}, max_depth := 2))")
+        pos = end
+
+
+# BigQuery Standard SQL as used by the pages -> DuckDB SQL
+def translate(sql):
+    sql = WILDCARD_REFERENCE.sub(r"\1", sql)
+    sql = TABLE_REFERENCE.sub(r'"\1"', sql)
+    sql = rewrite_calls(sql, "HLL_COUNT.INIT", lambda args: f"hll_count_init(list({args}))")
+    sql = rewrite_calls(sql, "STRUCT", struct_literal)
+    sql = IN_UNNEST_PARAMETER.sub(r"IN (SELECT unnest(\1))", sql)
+    sql = rewrite_from_unnest(sql)
+    sql = ARRAY_OFFSET.sub(lambda match: f"[{int(match.group(1)) + 1}]", sql)
+    sql = re.sub(r"\bsafe\.", "", sql, flags=re.IGNORECASE)
+    return re.sub(r"@(\w+)", r"$\1", sql)
+
+
+# The GA4 nesting, built from the flat synthetic columns
+EVENTS_TABLE = """
+CREATE TABLE events AS
+SELECT
+  event_date,
+  event_timestamp,
+  event_name,
+  user_pseudo_id,
+  platform,
+  list_filter([
+    {'key': 'screen_name', 'value': {'string_value': screen_name, 'int_value': NULL::BIGINT}},
+    {'key': 'view_id', 'value': {'string_value': view_id, 'int_value': NULL::BIGINT}},
+    {'key': 'duration', 'value': {'string_value': duration, 'int_value': NULL::BIGINT}},
+    {'key': 'source', 'value': {'string_value': source, 'int_value': NULL::BIGINT}},
+    {'key': 'goal_selected', 'value': {'string_value': goal_selected, 'int_value': NULL::BIGINT}},
+    {'key': 'beesi_user_id', 'value': {'string_value': beesi_user_id, 'int_value': NULL::BIGINT}},
+    {'key': 'is_custom_goal', 'value': {'string_value': NULL::VARCHAR, 'int_value': is_custom_goal}},
+    {'key': 'previous_first_open_count', 'value': {'string_value': NULL::VARCHAR, 'int_value': previous_first_open_count}},
+    {'key': 'percent_scrolled', 'value': {'string_value': NULL::VARCHAR, 'int_value': percent_scrolled}}
+  ], param -> param.value.string_value IS NOT NULL OR param.value.int_value IS NOT NULL) AS event_params,
+  list_filter([
+    {'key': 'beesi_user_id', 'value': {'string_value': user_beesi_user_id, 'int_value': NULL::BIGINT}},
+    {'key': 'beesi_user_gender', 'value': {'string_value': user_gender, 'int_value': NULL::BIGINT}},
+    {'key': 'beesi_user_age', 'value': {'string_value': user_age, 'int_value': NULL::BIGINT}},
+    {'key': 'beesi_user_profession', 'value': {'string_value': user_profession, 'int_value': NULL::BIGINT}},
+    {'key': 'first_open_time', 'value': {'string_value': NULL::VARCHAR, 'int_value': first_open_time}}
+  ], property -> property.value.string_value IS NOT NULL OR property.value.int_value IS NOT NULL) AS user_properties,
+  {'country': country, 'region': region, 'city': city} AS geo,
+  {'version': app_version} AS app_info,
+  {'operating_system_version': os_version} AS device,
+  -- Like GA4, the current day is only available as an intraday shard
+  CASE WHEN event_date = $today THEN 'intraday_' || event_date ELSE event_date END AS _TABLE_SUFFIX
+FROM flat_events
+"""
+
+
+# Query backend with the same interface as the BigQuery one in
+# common.data_access: dry_run, run and table_versions
+class FakeBigQueryBackend:
+    def __init__(self, users=FAKE_USERS, days=FAKE_DAYS, seed=FAKE_SEED):
+        import duckdb
+
+        frames = generate_ga4_export(users=users, days=days, seed=seed)
+        self._database = duckdb.connect()
+        self._database.create_function(
+            "hll_count_init",
+            lambda values: encode_sketch(values),
+            [duckdb.list_type("VARCHAR")],
+            "BLOB",
+        )
+        for macro in MACROS:
+            self._database.execute(macro)
+        self._database.register("flat_events", frames["events"])
+        self._database.execute(EVENTS_TABLE, {"today": frames["events"]["event_date"].max()})
+        self._database.unregister("flat_events")
+        for name in ["WebApp_UserData", "New_User"]:
+            self._database.register("frame", frames[name])
+            self._database.execute(f'CREATE TABLE "{name}" AS SELECT * FROM frame')
+            self._database.unregister("frame")
+
+        self.row_counts = {
+            name: self._database.execute(f'SELECT COUNT(*) FROM "{name}"').fetchone()[0]
+            for name in ["events", "WebApp_UserData", "New_User"]
+        }
+        self.shards = [
+            row[0] for row in self._database.execute("SELECT DISTINCT _TABLE_SUFFIX FROM events").fetchall()
+        ]
+        self.loaded_at = int(time.time() * 1000)
+        self._lock = threading.Lock()
+
+    def dry_run(self, query, params=None):
+        tables = set(WILDCARD_REFERENCE.findall(query)) | set(TABLE_REFERENCE.findall(query))
+        return sum(self.row_counts.get(name, 0) for name in tables) * ESTIMATED_ROW_BYTES
+
+    def run(self, query, params=None, maximum_bytes_billed=None):
+        started = time.perf_counter()
+        # One cursor per query: cursors share the database but not state, so
+        # executor threads can query concurrently
+        with self._lock:
+            cursor = self._database.cursor()
+        try:
+            result = cursor.execute(translate(query), params or {})
+            done = time.perf_counter()
+            table = result.arrow()
+            if hasattr(table, "read_all"):
+                table = table.read_all()
+        finally:
+            cursor.close()
+        return table, {
+            "job_id": f"fake_{uuid.uuid4().hex[:12]}",
+            "job_seconds": done - started,
+            "download_seconds": time.perf_counter() - done,
+            "bytes_processed": self.dry_run(query, params),
+            "cache_hit": False,
+        }
+
+    # Every shard and table counts as last modified when the data was generated
+    def table_versions(self, project, dataset):
+        versions = {f"events_{suffix}": self.loaded_at for suffix in self.shards}
+        versions.update({name: self.loaded_at for name in ["WebApp_UserData", "New_User"]})
+        return versions
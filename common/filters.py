@@ -0,0 +1,75 @@
+import os
+
+# Filter pushdown: pages pass every multiselect as {column: selected values}
+# and the query declares one ARRAY<STRING> parameter per column, applied as
+#   (ARRAY_LENGTH(@column) = 0 OR <expression> IN UNNEST(@column))
+# so an empty selection means "no filter". With pushdown disabled the query
+# always runs unfiltered and the selections are applied in pandas instead.
+FILTER_PUSHDOWN = os.environ.get("DASHBOARD_FILTER_PUSHDOWN", "1") != "0"
+
+
+# Hashable, order-independent form of a filter selection; empty selections
+# are dropped because they do not restrict anything
+def normalize_filters(filters):
+    return tuple(sorted(
+        (name, tuple(sorted(set(values))))
+        for name, values in (filters or {}).items()
+        if len(values)
+    ))
+
+
+# True when every row matching `filters` is contained in a result that was
+# fetched with `cached_filters`
+def covers(cached_filters, filters):
+    filters = dict(filters)
+    return all(
+        name in filters and set(filters[name]) <= set(values)
+        for name, values in cached_filters
+    )
+
+
+# Filters that are stricter than those a cached superset was fetched with
+def stricter_filters(cached_filters, filters):
+    cached_filters = dict(cached_filters)
+    return {name: values for name, values in filters if cached_filters.get(name) != values}
+
+
+# Apply in pandas only the filters that are stricter than those the cached
+# superset was fetched with, through the frame's row index when given (see
+# common.row_index)
+def narrow(df, cached_filters, filters, index=None):
+    stricter = stricter_filters(cached_filters, filters)
+    if index is not None and index.covers(df, stricter):
+        return index.filter(df, stricter)
+    for name, values in stricter.items():
+        df = df[df[name].isin(values)]
+    return df
+
+
+def filter_params(dimensions, filters):
+    filters = dict(filters)
+    return {name: list(filters.get(name, ())) for name in dimensions}
+
+
+# Wrap a page query into a per-day count of rows for every value of each
+# filter dimension. Filter widgets read their options from this small
+# aggregate, so pushed-down filters never hide the values of other options.
+def filter_options_query(query, date_column, dimensions):
+    structs = ",\n    ".join(
+        f"STRUCT('{name}' AS dimension, CAST({name} AS STRING) AS value)" for name in dimensions
+    )
+    return f"""
+SELECT
+  {date_column},
+  dimension,
+  value,
+  COUNT(*) AS row_count
+FROM ({query}) AS base,
+  UNNEST([
+    {structs}
+  ])
+GROUP BY
+  {date_column},
+  dimension,
+  value
+"""
@@ -0,0 +1,122 @@
+import os
+import re
+import threading
+import time
+
+# Cached results are versioned by the state of the tables they read rather
+# than by a fixed expiry. The state comes from the dataset's __TABLES__
+# metadata (one free query returning every table's last-modified time),
+# re-read at most once per interval.
+FRESHNESS_CHECK_INTERVAL = int(os.environ.get("DASHBOARD_FRESHNESS_INTERVAL", 60))
+
+# `project.dataset.table` references in a query; a trailing * marks a
+# wildcard over date shards such as events_*
+TABLE_REFERENCE = re.compile(r"`([\w-]+)\.(\w+)\.(\w+\*?)`")
+SHARD_SUFFIX = re.compile(r"^(intraday_)?(\d{8})$")
+# Queries restricting _TABLE_SUFFIX to the selected days; see `watermark`
+TABLE_SUFFIX_PRUNING = re.compile(r"\b_TABLE_SUFFIX\b", re.IGNORECASE)
+
+
+def source_tables(query):
+    return sorted(set(TABLE_REFERENCE.findall(query)))
+
+
+# Latest daily and intraday shard behind a wildcard, plus the newest
+# modification of any of its shards, since GA4 keeps rewriting the last
+# few daily shards after they first land. With `intraday_period` (seconds),
+# intraday modification times are rounded down to it, so a stream of
+# intraday updates moves the version at most once per period.
+def wildcard_version(tables, prefix, intraday_period=None):
+    latest = {}
+    last_modified = None
+    for table_id, modified in tables.items():
+        match = SHARD_SUFFIX.match(table_id[len(prefix):]) if table_id.startswith(prefix) else None
+        if match is None:
+            continue
+        kind = "intraday" if match.group(1) else "daily"
+        if kind == "intraday" and intraday_period and modified is not None:
+            modified = modified // (intraday_period * 1000) * intraday_period * 1000
+        if kind not in latest or match.group(2) > latest[kind][0]:
+            latest[kind] = (match.group(2), modified)
+        if modified is not None:
+            last_modified = modified if last_modified is None else max(last_modified, modified)
+    return tuple(sorted(latest.items())), last_modified
+
+
+# `table_versions(project, dataset)` returns {table_id: last modified (ms)}
+# for a dataset; see the query backends in common.data_access
+class FreshnessChecker:
+    def __init__(self, table_versions, fallback_ttl, interval=FRESHNESS_CHECK_INTERVAL):
+        self.table_versions = table_versions
+        self.fallback_ttl = fallback_ttl
+        self.interval = interval
+        self._snapshots = {}
+        self._lock = threading.Lock()
+
+    # {table_id: last modified (ms)} for a dataset, or None when the metadata
+    # cannot be read; a failed refresh keeps serving the previous snapshot,
+    # and is not retried before the next interval either way
+    def tables(self, project, dataset):
+        with self._lock:
+            checked_at, tables = self._snapshots.get((project, dataset), (None, None))
+            if checked_at is not None and time.monotonic() - checked_at < self.interval:
+                return tables
+            try:
+                tables = self.table_versions(project, dataset)
+            except Exception:
+                pass
+            self._snapshots[(project, dataset)] = (time.monotonic(), tables)
+            return tables
+
+    # Without metadata, versions fall back to the current expiry window
+    def fallback(self):
+        return ("window", int(time.time() // self.fallback_ttl))
+
+    # Version of everything a whole query reads. A wildcard query that does
+    # not prune _TABLE_SUFFIX scans every shard whenever its version moves,
+    # so intraday updates only move it once per fallback expiry window, as
+    # often as such results were refreshed before table versions.
+    def watermark(self, query):
+        sources = source_tables(query)
+        if not sources:
+            return self.fallback()
+        intraday_period = None if TABLE_SUFFIX_PRUNING.search(query) else self.fallback_ttl
+        versions = []
+        for project, dataset, table in sources:
+            tables = self.tables(project, dataset)
+            if tables is None:
+                return self.fallback()
+            if table.endswith("*"):
+                versions.append((table, wildcard_version(tables, table[:-1], intraday_period)))
+            else:
+                versions.append((table, tables.get(table)))
+        return tuple(versions)
+
+    # Version of one day of a sharded query: the modification times of that
+    # day's daily and intraday shards
+    def day_version(self, query, day):
+        suffix = day.strftime("%Y%m%d")
+        versions = []
+        for project, dataset, table in source_tables(query):
+            if not table.endswith("*"):
+                continue
+            tables = self.tables(project, dataset)
+            if tables is None:
+                return self.fallback()
+            prefix = table[:-1]
+            versions.append((table, tables.get(prefix + suffix), tables.get(prefix + "intraday_" + suffix)))
+        return tuple(versions) or self.fallback()
+
+    # Version of the given days of a sharded query: each day's shard versions,
+    # plus the versions of the unsharded tables it also reads. Unlike
+    # watermark, updates to the shards of other days leave it unchanged.
+    def days_version(self, query, days):
+        versions = [self.day_version(query, day) for day in days]
+        for project, dataset, table in source_tables(query):
+            if table.endswith("*"):
+                continue
+            tables = self.tables(project, dataset)
+            if tables is None:
+                return self.fallback()
+            versions.append((table, tables.get(table)))
+        return tuple(versions)
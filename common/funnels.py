@@ -0,0 +1,108 @@
+import os
+
+# Funnel steps of the Android pages: which GA4 event each labelled step
+# stands for, in funnel order, as (label, event_name, screen_name, view_id)
+# with view_id None when any view matches. The page queries (common.queries)
+# map events to steps by joining the events against these lists inlined as a
+# small table, and the tables' columns are ordered by them. A step is one
+# event, so steps must not overlap.
+ONBOARDING_STEPS = [
+    ('Splash', 'screen_load', 'splash_screen', None),
+    ('Initial login screen', 'screen_load', 'initial_login_screen', None),
+    ('User click on login button', 'view_click', 'initial_login_screen', None),
+    ('Login screen load', 'screen_load', 'login_screen', None),
+    ('User click on continue button after login screen', 'view_click', 'login_screen', None),
+    ('Land on OTP screen', 'screen_load', 'verify_otp_screen', None),
+    ('User click on continue button after otp', 'view_click', 'verify_otp_screen', None),
+    ('Profile Screen', 'screen_load', 'create_profile_screen', None),
+    ('User click on Continue button after profile screen', 'view_click', 'create_profile_screen', None),
+    ('User land on Bina Savings tode screen', 'screen_load', 'bina_savings_tode', None),
+    ('User clicks on Yes But kaise', 'view_click', 'bina_savings_tode', None),
+    ('User land on Dost hain Screen', 'screen_load', 'dost_hain', None),
+    ('User clicks on haan dost hain', 'view_click', 'dost_hain', None),
+    ('User land on To Beesi Karo na Screen', 'screen_load', 'to_beesi_karo_na', None),
+    ('User clicks on nice', 'view_click', 'to_beesi_karo_na', None),
+    ('User land on How Beesi Works Screen', 'screen_load', 'how_beesi_works', None),
+    ('User clicks on got it btn', 'view_click', 'how_beesi_works', None),
+    ('User lands on Home Screen', 'screen_load', 'home_screen', None),
+]
+
+EXPLORE_STEPS = [
+    ('User landed on homepage', 'screen_load', 'home_screen', None),
+    ('User click on kyun karni hai beesi', 'view_click', 'home_screen', 'kyun_karni_hai_beesi'),
+    ('User land on kyun karni hai beesi', 'screen_load', 'kyun_karni_hai_beesi', None),
+    ('User click on cool on kyun karni hai beesi', 'view_click', 'kyun_karni_hai_beesi', 'cool'),
+    ('User click on back button on kyun karni hai beesi', 'view_click', 'kyun_karni_hai_beesi', 'back_button'),
+    ('User click on beesi kya hai', 'view_click', 'home_screen', 'beesi_kya_hai'),
+    ('User land on beesi kya hai screen', 'screen_load', 'beesi_kya_hai', None),
+    ('User click on play button on beesi kya hai screen', 'play_player', 'beesi_kya_hai', None),
+    ('User click on pause button on sampling UI video', 'pause_player', 'beesi_kya_hai', None),
+    ('User click on back button on beesi kya hai screen', 'view_click', 'beesi_kya_hai', 'back_button'),
+    ('User click on create beesi group on beesi kya hai screen', 'view_click', 'beesi_kya_hai', 'create_beesi_group'),
+]
+
+# Explore Journey's video watch-time buckets (see
+# common.transforms.watch_duration_histogram), shown after the pause step:
+# a user's longest watch of the day in whole seconds falls in the first
+# bucket at 0, then in (edge, next edge] and above the last edge
+WATCH_DURATION_EDGES = [int(edge) for edge in os.environ.get("DASHBOARD_WATCH_DURATION_EDGES", "0,10,30,60,120").split(",")]
+
+
+def watch_duration_columns(edges):
+    return (
+        ['User didnt watch the video']
+        + [f'User watched the video for {low + 1}-{high} seconds' for low, high in zip(edges, edges[1:])]
+        + [f'User watched the video for more than {edges[-1]} seconds']
+    )
+
+
+WATCH_DURATION_COLUMNS = watch_duration_columns(WATCH_DURATION_EDGES)
+
+
+def step_labels(steps):
+    return [label for label, _, _, _ in steps]
+
+
+# Column order of each page's table
+ONBOARDING_LABELS = step_labels(ONBOARDING_STEPS)
+EXPLORE_LABELS = step_labels(EXPLORE_STEPS)
+VIDEO_END = EXPLORE_LABELS.index('User click on pause button on sampling UI video') + 1
+
+NEW_USER_COLUMNS = ['Dates', 'Total Users'] + ONBOARDING_LABELS + ['No custom event']
+TOTAL_USERS_COLUMNS = ['Total Users'] + ONBOARDING_LABELS + ['No Event', 'No custom event']
+EXPLORE_COLUMNS = (
+    ['event_date', 'Total Users'] + EXPLORE_LABELS[:VIDEO_END] + WATCH_DURATION_COLUMNS + EXPLORE_LABELS[VIDEO_END:]
+)
+
+
+def sql_string(value):
+    return "CAST(NULL AS STRING)" if value is None else f"'{value}'"
+
+
+# `values` without duplicates, as the list of an SQL IN (...)
+def sql_list(values):
+    return ", ".join(sql_string(value) for value in dict.fromkeys(values))
+
+
+# `steps` as an inline table (label, event_name, screen_name, view_id) to join
+# events against: each event parameter is then extracted once per row instead
+# of once per CASE branch
+def steps_table(steps):
+    rows = ",\n    ".join(
+        f"STRUCT({sql_string(label)} AS label, {sql_string(event_name)} AS event_name, "
+        f"{sql_string(screen_name)} AS screen_name, {sql_string(view_id)} AS view_id)"
+        for label, event_name, screen_name, view_id in steps
+    )
+    return f"""SELECT * FROM UNNEST([
+    {rows}
+  ])"""
+
+
+# Join condition matching the events aliased `events` (event_name,
+# screen_name and, when a step needs it, view_id columns) to the steps table
+# aliased `table`
+def step_match(steps, events, table):
+    condition = f"{events}.event_name = {table}.event_name AND {events}.screen_name = {table}.screen_name"
+    if any(view_id is not None for _, _, _, view_id in steps):
+        condition += f" AND ({table}.view_id IS NULL OR {events}.view_id = {table}.view_id)"
+    return condition
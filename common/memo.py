@@ -0,0 +1,99 @@
+import os
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+import streamlit as st
+
+from common.executor import SingleFlight
+from common.filters import normalize_filters
+
+# Memoized page transforms: the table a page builds from its data is kept
+# under (page, dataset version, normalized filters and whatever else shapes
+# it), so switching a widget back, or another viewer opening the same view,
+# reuses the table instead of re-running the load, filters, pivots and
+# percentages. One process-wide LRU bounded by entry count; concurrent
+# misses on one key compute it once. Hit and miss counts per page are shown
+# on the home page.
+TRANSFORM_CACHE_ENTRIES = int(os.environ.get("DASHBOARD_TRANSFORM_CACHE_ENTRIES", 256))
+
+
+# Hashable, order-independent form of a key part: filter dicts as in
+# common.filters, multiselect lists as sorted tuples
+def key_part(value):
+    if isinstance(value, dict):
+        return normalize_filters(value)
+    if isinstance(value, (list, set)):
+        return tuple(sorted(value))
+    return value
+
+
+# Shallow copies of the frames in a result, so a page modifying its table
+# (set_index, new columns) leaves the cached one alone
+def share(value):
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return value.copy(deep=False)
+    if isinstance(value, tuple):
+        return tuple(share(item) for item in value)
+    return value
+
+
+class TransformCache:
+    def __init__(self, max_entries=TRANSFORM_CACHE_ENTRIES):
+        self.max_entries = max_entries
+        self.stats = {}
+        self._entries = OrderedDict()
+        self._flight = SingleFlight()
+        self._lock = threading.Lock()
+
+    def _count(self, page, outcome):
+        counts = self.stats.setdefault(page, {"hits": 0, "misses": 0, "evictions": 0})
+        counts[outcome] += 1
+
+    def get(self, page, key, compute):
+        key = (page, key)
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self._count(page, "hits")
+                return share(self._entries[key])
+            self._count(page, "misses")
+        value = self._flight.do(key, self._compute, key, compute)
+        return share(value)
+
+    def _compute(self, key, compute):
+        value = compute()
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                (page, _), _ = self._entries.popitem(last=False)
+                self._count(page, "evictions")
+        return value
+
+    def snapshot(self):
+        with self._lock:
+            entries = {}
+            for page, _ in self._entries:
+                entries[page] = entries.get(page, 0) + 1
+            return [
+                {
+                    'page': page,
+                    'entries': entries.get(page, 0),
+                    **counts,
+                    'hit_rate': round(counts['hits'] / max(1, counts['hits'] + counts['misses']), 3),
+                }
+                for page, counts in self.stats.items()
+            ]
+
+
+@st.cache_resource
+def get_transform_cache():
+    return TransformCache()
+
+
+# `compute()` (the page's load-and-transform pipeline) for `page`, cached
+# under the dataset `version` and the `key` parts, e.g. the date range and
+# filter selections
+def memoize_transform(page, version, compute, *key):
+    return get_transform_cache().get(page, (version, *map(key_part, key)), compute)
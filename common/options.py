@@ -0,0 +1,52 @@
+import numpy as np
+import pandas as pd
+
+# Filter widgets' options: the sorted distinct values of every filter
+# dimension of a dataset, with the number of rows holding each. The index is
+# built once when the dataset is loaded and cached with it, so reruns (every
+# widget click) read a few short lists instead of scanning and sorting the
+# frame's columns again.
+
+
+class OptionIndex:
+    def __init__(self, counts):
+        # {dimension: row counts indexed by the dimension's sorted values}
+        self.counts = counts
+
+    # Values a widget offers for `dimension`: missing and empty values are
+    # never listed, nor those in `hidden` (compared lowercase)
+    def options(self, dimension, hidden=()):
+        return [
+            value for value in self.counts[dimension].index
+            if value != '' and str(value).lower() not in hidden
+        ]
+
+    def row_count(self, dimension, value):
+        return int(self.counts[dimension].get(value, 0))
+
+
+# Rows per value of `series`, sorted by value; encoded columns are counted on
+# their codes (see common.categories)
+def value_counts(series):
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        codes = series.cat.codes.to_numpy()
+        counts = np.bincount(codes[codes >= 0], minlength=len(series.cat.categories))
+        present = counts > 0
+        return pd.Series(counts[present], index=series.cat.categories[present]).sort_index()
+    return series.value_counts(dropna=True).sort_index()
+
+
+# Index over the rows of a loaded frame
+def build_option_index(df, dimensions):
+    return OptionIndex({name: value_counts(df[name]) for name in dimensions})
+
+
+# Index over the rows of a filter_options_query result (see common.filters):
+# per-day row counts of every dimension and value, summed over the days
+def counts_option_index(options_df, dimensions):
+    totals = options_df.dropna(subset=["value"]).groupby(["dimension", "value"], observed=True)["row_count"].sum()
+    return OptionIndex({
+        name: totals.xs(name, level="dimension").sort_index() if name in totals.index.get_level_values("dimension")
+        else pd.Series(dtype="int64")
+        for name in dimensions
+    })
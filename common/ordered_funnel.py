@@ -0,0 +1,116 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from common.distinct import codes
+
+# Ordered funnel: a user reaches step k only by doing steps 0..k in that
+# order, each within its conversion window of the previous one, judged on the
+# events' timestamps. Events are sorted once by (user, time, step), packed
+# into one int64 key; then, one step at a time, every event of the step looks
+# up its user's latest reachable event of the previous step with one binary
+# search over the sorted positions, so the work is a sort plus a searchsorted
+# per step, with no per-user Python loop. Taking the latest reachable previous
+# event gives each event its best chance to fit the window, so conversion is
+# exact.
+
+# Time allowed between consecutive steps unless a page sets its own
+STEP_WINDOW_SECONDS = int(os.environ.get("DASHBOARD_FUNNEL_STEP_WINDOW_SECONDS", 24 * 3600))
+
+MICROS_PER_SECOND = 1_000_000
+
+
+# Order of events by (user, time, step) from one int64 key, which sorts
+# several times faster than np.lexsort; timestamps are replaced by their rank
+# when the raw span would overflow the key
+def event_order(users, steps, timestamps, step_count):
+    if len(users) == 0:
+        return np.zeros(0, dtype=np.intp)
+    times = timestamps - timestamps.min()
+    if (int(users.max()) + 1) * (int(times.max()) + 1) * step_count >= 2 ** 62:
+        _, times = np.unique(timestamps, return_inverse=True)
+    key = (users.astype(np.int64) * (int(times.max()) + 1) + times) * step_count + steps
+    return np.argsort(key)
+
+
+# Step of every value of `series` as its index in `labels`, -1 for values
+# that are no step
+def step_codes(series, labels):
+    labels = pd.Index(labels)
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        # Code -1 (missing) picks the trailing -1
+        mapping = np.append(labels.get_indexer(series.cat.categories), -1)
+        return mapping[series.cat.codes.to_numpy()]
+    return labels.get_indexer(series)
+
+
+# Users reaching each of `step_count` steps in order, and the median seconds
+# they took from the previous step (NaN for the first step and steps nobody
+# reaches). `users` and `steps` are integer codes (-1 is skipped),
+# `timestamps` are in microseconds and `windows` holds each step's window in
+# seconds (the first is unused).
+def ordered_conversion(users, steps, timestamps, step_count, windows):
+    keep = (users >= 0) & (steps >= 0)
+    users, steps, timestamps = users[keep], steps[keep], timestamps[keep]
+    order = event_order(users, steps, timestamps, step_count)
+    users, steps, timestamps = users[order], steps[order], timestamps[order]
+
+    # Sorted positions of each step's events, ascending: step k's are
+    # by_step[offsets[k]:offsets[k + 1]]
+    by_step = np.argsort(steps.astype(np.int16), kind="stable")
+    offsets = np.concatenate([[0], np.cumsum(np.bincount(steps, minlength=step_count))])
+
+    reached = np.zeros(step_count, dtype=np.int64)
+    median_seconds = np.full(step_count, np.nan)
+    reachable = by_step[offsets[0]:offsets[1]]
+    gaps = np.zeros(len(reachable), dtype=timestamps.dtype)
+    for step in range(step_count):
+        if step > 0:
+            candidates = by_step[offsets[step]:offsets[step + 1]]
+            if len(reachable) == 0 or len(candidates) == 0:
+                break
+            # Latest reachable previous-step event sorted before each
+            # candidate; it belongs to the same user when there is one
+            previous = np.searchsorted(reachable, candidates, side="right") - 1
+            found = previous >= 0
+            previous = reachable[np.maximum(previous, 0)]
+            gaps = timestamps[candidates] - timestamps[previous]
+            found &= (users[previous] == users[candidates]) & (gaps <= windows[step] * MICROS_PER_SECOND)
+            reachable, gaps = candidates[found], gaps[found]
+        if len(reachable) == 0:
+            break
+        # Each user's first reachable event of the step
+        reachable_users = users[reachable]
+        first = np.concatenate([[True], reachable_users[1:] != reachable_users[:-1]])
+        reached[step] = np.count_nonzero(first)
+        if step > 0:
+            median_seconds[step] = np.median(gaps[first]) / MICROS_PER_SECOND
+    return reached, median_seconds
+
+
+# Ordered funnel table over the `labels` steps: users reaching each step in
+# order, their share of the first step's users, the step-to-step conversion
+# and drop-off, and the median seconds from the previous step. `windows` is
+# one window in seconds for every step or {label: seconds} overrides of
+# STEP_WINDOW_SECONDS.
+def ordered_funnel_table(df, labels, user_column, step_column, time_column, windows=STEP_WINDOW_SECONDS):
+    if isinstance(windows, dict):
+        windows = [windows.get(label, STEP_WINDOW_SECONDS) for label in labels]
+    else:
+        windows = [windows] * len(labels)
+    users, _ = codes(df[user_column])
+    steps = step_codes(df[step_column], labels)
+    timestamps = df[time_column].to_numpy(dtype="int64", na_value=-1)
+    steps = np.where(timestamps >= 0, steps, -1)
+    reached, median_seconds = ordered_conversion(users, steps, timestamps, len(labels), np.asarray(windows))
+
+    previous = np.concatenate([reached[:1], reached[:-1]])
+    step_conversion = np.divide(reached * 100.0, previous, out=np.zeros(len(labels)), where=previous > 0)
+    return pd.DataFrame({
+        'Users': reached,
+        'Conversion': np.divide(reached * 100.0, reached[0], out=np.zeros(len(labels)), where=reached[0] > 0),
+        'Step conversion': step_conversion,
+        'Drop-off': np.where(previous > 0, 100 - step_conversion, 0),
+        'Median seconds from previous step': np.nan_to_num(median_seconds),
+    }, index=pd.Index(labels, name='Step'))
@@ -0,0 +1,437 @@
+# SQL behind every dashboard page, kept in one place so the cache warmer
+# (common.warmup) can run the same queries, with the same parameters, as the
+# pages themselves. Queries over events_* take the @start_suffix/@end_suffix
+# date parameters and one array parameter per filter column. The Android
+# funnel pages map events to steps by joining the step registry
+# (common.funnels).
+
+from common.funnels import EXPLORE_STEPS, ONBOARDING_STEPS, sql_list, step_match, steps_table
+
+
+# Android App Overview page (pages/!_Android_App_Overview.py)
+OVERVIEW_QUERY = """
+WITH
+ daily_user_activity AS (
+ SELECT
+ event_date,
+ user_pseudo_id,
+ MAX(CASE
+ WHEN event_name = 'first_open' THEN 1
+ ELSE 0
+ END) AS had_first_open,
+ MAX(CASE
+ WHEN event_name = 'first_open' AND param.key = 'previous_first_open_count' THEN param.value.int_value
+ ELSE NULL
+ END) AS previous_first_open_count,
+ MAX(CASE
+ WHEN event_name IN('screen_load', 'view_click') THEN 1
+ ELSE 0
+ END) AS custom_event
+ FROM
+ `swap-vc-prod.analytics_325691371.events_*`,
+ UNNEST(event_params) AS param
+ WHERE
+ platform = 'ANDROID'
+ AND (_TABLE_SUFFIX BETWEEN @start_suffix AND @end_suffix
+ OR _TABLE_SUFFIX BETWEEN CONCAT('intraday_', @start_suffix) AND CONCAT('intraday_', @end_suffix))
+ GROUP BY
+ event_date,
+ user_pseudo_id
+ ),
+ user_classification AS (
+ SELECT
+ event_date,
+ user_pseudo_id,
+ CASE
+ WHEN had_first_open = 1 AND previous_first_open_count = 0 THEN 'fresh_install'
+ WHEN had_first_open = 1 AND previous_first_open_count > 0 THEN 'reinstall'
+ WHEN had_first_open = 1 THEN 'new_user'
+ ELSE 'returning_user'
+ END AS user_type,
+ custom_event
+ FROM
+ daily_user_activity
+ )
+SELECT
+ event_date,
+ COUNT(DISTINCT user_pseudo_id) AS total_users,
+ COUNT(DISTINCT CASE WHEN user_type IN ('fresh_install', 'reinstall', 'new_user') THEN user_pseudo_id END) AS new_users,
+ COUNT(DISTINCT CASE WHEN user_type = 'returning_user' THEN user_pseudo_id END) AS returning_users,
+ COUNT(DISTINCT CASE WHEN user_type = 'fresh_install' THEN user_pseudo_id END) AS fresh_installs,
+ COUNT(DISTINCT CASE WHEN user_type = 'reinstall' THEN user_pseudo_id END) AS reinstalls,
+ COUNT(DISTINCT CASE WHEN custom_event = 1 THEN user_pseudo_id END) AS users_with_custom_event
+FROM
+ user_classification
+GROUP BY
+ event_date
+ORDER BY
+ event_date DESC
+"""
+
+# New User Onboarding page (pages/2_NewUser_App_Onboarding_Journey.py)
+NEW_USER_ONBOARDING_QUERY = f"""
+WITH
+  funnel_steps AS ({steps_table(ONBOARDING_STEPS)}),
+  new_user AS (
+  SELECT
+    event_date,
+    user_pseudo_id,
+    CASE
+      WHEN ( SELECT value.int_value FROM UNNEST(event_params) WHERE KEY = 'previous_first_open_count') > 0 THEN 'reinstall'
+      ELSE 'fresh_install'
+  END
+    AS install_type
+  FROM
+    `swap-vc-prod.analytics_325691371.events_*`
+  WHERE
+    event_name = 'first_open'
+    AND platform = 'ANDROID'
+    AND (_TABLE_SUFFIX BETWEEN @start_suffix AND @end_suffix
+      OR _TABLE_SUFFIX BETWEEN CONCAT('intraday_', @start_suffix) AND CONCAT('intraday_', @end_suffix))),
+  custom_events AS (
+  SELECT
+    *
+  FROM (
+    SELECT
+      user_pseudo_id,
+      event_date,
+      event_timestamp,
+      event_name,
+      ( SELECT
+        value.string_value
+      FROM
+        UNNEST(event_params)
+      WHERE
+        KEY = 'screen_name') AS screen_name,
+      geo.country AS Country,
+      geo.region AS Region,
+      geo.city AS City,
+      app_info.version AS App_Version,
+      device.operating_system_version AS OS_Version,
+    FROM
+      `swap-vc-prod.analytics_325691371.events_*`
+    WHERE
+      platform = 'ANDROID'
+      AND (_TABLE_SUFFIX BETWEEN @start_suffix AND @end_suffix
+        OR _TABLE_SUFFIX BETWEEN CONCAT('intraday_', @start_suffix) AND CONCAT('intraday_', @end_suffix))
+      AND event_name IN ({sql_list(event_name for _, event_name, _, _ in ONBOARDING_STEPS)}))
+  WHERE
+    screen_name IN ({sql_list(screen_name for _, _, screen_name, _ in ONBOARDING_STEPS)}))
+SELECT
+  n.event_date,
+  n.user_pseudo_id,
+  n.install_type,
+  c.App_Version,
+  c.OS_Version,
+  c.Country,
+  c.Region,
+  c.City,
+  CASE
+    WHEN s.label IS NOT NULL THEN s.label
+    WHEN c.event_name IS NULL THEN 'No custom event'
+    ELSE 'Other: ' || c.event_name || ' - ' || c.screen_name
+  END AS Descriptive_Event,
+  c.event_timestamp
+FROM
+  new_user AS n
+LEFT JOIN
+  custom_events AS c
+ON
+  n.user_pseudo_id = c.user_pseudo_id
+  AND n.event_date = c.event_date
+LEFT JOIN
+  funnel_steps AS s
+ON
+  {step_match(ONBOARDING_STEPS, 'c', 's')}
+"""
+
+# Total Users Onboarding page (pages/3_TotalUsers_App_Onboarding_Journey.py)
+TOTAL_USERS_ONBOARDING_QUERY = f"""
+  SELECT
+    e.Dates,
+    e.User_ID,
+    e.Country,
+    e.Region,
+    e.City,
+    e.App_Version,
+    e.OS_Version,
+    CASE
+      WHEN s.label IS NOT NULL THEN s.label
+      WHEN e.event_name IS NULL THEN 'No custom event'
+      ELSE 'Other: ' || e.event_name || ' - ' || e.screen_name
+    END AS App_Event
+  FROM (
+    SELECT
+      event_date AS Dates,
+      user_pseudo_id AS User_ID,
+      geo.country as Country,
+      geo.region as Region,
+      geo.city as City,
+      app_info.version as App_Version,
+      device.operating_system_version as OS_Version,
+      event_name,
+      (SELECT value.string_value FROM UNNEST(event_params) WHERE KEY = 'screen_name') AS screen_name
+    FROM
+      `swap-vc-prod.analytics_325691371.events_*`
+    WHERE
+      platform = 'ANDROID'
+      AND (_TABLE_SUFFIX BETWEEN @start_suffix AND @end_suffix
+        OR _TABLE_SUFFIX BETWEEN CONCAT('intraday_', @start_suffix) AND CONCAT('intraday_', @end_suffix))
+      AND (ARRAY_LENGTH(@Country) = 0 OR geo.country IN UNNEST(@Country))
+      AND (ARRAY_LENGTH(@Region) = 0 OR geo.region IN UNNEST(@Region))
+      AND (ARRAY_LENGTH(@City) = 0 OR geo.city IN UNNEST(@City))
+      AND (ARRAY_LENGTH(@OS_Version) = 0 OR device.operating_system_version IN UNNEST(@OS_Version))
+      AND (ARRAY_LENGTH(@App_Version) = 0 OR app_info.version IN UNNEST(@App_Version))
+  ) AS e
+  LEFT JOIN (
+    {steps_table(ONBOARDING_STEPS)}
+  ) AS s
+  ON
+    {step_match(ONBOARDING_STEPS, 'e', 's')}
+"""
+
+# Columns whose filters are pushed down into the query as array parameters
+TOTAL_USERS_ONBOARDING_FILTERS = ['Country', 'Region', 'City', 'OS_Version', 'App_Version']
+
+# Distinct users per date and App_Event (plus a per-date 'Total Users' row) are
+# counted in BigQuery, so only days x steps rows come back instead of one row
+# per Android event
+TOTAL_USERS_AGGREGATE_QUERY = f"""
+WITH events AS ({TOTAL_USERS_ONBOARDING_QUERY})
+SELECT
+  Dates,
+  IF(GROUPING(App_Event) = 1, 'Total Users', COALESCE(App_Event, 'No Event')) AS App_Event,
+  COUNT(DISTINCT User_ID) AS Users
+FROM
+  events
+GROUP BY
+  GROUPING SETS ((Dates, App_Event), (Dates))
+"""
+
+# Approximate mode: one HLL sketch of users per date, step and dimension tuple
+# for the unfiltered query. Sketches merge locally, so any filter combination
+# is answered without another BigQuery job.
+TOTAL_USERS_SKETCH_QUERY = f"""
+WITH events AS ({TOTAL_USERS_ONBOARDING_QUERY})
+SELECT
+  Dates,
+  IF(GROUPING(App_Event) = 1, 'Total Users', COALESCE(App_Event, 'No Event')) AS App_Event,
+  Country,
+  Region,
+  City,
+  OS_Version,
+  App_Version,
+  HLL_COUNT.INIT(User_ID) AS user_sketch
+FROM
+  events
+GROUP BY
+  GROUPING SETS (
+    (Dates, App_Event, Country, Region, City, OS_Version, App_Version),
+    (Dates, Country, Region, City, OS_Version, App_Version)
+  )
+"""
+
+# Explore Journey page (pages/4_Android_App_Explore_Journey.py)
+EXPLORE_JOURNEY_QUERY = f"""SELECT
+  e.event_date,
+  e.newly_loggedin_user,
+  e.age,
+  e.profession,
+  e.gender,
+  s.label AS actions,
+  COALESCE(
+    CAST(SPLIT(e.duration, ':')[OFFSET(0)] AS int64) * 60 + CAST(SPLIT(e.duration, ':')[OFFSET(1)] AS int64), 0
+  ) AS duration_seconds,
+  e.country,
+  e.region,
+  e.city,
+  e.app_version,
+  e.os_version
+FROM (
+  SELECT
+    PARSE_DATE('%Y%m%d', event_date) AS event_date,
+    (SELECT value.string_value FROM UNNEST(user_properties) WHERE KEY = 'beesi_user_id') AS newly_loggedin_user,
+    COALESCE((SELECT value.string_value FROM UNNEST(user_properties) WHERE KEY = 'beesi_user_age'),'NA') AS age,
+    COALESCE((SELECT value.string_value FROM UNNEST(user_properties) WHERE KEY = 'beesi_user_profession'),'NA') AS profession,
+    COALESCE((SELECT value.string_value FROM UNNEST(user_properties) WHERE KEY = 'beesi_user_gender'),'NA') AS gender,
+    safe.date(safe.timestamp_millis((SELECT value.int_value FROM UNNEST(user_properties) WHERE KEY = 'first_open_time'))) AS first_open_date,
+    event_name,
+    (SELECT value.string_value FROM UNNEST(event_params) WHERE KEY = 'screen_name') AS screen_name,
+    (SELECT value.string_value FROM UNNEST(event_params) WHERE KEY = 'view_id') AS view_id,
+    (SELECT value.string_value FROM UNNEST(event_params) WHERE KEY = 'duration') AS duration,
+    geo.country AS country,
+    geo.region AS region,
+    geo.city AS city,
+    app_info.version AS app_version,
+    device.operating_system_version AS os_version
+  FROM `swap-vc-prod.analytics_325691371.events_*`
+  WHERE
+    platform = 'ANDROID'
+    AND (_TABLE_SUFFIX BETWEEN @start_suffix AND @end_suffix
+      OR _TABLE_SUFFIX BETWEEN CONCAT('intraday_', @start_suffix) AND CONCAT('intraday_', @end_suffix))
+    AND event_name IN ({sql_list(event_name for _, event_name, _, _ in EXPLORE_STEPS)})
+    AND (ARRAY_LENGTH(@country) = 0 OR geo.country IN UNNEST(@country))
+    AND (ARRAY_LENGTH(@region) = 0 OR geo.region IN UNNEST(@region))
+    AND (ARRAY_LENGTH(@city) = 0 OR geo.city IN UNNEST(@city))
+    AND (ARRAY_LENGTH(@os_version) = 0 OR device.operating_system_version IN UNNEST(@os_version))
+    AND (ARRAY_LENGTH(@app_version) = 0 OR app_info.version IN UNNEST(@app_version))
+) AS e
+JOIN (
+  {steps_table(EXPLORE_STEPS)}
+) AS s
+ON
+  {step_match(EXPLORE_STEPS, 'e', 's')}
+WHERE
+  e.newly_loggedin_user IS NOT NULL
+  AND e.event_date = e.first_open_date
+  AND (ARRAY_LENGTH(@gender) = 0 OR e.gender IN UNNEST(@gender))
+  AND (ARRAY_LENGTH(@age) = 0 OR e.age IN UNNEST(@age))
+  AND (ARRAY_LENGTH(@profession) = 0 OR e.profession IN UNNEST(@profession))"""
+
+# Columns whose filters are pushed down into the query as array parameters
+EXPLORE_JOURNEY_FILTERS = ['country', 'region', 'city', 'os_version', 'app_version', 'gender', 'age', 'profession']
+
+# Set Goal page (pages/Set_Goal_Dashboard.py)
+SET_GOAL_QUERY = """
+SELECT
+ event_date,
+(SELECT value.string_value FROM UNNEST(event_params) WHERE key = 'beesi_user_id') AS beesi_user_id,
+(SELECT value.string_value FROM UNNEST(user_properties) WHERE key = 'beesi_user_gender') AS gender,
+(SELECT value.string_value FROM UNNEST(user_properties) WHERE key = 'beesi_user_age') AS age_range,
+(SELECT value.string_value FROM UNNEST(user_properties) WHERE key = 'beesi_user_profession') AS profession,
+event_name,
+(SELECT value.string_value FROM UNNEST(event_params) WHERE key = 'screen_name') AS screen_name,
+(SELECT value.string_value FROM UNNEST(event_params) WHERE key = 'source') AS sources,
+(SELECT value.string_value FROM UNNEST(event_params) WHERE key = 'goal_selected') AS goal_selected,
+(SELECT value.int_value FROM UNNEST(event_params) WHERE key = 'is_custom_goal') AS is_custom_goal,
+geo.country AS country,
+geo.region AS region,
+geo.city AS city,
+app_info.version AS app_version,
+device.operating_system_version AS os_version
+FROM
+`swap-vc-prod.analytics_325691371.events_*`
+where platform = 'ANDROID'
+and (_TABLE_SUFFIX between @start_suffix and @end_suffix
+  or _TABLE_SUFFIX between concat('intraday_', @start_suffix) and concat('intraday_', @end_suffix))
+and (SELECT value.string_value FROM UNNEST(event_params) WHERE key = 'beesi_user_id') is not null
+and (array_length(@os_version) = 0 or device.operating_system_version in unnest(@os_version))
+and (array_length(@app_version) = 0 or app_info.version in unnest(@app_version))
+and (array_length(@country) = 0 or geo.country in unnest(@country))
+and (array_length(@region) = 0 or geo.region in unnest(@region))
+and (array_length(@city) = 0 or geo.city in unnest(@city))
+and (array_length(@gender) = 0 or (SELECT value.string_value FROM UNNEST(user_properties) WHERE key = 'beesi_user_gender') in unnest(@gender))
+and (array_length(@age_range) = 0 or (SELECT value.string_value FROM UNNEST(user_properties) WHERE key = 'beesi_user_age') in unnest(@age_range))
+and (array_length(@profession) = 0 or (SELECT value.string_value FROM UNNEST(user_properties) WHERE key = 'beesi_user_profession') in unnest(@profession))
+"""
+
+# Columns whose filters are pushed down into the query as array parameters
+SET_GOAL_FILTERS = ['os_version', 'app_version', 'country', 'region', 'city', 'gender', 'age_range', 'profession']
+
+# Scroll Depth Analytics page (pages/6_Scroll_Depth_Analytics.py)
+SCROLL_DEPTH_QUERY = """
+WITH
+ t1 AS (
+SELECT
+    COALESCE(CAST(t1.Dates AS STRING), CAST(CURRENT_DATE() AS STRING)) AS Dates,
+    t1.Event_Name,
+    COALESCE(t1.Device, 'Unknown') AS Device,
+    COALESCE(t1.Country, 'Unknown') AS Country,
+    COALESCE(t1.Region, 'Unknown') AS Region,
+    COALESCE(t1.City, 'Unknown') AS City,
+    t1.User_ID AS User_ID,
+    (CASE
+        WHEN t1.Dates = t2.Dates THEN 'New User'
+        ELSE 'Returning User'
+    END) AS User_Type
+FROM
+    `swap-vc-prod.analytics_325691371.WebApp_UserData` AS t1
+LEFT JOIN
+    `swap-vc-prod.analytics_325691371.New_User` AS t2
+ON
+    t1.User_ID = t2.User_ID
+WHERE
+    t1.Event_Name IN ( 'home_page_view',
+    'Open_App_Playstore',
+    'Open_App_Appstore',
+    'Open_App_Yes_But_Kaise',
+    'Open_App_Haan_Dost_Hain',
+    'Open_App_Nudge_Floating',
+    'Open_App_Nudge_1',
+    'Open_App_Nudge_2',
+    'Open_App_Whatsapp_Share_App_With_Friends' )
+    AND REPLACE(COALESCE(CAST(t1.Dates AS STRING), CAST(CURRENT_DATE() AS STRING)), '-', '') BETWEEN @start_suffix AND @end_suffix ),
+t2 AS (
+SELECT
+    COALESCE(CAST(event_date AS STRING), CAST(CURRENT_DATE() AS STRING)) AS Dates,
+    user_pseudo_id AS User_ID,
+    MAX(COALESCE((
+    SELECT
+        value.int_value
+    FROM
+        UNNEST(event_params)
+    WHERE
+        KEY = 'percent_scrolled'), 0)) AS max_scroll_percent
+FROM
+    `swap-vc-prod.analytics_325691371.events_*`
+WHERE
+    event_name = 'Scroll'
+    AND (_TABLE_SUFFIX BETWEEN @start_suffix AND @end_suffix
+      OR _TABLE_SUFFIX BETWEEN CONCAT('intraday_', @start_suffix) AND CONCAT('intraday_', @end_suffix))
+GROUP BY
+    event_date,
+    user_pseudo_id )
+SELECT
+    COALESCE(t1.Dates, CAST(CURRENT_DATE() AS STRING)) AS Dates,
+    t1.User_ID,
+    t1.User_Type,
+    COALESCE(t2.max_scroll_percent, 0) AS max_scroll_percent
+FROM
+    t1
+LEFT JOIN
+    t2
+ON
+    t1.Dates = t2.Dates
+AND t1.User_ID = t2.User_ID
+GROUP BY
+    1,
+    2,
+    3,
+    4
+ORDER BY
+    1 desc
+"""
+
+# WebApp All Users page (pages/7_WebApp_All_Users.py)
+WEBAPP_EVENTS_QUERY = """
+SELECT
+    COALESCE(CAST(t1.Dates AS STRING), CAST(CURRENT_DATE() AS STRING)) AS Dates,
+    t1.Event_Name,
+    COALESCE(t1.Device, 'Unknown') AS Device,
+    COALESCE(t1.Country, 'Unknown') AS Country,
+    COALESCE(t1.Region, 'Unknown') AS Region,
+    COALESCE(t1.City, 'Unknown') AS City,
+    t1.User_ID as User_ID,
+    (CASE 
+        WHEN t1.Dates = t2.Dates THEN 'New User'
+        ELSE 'Returning User'
+    END) as User_Type
+FROM
+    `swap-vc-prod.analytics_325691371.WebApp_UserData` AS t1
+LEFT JOIN 
+    `swap-vc-prod.analytics_325691371.New_User` AS t2
+ON
+    t1.User_ID = t2.User_ID 
+WHERE
+    t1.Event_Name IN (
+        'home_page_view',
+        'Open_App_Playstore',
+        'Open_App_Appstore',
+        'Open_App_Yes_But_Kaise',
+        'Open_App_Haan_Dost_Hain',
+        'Open_App_Nudge_Floating',
+        'Open_App_Nudge_1',
+        'Open_App_Nudge_2',
+        'Open_App_Whatsapp_Share_App_With_Friends'
+    )
+"""
@@ -0,0 +1,113 @@
+import hashlib
+import os
+import threading
+
+import pandas as pd
+
+# Second-level cache for whole query results, behind the in-process
+# st.cache_data layer. Entries are compressed Parquet files in one directory,
+# so every Streamlit process on the host (and every restart) shares them.
+# Keys cover the normalized SQL, its parameters and the data watermark, so a
+# result is never reused once the data it was computed from has moved on.
+RESULT_CACHE_BACKEND = os.environ.get("DASHBOARD_RESULT_CACHE", "disk")
+RESULT_CACHE_MAX_BYTES = int(os.environ.get("DASHBOARD_RESULT_CACHE_MAX_BYTES", 2 * 1024 ** 3))
+RESULT_CACHE_COMPRESSION = "zstd"
+
+
+# Whitespace and parameter order do not change a query's result
+def normalize_sql(query):
+    return " ".join(query.split())
+
+
+def normalize_params(params):
+    return tuple(sorted(
+        (name, tuple(value) if isinstance(value, (list, tuple)) else value)
+        for name, value in (params or {}).items()
+    ))
+
+
+def result_key(query, params=None, watermark=None):
+    payload = repr((normalize_sql(query), normalize_params(params), watermark))
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+# Backend used when the result cache is switched off
+class NullResultStore:
+    def get(self, key):
+        return None
+
+    def put(self, key, frame):
+        pass
+
+
+# Directory of <key>.parquet files bounded to `max_bytes`. A file's mtime is
+# its last use, so eviction drops the least recently used results first.
+# Writes go through a temporary file and os.replace, so a reader in another
+# process sees either the whole file or none of it.
+class ParquetResultStore:
+    def __init__(self, directory, max_bytes=RESULT_CACHE_MAX_BYTES, compression=RESULT_CACHE_COMPRESSION):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.compression = compression
+        self._lock = threading.Lock()
+
+    def path(self, key):
+        return os.path.join(self.directory, key + ".parquet")
+
+    def get(self, key):
+        path = self.path(key)
+        try:
+            frame = pd.read_parquet(path)
+            os.utime(path)
+        except (OSError, ValueError):
+            return None
+        return frame
+
+    def put(self, key, frame):
+        path = self.path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            frame.to_parquet(tmp_path, index=False, compression=self.compression)
+            os.replace(tmp_path, path)
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return
+        self.evict()
+
+    # Other processes may be evicting the same files, so anything that has
+    # already disappeared is simply skipped
+    def evict(self):
+        with self._lock:
+            entries = []
+            try:
+                names = os.listdir(self.directory)
+            except OSError:
+                return
+            for name in names:
+                if not name.endswith(".parquet"):
+                    continue
+                try:
+                    stat = os.stat(os.path.join(self.directory, name))
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, name))
+
+            total = sum(size for _, size, _ in entries)
+            for _, size, name in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except OSError:
+                    continue
+                total -= size
+
+
+def make_result_store(directory):
+    if RESULT_CACHE_BACKEND == "off":
+        return NullResultStore()
+    if RESULT_CACHE_BACKEND == "disk":
+        return ParquetResultStore(directory)
+    raise ValueError(f"Unknown result cache backend: {RESULT_CACHE_BACKEND}")
@@ -0,0 +1,108 @@
+import numpy as np
+import pandas as pd
+
+from common.distinct import codes
+
+# Row index of a loaded dataset for the pages' filters: for every filter
+# dimension the row positions holding each value (grouped by value, like an
+# inverted index's posting lists) and the rows sorted by day. A filter
+# combination scatters the selected values' rows into one bitmap per
+# dimension and the day range into another, ANDs them and gathers the
+# surviving rows once, instead of copying the frame after every isin and
+# building a date object per row. Built once per dataset and cached with it
+# (see common.data_access); positions refer to the frame it was built from,
+# which the index recognizes by its fingerprint.
+
+# Rows sampled, evenly spaced, into a frame's fingerprint
+FINGERPRINT_ROWS = 64
+
+
+# Cheap identity of a frame's `columns`: its length and a hash of a fixed
+# sample of their rows, so an index is not applied to a different frame
+# that merely has the same number of rows
+def frame_fingerprint(df, columns):
+    columns = [column for column in columns if column in df]
+    sample = np.unique(np.linspace(0, len(df) - 1, num=min(len(df), FINGERPRINT_ROWS)).astype(np.int64))
+    values = []
+    for column in columns:
+        array = df[column].array.take(sample)
+        # NaN hashes by identity, so missing values are all taken as None
+        values.append(tuple(None if missing else value for value, missing in zip(array.tolist(), pd.isna(array))))
+    return len(df), tuple(columns), hash(tuple(values))
+
+
+class RowIndex:
+    def __init__(self, df, dimensions, date_column=None):
+        self.rows = len(df)
+        self.date_column = date_column
+        self.fingerprint = frame_fingerprint(df, [*dimensions, *([date_column] if date_column else [])])
+        # {dimension: (values, row positions ordered by value, offsets)}; the
+        # rows of value k are positions[offsets[k + 1]:offsets[k + 2]] and
+        # those missing a value come first
+        self.postings = {}
+        for name in dimensions:
+            values, uniques = codes(df[name])
+            # Narrow codes sort by radix sort
+            narrow = np.int16 if len(uniques) < np.iinfo(np.int16).max else np.int32
+            positions = np.argsort(values.astype(narrow), kind="stable").astype(np.int32)
+            counts = np.bincount(values + 1, minlength=len(uniques) + 1)
+            self.postings[name] = (pd.Index(uniques), positions, np.concatenate([[0], np.cumsum(counts)]))
+        if date_column is not None:
+            days = df[date_column].to_numpy(dtype="datetime64[ns]").astype("datetime64[D]")
+            dated = np.flatnonzero(~np.isnat(days))
+            # Days since the first one, narrow enough for radix sort
+            day_numbers = days[dated].astype(np.int64)
+            if len(day_numbers):
+                day_numbers -= day_numbers.min()
+            narrow = np.int16 if day_numbers.max(initial=0) < np.iinfo(np.int16).max else np.int64
+            self.day_positions = dated[np.argsort(day_numbers.astype(narrow), kind="stable")].astype(np.int32)
+            self.days = days[self.day_positions]
+
+    # Rows holding any of `selected` in `dimension`; with `missing`, rows
+    # without a value hold it
+    def value_rows(self, dimension, selected, missing=None):
+        values, positions, offsets = self.postings[dimension]
+        slots = [code + 1 for code in values.get_indexer(list(selected)) if code >= 0]
+        if missing is not None and missing in selected:
+            slots.append(0)
+        return np.concatenate([positions[offsets[slot]:offsets[slot + 1]] for slot in slots] or [positions[:0]])
+
+    # Rows dated within [start_date, end_date]
+    def day_rows(self, start_date, end_date):
+        first = np.searchsorted(self.days, np.datetime64(start_date, "D"), side="left")
+        last = np.searchsorted(self.days, np.datetime64(end_date, "D"), side="right")
+        return self.day_positions[first:last]
+
+    # Positions, in frame order, of the rows matching every non-empty
+    # selection in `filters` (and the day range when given); None when
+    # nothing is filtered
+    def select(self, filters, start_date=None, end_date=None, missing=None):
+        selections = [
+            self.value_rows(name, selected, missing)
+            for name, selected in dict(filters).items() if len(selected)
+        ]
+        if start_date is not None:
+            selections.append(self.day_rows(start_date, end_date))
+        if not selections:
+            return None
+        bitmap = np.zeros(self.rows, dtype=bool)
+        bitmap[selections[0]] = True
+        for rows in selections[1:]:
+            other = np.zeros(self.rows, dtype=bool)
+            other[rows] = True
+            bitmap &= other
+        return np.flatnonzero(bitmap)
+
+    # True when the index was built from `df` (by its fingerprint) and covers
+    # every dimension of `filters`
+    def covers(self, df, filters, date_column=None):
+        return (
+            len(df) == self.rows
+            and all(name in self.postings for name, selected in dict(filters).items() if len(selected))
+            and (date_column is None or date_column == self.date_column)
+            and frame_fingerprint(df, self.fingerprint[1]) == self.fingerprint
+        )
+
+    def filter(self, df, filters, start_date=None, end_date=None, missing=None):
+        positions = self.select(filters, start_date, end_date, missing)
+        return df if positions is None else df.take(positions)
@@ -0,0 +1,355 @@
+import datetime
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from common import funnels
+
+# Synthetic GA4-shaped data for the offline backend (common.fake_bigquery).
+# Frames are flat here, one column per event parameter / user property; the
+# backend nests them into GA4's event_params / user_properties arrays and
+# geo / app_info / device records. Every event a page query looks for is
+# produced: the Android onboarding funnel, first_open, the explore journey
+# (with video durations), goal setting, returning visits, and the WebApp
+# tables with their Scroll events.
+
+# Onboarding funnel as (event_name, screen_name), in the order users go through it
+ONBOARDING_STEPS = [(event_name, screen_name) for _, event_name, screen_name, _ in funnels.ONBOARDING_STEPS]
+# Users are logged in (and carry a beesi_user_id) once the OTP is verified
+LOGIN_STEP = 7
+
+REGIONS = ['Maharashtra', 'Karnataka', 'Delhi', 'Tamil Nadu', 'Uttar Pradesh', 'Gujarat', 'West Bengal', 'Telangana']
+OS_VERSIONS = ['Android 10', 'Android 11', 'Android 12', 'Android 13', 'Android 14']
+GENDERS = ['male', 'female', 'other']
+AGE_RANGES = ['18-24', '25-34', '35-44', '45+']
+PROFESSIONS = ['salaried', 'self_employed', 'student', 'homemaker']
+GOALS = ['iPhone 15', 'Gadgets', 'Electronics', 'New Laptop', 'Travel to Goa', 'Luxury', 'Shopping', 'Jewellery', 'Savings', 'Host Party', 'Bike', 'Car', 'Online Education']
+GOAL_SOURCES = ['set_now_home_screen', 'create_beesi_home_screen', 'edit_goal_settings_screen', 'set_now_groups_screen', 'create_beesi_groups_screen', 'set_goal_reward_screen']
+WEB_EVENTS = ['home_page_view', 'Open_App_Playstore', 'Open_App_Appstore', 'Open_App_Yes_But_Kaise', 'Open_App_Haan_Dost_Hain', 'Open_App_Nudge_Floating', 'Open_App_Nudge_1', 'Open_App_Nudge_2', 'Open_App_Whatsapp_Share_App_With_Friends']
+WEB_DEVICES = ['Android', 'iOS', 'Desktop', None]
+
+# Flat event columns; parameters and properties an event does not carry are null
+EVENT_COLUMNS = [
+    'event_date', 'event_timestamp', 'event_name', 'user_pseudo_id', 'platform',
+    'screen_name', 'view_id', 'duration', 'previous_first_open_count', 'percent_scrolled',
+    'goal_selected', 'is_custom_goal', 'source', 'beesi_user_id',
+    'user_beesi_user_id', 'user_gender', 'user_age', 'user_profession', 'first_open_time',
+    'country', 'region', 'city', 'app_version', 'os_version',
+]
+
+
+def day_start_micros(day):
+    return int(datetime.datetime(day.year, day.month, day.day, tzinfo=datetime.timezone.utc).timestamp() * 1_000_000)
+
+
+# Android users: where they are, what they run, when they installed, how far
+# through onboarding they get and who they are once logged in
+def generate_users(rng, users, days, cities, app_versions, step_continue_rate):
+    city_ids = rng.zipf(1.5, users) % cities
+    app_version_ids = np.minimum(rng.geometric(0.35, users) - 1, app_versions - 1)
+    # Completed steps: each step is reached with probability step_continue_rate
+    steps = np.minimum(rng.geometric(1 - step_continue_rate, users), len(ONBOARDING_STEPS))
+    logged_in = steps > LOGIN_STEP
+    profiles = logged_in & (rng.random(users) < 0.8)
+    return pd.DataFrame({
+        'user_pseudo_id': [f'{pseudo}.{day}' for pseudo, day in zip(rng.integers(10 ** 9, 10 ** 10, users), rng.integers(0, 10 ** 6, users))],
+        'first_day': rng.integers(0, days, users),
+        'country': np.where(rng.random(users) < 0.95, 'India', 'Nepal'),
+        'region': np.array(REGIONS)[city_ids % len(REGIONS)],
+        'city': [f'City {city_id}' for city_id in city_ids],
+        'app_version': [f'1.{app_versions - 1 - version}.0' for version in app_version_ids],
+        'os_version': np.array(OS_VERSIONS)[rng.integers(0, len(OS_VERSIONS), users)],
+        'steps': steps,
+        'beesi_user_id': np.where(logged_in, [f'B{index:07d}' for index in range(users)], None),
+        'user_gender': np.where(profiles, np.array(GENDERS)[rng.integers(0, len(GENDERS), users)], None),
+        'user_age': np.where(profiles, np.array(AGE_RANGES)[rng.integers(0, len(AGE_RANGES), users)], None),
+        'user_profession': np.where(profiles, np.array(PROFESSIONS)[rng.integers(0, len(PROFESSIONS), users)], None),
+        'previous_first_open_count': np.where(rng.random(users) < 0.8, 0, rng.integers(1, 4, users)),
+    })
+
+
+# One event per (user row, day offset) with the user's attributes attached;
+# `order` spaces the timestamps within the day so sequences stay ordered
+def make_events(users, calendar, user_rows, day_index, event_name, order, logged_in=True, **params):
+    dates, day_micros = calendar
+    rows = users.iloc[user_rows]
+    day_index = np.asarray(day_index)
+    frame = pd.DataFrame({
+        'event_date': dates[day_index],
+        'event_timestamp': day_micros[day_index] + np.asarray(order) * 1_000_000,
+        'event_name': event_name,
+        'user_pseudo_id': rows['user_pseudo_id'].to_numpy(),
+        'platform': 'ANDROID',
+        'country': rows['country'].to_numpy(),
+        'region': rows['region'].to_numpy(),
+        'city': rows['city'].to_numpy(),
+        'app_version': rows['app_version'].to_numpy(),
+        'os_version': rows['os_version'].to_numpy(),
+        'first_open_time': day_micros[rows['first_day'].to_numpy()] // 1000,
+    })
+    logged_in = np.broadcast_to(np.asarray(logged_in), len(frame))
+    for column in ['beesi_user_id', 'user_gender', 'user_age', 'user_profession']:
+        frame[column] = np.where(logged_in, rows[column].to_numpy(), None)
+    frame['user_beesi_user_id'] = frame['beesi_user_id']
+    for name, value in params.items():
+        frame[name] = value
+    return frame.reindex(columns=EVENT_COLUMNS)
+
+
+def android_events(rng, users, calendar):
+    dates = calendar[0]
+    events = []
+    all_users = np.arange(len(users))
+    first_day = users['first_day'].to_numpy()
+
+    # first_open, then the onboarding steps each user completed, on the install day
+    events.append(make_events(
+        users, calendar, all_users, first_day, 'first_open', 0, logged_in=False,
+        previous_first_open_count=users['previous_first_open_count'].to_numpy(),
+    ))
+    steps = users['steps'].to_numpy()
+    step_rows = np.repeat(all_users, steps)
+    step_index = np.arange(step_rows.size) - np.repeat(np.cumsum(steps) - steps, steps)
+    step_names = np.array(ONBOARDING_STEPS)[step_index]
+    events.append(make_events(
+        users, calendar, step_rows, first_day[step_rows], step_names[:, 0], step_index + 1,
+        logged_in=step_index >= LOGIN_STEP, screen_name=step_names[:, 1],
+    ))
+
+    # Explore journey on the install day for users who reached the home screen
+    home = all_users[steps == len(ONBOARDING_STEPS)]
+    order = len(ONBOARDING_STEPS) + 1
+    kyun = home[rng.random(home.size) < 0.4]
+    events.append(make_events(users, calendar, kyun, first_day[kyun], 'view_click', order, screen_name='home_screen', view_id='kyun_karni_hai_beesi'))
+    events.append(make_events(users, calendar, kyun, first_day[kyun], 'screen_load', order + 1, screen_name='kyun_karni_hai_beesi'))
+    events.append(make_events(
+        users, calendar, kyun, first_day[kyun], 'view_click', order + 2, screen_name='kyun_karni_hai_beesi',
+        view_id=np.where(rng.random(kyun.size) < 0.6, 'cool', 'back_button'),
+    ))
+    kya = home[rng.random(home.size) < 0.5]
+    events.append(make_events(users, calendar, kya, first_day[kya], 'view_click', order + 3, screen_name='home_screen', view_id='beesi_kya_hai'))
+    events.append(make_events(users, calendar, kya, first_day[kya], 'screen_load', order + 4, screen_name='beesi_kya_hai'))
+    played = kya[rng.random(kya.size) < 0.7]
+    watched = rng.exponential(45, played.size).astype(int)
+    events.append(make_events(users, calendar, played, first_day[played], 'play_player', order + 5, screen_name='beesi_kya_hai'))
+    events.append(make_events(
+        users, calendar, played, first_day[played], 'pause_player', order + 6, screen_name='beesi_kya_hai',
+        duration=[f'{seconds // 60}:{seconds % 60:02d}' for seconds in watched],
+    ))
+    events.append(make_events(
+        users, calendar, kya, first_day[kya], 'view_click', order + 7, screen_name='beesi_kya_hai',
+        view_id=np.where(rng.random(kya.size) < 0.3, 'create_beesi_group', 'back_button'),
+    ))
+
+    # Returning visits on later days
+    visits = rng.poisson(3, home.size)
+    visit_rows = np.repeat(home, visits)
+    visit_days = np.minimum(first_day[visit_rows] + rng.integers(1, 15, visit_rows.size), len(dates) - 1)
+    events.append(make_events(users, calendar, visit_rows, visit_days, 'screen_load', 1, screen_name='home_screen'))
+
+    # Goal setting: the bottom sheet is opened from some source, then a goal picked
+    goal_users = home[rng.random(home.size) < 0.5]
+    goal_days = np.minimum(first_day[goal_users] + rng.integers(0, 3, goal_users.size), len(dates) - 1)
+    custom = rng.random(goal_users.size) < 0.15
+    sources = np.array(GOAL_SOURCES)[rng.integers(0, len(GOAL_SOURCES), goal_users.size)]
+    events.append(make_events(users, calendar, goal_users, goal_days, 'screen_load', order + 10, screen_name='set_goal_bottomsheet', source=sources))
+    events.append(make_events(
+        users, calendar, goal_users, goal_days, 'view_click', order + 11, screen_name='set_goal_bottomsheet', source=sources,
+        goal_selected=np.where(custom, 'My own goal', np.array(GOALS)[rng.integers(0, len(GOALS), goal_users.size)]),
+        is_custom_goal=custom.astype(int),
+    ))
+    return events
+
+
+# WebApp visitors: their page events in WebApp_UserData, their first visit in
+# New_User and their Scroll events in the GA4 export
+def web_tables(rng, web_users, calendar):
+    dates, day_micros = calendar
+    user_ids = np.array([f'w{index:08d}.{seed}' for index, seed in enumerate(rng.integers(10 ** 6, 10 ** 7, web_users))])
+    first_day = rng.integers(0, len(dates), web_users)
+    visits = rng.poisson(2, web_users) + 1
+    rows = np.repeat(np.arange(web_users), visits)
+    offsets = rng.integers(1, 10, rows.size)
+    offsets[np.cumsum(visits) - visits] = 0
+    days = np.minimum(first_day[rows] + offsets, len(dates) - 1)
+    city_ids = rng.zipf(1.5, web_users) % 50
+    visit_dates = pd.to_datetime(dates[days], format='%Y%m%d').date
+
+    webapp_userdata = pd.DataFrame({
+        'Dates': visit_dates,
+        'Event_Name': np.array(WEB_EVENTS)[np.minimum(rng.geometric(0.4, rows.size) - 1, len(WEB_EVENTS) - 1)],
+        'Device': np.array(WEB_DEVICES, dtype=object)[rng.integers(0, len(WEB_DEVICES), rows.size)],
+        'Country': 'India',
+        'Region': np.array(REGIONS)[city_ids[rows] % len(REGIONS)],
+        'City': [f'City {city_id}' for city_id in city_ids[rows]],
+        'User_ID': user_ids[rows],
+    })
+    new_user = pd.DataFrame({
+        'User_ID': user_ids,
+        'Dates': pd.to_datetime(dates[first_day], format='%Y%m%d').date,
+    })
+    scroll = pd.DataFrame({
+        'event_date': dates[days],
+        'event_timestamp': day_micros[days],
+        'event_name': 'Scroll',
+        'user_pseudo_id': user_ids[rows],
+        'platform': 'WEB',
+        'percent_scrolled': rng.integers(0, 11, rows.size) * 10,
+        'country': 'India',
+        'region': webapp_userdata['Region'].to_numpy(),
+        'city': webapp_userdata['City'].to_numpy(),
+    }).reindex(columns=EVENT_COLUMNS)
+    return webapp_userdata, new_user, scroll
+
+
+# Returns {'events': flat GA4 events, 'WebApp_UserData': ..., 'New_User': ...}
+# covering the `days` days up to `end_date`
+def generate_ga4_export(users=5000, days=30, end_date=None, seed=0, cities=50, app_versions=8, step_continue_rate=0.9, web_users=None):
+    rng = np.random.default_rng(seed)
+    end_date = end_date or datetime.date.today()
+    days_covered = [end_date - datetime.timedelta(days=days - 1 - offset) for offset in range(days)]
+    calendar = (
+        np.array([day.strftime('%Y%m%d') for day in days_covered]),
+        np.array([day_start_micros(day) for day in days_covered]),
+    )
+
+    android_users = generate_users(rng, users, days, cities, app_versions, step_continue_rate)
+    webapp_userdata, new_user, scroll = web_tables(rng, web_users if web_users is not None else users // 2, calendar)
+    events = pd.concat(android_events(rng, android_users, calendar) + [scroll], ignore_index=True)
+    events = events.sort_values('event_timestamp', kind='stable', ignore_index=True)
+    for column in ['previous_first_open_count', 'percent_scrolled', 'is_custom_goal', 'first_open_time']:
+        events[column] = events[column].astype('Int64')
+    return {'events': events, 'WebApp_UserData': webapp_userdata, 'New_User': new_user}
+
+
+# Query results at any size, for benchmarks/. Each table has the columns of
+# one page's query; rows are drawn independently (users, days and funnel
+# steps at random) rather than simulated user by user, so 50M rows take
+# seconds. Funnel steps are reached with probability step_continue_rate
+# each, so later steps are rarer.
+ONBOARDING_EVENTS = funnels.ONBOARDING_LABELS
+EXPLORE_ACTIONS = funnels.EXPLORE_LABELS
+RESULT_KINDS = ['new_user_onboarding', 'total_users_onboarding', 'explore_journey', 'set_goal', 'scroll_depth', 'webapp_events']
+
+
+# Strings drawn from `labels` by index; negative indexes are nulls
+def label_array(labels, codes):
+    indices = pa.array(codes, mask=codes < 0)
+    return pa.array(labels).take(indices)
+
+
+def funnel_steps(rng, rows, steps, step_continue_rate):
+    return np.minimum(rng.geometric(1 - step_continue_rate, rows) - 1, steps - 1)
+
+
+def result_table(kind, rows, users=None, days=30, end_date=None, seed=0, cities=50, app_versions=8, step_continue_rate=0.9):
+    rng = np.random.default_rng(seed)
+    users = users or max(rows // 20, 1)
+    end_date = end_date or datetime.date.today()
+    calendar = [end_date - datetime.timedelta(days=days - 1 - offset) for offset in range(days)]
+    day = rng.integers(0, days, rows)
+    user = rng.integers(0, users, rows)
+    # Each user lives in one city and runs one app version
+    user_city = rng.zipf(1.5, users) % cities
+    user_app_version = np.minimum(rng.geometric(0.35, users) - 1, app_versions - 1)
+    city, app_version = user_city[user], user_app_version[user]
+
+    def dates(format):
+        return label_array([date.strftime(format) for date in calendar], day)
+
+    def user_ids(prefix):
+        return label_array([f'{prefix}{index:09d}.{index % 997}' for index in range(users)], user)
+
+    def location(names):
+        return {
+            names[0]: label_array(['India', 'Nepal'], (rng.random(rows) >= 0.95).astype(int)),
+            names[1]: label_array(REGIONS, city % len(REGIONS)),
+            names[2]: label_array([f'City {index}' for index in range(cities)], city),
+        }
+
+    def versions(names):
+        return {
+            names[0]: label_array([f'1.{app_versions - 1 - index}.0' for index in range(app_versions)], app_version),
+            names[1]: label_array(OS_VERSIONS, user % len(OS_VERSIONS)),
+        }
+
+    def choice(labels, missing=0.0):
+        codes = rng.integers(0, len(labels), rows)
+        return label_array(labels, np.where(rng.random(rows) < missing, -1, codes))
+
+    if kind == 'new_user_onboarding':
+        steps = funnel_steps(rng, rows, len(ONBOARDING_EVENTS), step_continue_rate)
+        # A minute per step plus up to an hour's jitter, so later steps mostly
+        # come after earlier ones
+        day_starts = np.array([day_start_micros(date) for date in calendar])
+        columns = {
+            'event_date': dates('%Y%m%d'),
+            'user_pseudo_id': user_ids('u'),
+            'install_type': choice(['fresh_install', 'reinstall', 'new_user']),
+            **versions(['App_Version', 'OS_Version']),
+            **location(['Country', 'Region', 'City']),
+            'Descriptive_Event': label_array(ONBOARDING_EVENTS, steps),
+            'event_timestamp': pa.array(day_starts[day] + steps * 60_000_000 + rng.integers(0, 3_600_000_000, rows)),
+        }
+    elif kind == 'total_users_onboarding':
+        steps = funnel_steps(rng, rows, len(ONBOARDING_EVENTS), step_continue_rate)
+        columns = {
+            'Dates': dates('%Y%m%d'),
+            'User_ID': user_ids('u'),
+            **location(['Country', 'Region', 'City']),
+            **versions(['App_Version', 'OS_Version']),
+            'App_Event': label_array(ONBOARDING_EVENTS, np.where(rng.random(rows) < 0.1, -1, steps)),
+        }
+    elif kind == 'explore_journey':
+        actions = funnel_steps(rng, rows, len(EXPLORE_ACTIONS), step_continue_rate)
+        pause = EXPLORE_ACTIONS.index('User click on pause button on sampling UI video')
+        columns = {
+            'event_date': pa.array([calendar[index] for index in range(days)], pa.date32()).take(pa.array(day)),
+            'newly_loggedin_user': user_ids('B'),
+            'age': choice(AGE_RANGES, missing=0.2),
+            'profession': choice(PROFESSIONS, missing=0.2),
+            'gender': choice(GENDERS, missing=0.2),
+            'actions': label_array(EXPLORE_ACTIONS, actions),
+            'duration_seconds': pa.array(np.where(actions == pause, rng.exponential(45, rows).astype(np.int64), 0)),
+            **location(['country', 'region', 'city']),
+            **versions(['app_version', 'os_version']),
+        }
+    elif kind == 'set_goal':
+        goal_sheet = rng.random(rows) < 0.3
+        picked = goal_sheet & (rng.random(rows) < 0.5)
+        custom = picked & (rng.random(rows) < 0.15)
+        goals = np.where(custom, len(GOALS), rng.integers(0, len(GOALS), rows))
+        columns = {
+            'event_date': dates('%Y%m%d'),
+            'beesi_user_id': user_ids('B'),
+            'gender': choice(GENDERS, missing=0.2),
+            'age_range': choice(AGE_RANGES, missing=0.2),
+            'profession': choice(PROFESSIONS, missing=0.2),
+            'event_name': label_array(['screen_load', 'view_click'], np.where(goal_sheet, picked, rng.integers(0, 2, rows)).astype(int)),
+            'screen_name': label_array(['set_goal_bottomsheet'] + [screen for _, screen in ONBOARDING_STEPS], np.where(goal_sheet, 0, rng.integers(1, len(ONBOARDING_STEPS) + 1, rows))),
+            'sources': label_array(GOAL_SOURCES, np.where(goal_sheet, rng.integers(0, len(GOAL_SOURCES), rows), -1)),
+            'goal_selected': label_array(GOALS + ['My own goal'], np.where(picked, goals, -1)),
+            'is_custom_goal': pa.array(custom.astype(np.int64), mask=~picked),
+            **location(['country', 'region', 'city']),
+            **versions(['app_version', 'os_version']),
+        }
+    elif kind == 'scroll_depth':
+        columns = {
+            'Dates': dates('%Y-%m-%d'),
+            'User_ID': user_ids('w'),
+            'User_Type': choice(['New User', 'Returning User']),
+            'max_scroll_percent': pa.array(rng.integers(0, 11, rows) * 10),
+        }
+    elif kind == 'webapp_events':
+        columns = {
+            'Dates': dates('%Y-%m-%d'),
+            'Event_Name': label_array(WEB_EVENTS, funnel_steps(rng, rows, len(WEB_EVENTS), step_continue_rate)),
+            'Device': choice(['Android', 'iOS', 'Desktop', 'Unknown']),
+            **location(['Country', 'Region', 'City']),
+            'User_ID': user_ids('w'),
+            'User_Type': choice(['New User', 'Returning User']),
+        }
+    else:
+        raise ValueError(f"Unknown result kind {kind!r}; expected one of {RESULT_KINDS}")
+    return pa.table(columns)
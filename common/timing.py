@@ -0,0 +1,87 @@
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+
+import pandas as pd
+import streamlit as st
+
+from common.budget import track_page_usage
+
+# Per-run latency breakdown. Pages call timer.lap(stage) after each stage
+# (load, transform, render) and timer.finish() at the end; queries add their
+# BigQuery job, download and conversion times. Every page run and query is
+# logged as one JSON line, and the breakdown can be shown in a collapsible
+# panel with DASHBOARD_TIMING_PANEL=1 or ?timing=1 in the page URL.
+TIMING_PANEL = os.environ.get("DASHBOARD_TIMING_PANEL", "0") == "1"
+
+logger = logging.getLogger("dashboard.timing")
+if not logger.handlers:
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+
+def log_event(event, **fields):
+    logger.info(json.dumps({"event": event, "ts": round(time.time(), 3), **fields}, default=str))
+
+
+class PageTimer:
+    def __init__(self, page):
+        self.page = page
+        self.stages = []
+        self.queries = []
+        self._started = time.perf_counter()
+        self._last_lap = self._started
+        self._lock = threading.Lock()
+
+    # Time since the previous lap (or the start of the run)
+    def lap(self, stage, **fields):
+        now = time.perf_counter()
+        with self._lock:
+            self.stages.append({"stage": stage, "seconds": round(now - self._last_lap, 4), **fields})
+            self._last_lap = now
+
+    def record_query(self, **fields):
+        with self._lock:
+            self.queries.append(fields)
+        log_event("query", page=self.page, **fields)
+
+    # Log the run; the panel is only drawn from the page's own script thread
+    def finish(self, panel=True):
+        total = round(time.perf_counter() - self._started, 4)
+        log_event("page_run", page=self.page, total_seconds=total, stages=self.stages, queries=len(self.queries))
+        if panel and (TIMING_PANEL or st.query_params.get("timing") == "1"):
+            with st.expander("Timing", expanded=False):
+                st.caption(f"Total {total:.2f}s")
+                st.dataframe(pd.DataFrame(self.stages), use_container_width=True, hide_index=True)
+                if self.queries:
+                    st.dataframe(pd.DataFrame(self.queries), use_container_width=True, hide_index=True)
+
+
+# Timer of the page run in progress; like the byte usage (common.budget) it
+# follows executor tasks through their copied context
+_current_timer = contextvars.ContextVar("page_timer", default=None)
+
+
+def start_page_timer(page):
+    timer = PageTimer(page)
+    _current_timer.set(timer)
+    return timer
+
+
+def current_timer():
+    timer = _current_timer.get()
+    if timer is None:
+        timer = PageTimer("unknown page")
+    return timer
+
+
+# Start of a page run: the bytes its queries scan, checked against the page's
+# budget (see common.budget), and its per-stage timings
+def start_page(page):
+    return track_page_usage(page), start_page_timer(page)
@@ -0,0 +1,346 @@
+import numpy as np
+import pandas as pd
+
+from common.distinct import codes, distinct_per, distinct_pivot, user_codes
+from common.engine import on_engine
+from common.funnels import ONBOARDING_LABELS, WATCH_DURATION_EDGES, watch_duration_columns
+from common.ordered_funnel import ordered_funnel_table
+
+# What the pages do to a query result before displaying it. The steps live
+# here rather than inline in the page scripts so benchmarks/ can time the
+# exact code the pages run, on synthetic frames of any size. Filtering uses
+# the dataset's row index (common.row_index) when the page passes one;
+# filtering and distinct counts run on the optional columnar engine
+# (common.engine) when it is enabled, and otherwise in pandas, distinct
+# counts on integer user codes (common.distinct).
+
+
+# New User Onboarding: drop the rows outside each non-empty selection
+def filter_rows(df, filters, index=None):
+    if index is not None and index.covers(df, filters):
+        return index.filter(df, filters)
+    filtered = on_engine(df, "filter", filters)
+    if filtered is not None:
+        return filtered
+    for column, selected in filters.items():
+        if selected:
+            df = df[df[column].isin(selected)]
+    return df
+
+
+# WebApp pages: selected date range, then every non-empty selection, with
+# missing values matching 'Unknown'
+def filter_events(df, start_date, end_date, filters, date_column='Dates', index=None):
+    if index is not None and index.covers(df, filters, date_column):
+        return index.filter(df, filters, start_date, end_date, missing='Unknown')
+    filtered = on_engine(df, "filter", filters, date_column, start_date, end_date, missing='Unknown')
+    if filtered is not None:
+        return filtered.copy()
+    mask = (df[date_column].dt.date >= start_date) & (df[date_column].dt.date <= end_date)
+    for column, selected in filters.items():
+        if selected:
+            mask &= df[column].fillna('Unknown').isin(selected)
+    return df[mask].copy()
+
+
+# Distinct users per day and event, plus the day's distinct users in 'Total Users'
+def distinct_users_pivot(df, date_column, event_column, user_column):
+    counts = on_engine(df, "distinct_pivot", date_column, event_column, user_column)
+    if counts is None:
+        counts = distinct_pivot(df, date_column, event_column, user_column)
+    pivot_df, totals = counts
+    pivot_df['Total Users'] = totals
+    return pivot_df
+
+
+# New User Onboarding table: share of the day's new users reaching each step
+def new_user_funnel(df, column_order):
+    pivot_df = distinct_users_pivot(df, 'event_date', 'Descriptive_Event', 'user_pseudo_id')
+
+    # Calculate percentages
+    for col in pivot_df.columns:
+        if col != 'Total Users':
+            pivot_df[f'{col} (%)'] = pivot_df[col] / pivot_df['Total Users'] * 100
+
+    # Select percentage columns and Total Users
+    percentage_cols = [col for col in pivot_df.columns if '(%)' in col or col == 'Total Users']
+    pivot_df = pivot_df[percentage_cols]
+
+    # Rename columns
+    pivot_df.columns = [col.replace(' (%)', '') for col in pivot_df.columns]
+
+    pivot_df = pivot_df.sort_index(ascending=False)
+    pivot_df.index = pivot_df.index.strftime('%Y-%m-%d')
+    pivot_df.index.name = 'Dates'
+
+    for col in column_order:
+        if col not in pivot_df.columns and col != 'Dates':
+            pivot_df[col] = 0
+
+    return pivot_df.reindex(columns=[col for col in column_order if col in pivot_df.columns])
+
+
+# New User Onboarding ordered funnel: new users doing the onboarding steps in
+# order, each within its window of the previous one: `windows` is seconds for
+# every step or {label: seconds} per step (see common.ordered_funnel)
+def new_user_ordered_funnel(df, windows):
+    return ordered_funnel_table(df, ONBOARDING_LABELS, 'user_pseudo_id', 'Descriptive_Event', 'event_timestamp', windows)
+
+
+# Total User Onboarding table: `pivot_df` holds per-day user counts by step
+# and 'Total Users'; every step becomes a share of the day's users
+def total_users_funnel(pivot_df, column_order):
+    # Ensure all columns are present, add missing ones with 0s
+    for col in column_order:
+        if col not in pivot_df.columns:
+            pivot_df[col] = 0
+
+    # Reorder columns
+    pivot_df = pivot_df.reindex(columns=[col for col in column_order if col in pivot_df.columns])
+
+    # Calculate percentages
+    for col in pivot_df.columns:
+        if col != 'Total Users':
+            pivot_df[col] = (pivot_df[col] / pivot_df['Total Users']).fillna(0) * 100
+
+    # Format the pivot table
+    pivot_df = pivot_df.sort_index(ascending=False)
+    pivot_df.index = pivot_df.index.strftime('%Y-%m-%d')
+    pivot_df.index.name = 'Dates'
+    return pivot_df
+
+
+# Explore Journey watch-time histogram: every day's users by their longest
+# watch of the video that day, bucketed by `edges` (see
+# common.funnels.WATCH_DURATION_EDGES), as shares of the day's users. The
+# per-user maximum is taken over packed (day, user) codes, buckets come from
+# one searchsorted and the day x bucket counts from one bincount.
+def watch_duration_histogram(df, edges=WATCH_DURATION_EDGES):
+    days, day_values = codes(df['event_date'])
+    users, user_count = user_codes(df['newly_loggedin_user'])
+    keep = (days >= 0) & (users >= 0)
+    durations = df['duration_seconds'].to_numpy(dtype='float64', na_value=np.nan)[keep]
+    keys = days[keep] * user_count + users[keep]
+
+    cells = len(day_values) * user_count
+    if cells <= 4 * len(keys):
+        # Small (day, user) grid: one scatter-max into it, several times
+        # faster than hashing the keys; NaN where a user has no duration
+        grid = np.full(cells, np.nan)
+        np.fmax.at(grid, keys, durations)
+        user_keys = np.flatnonzero(np.bincount(keys, minlength=cells))
+        max_durations = grid[user_keys]
+    else:
+        maxima = pd.Series(durations).groupby(keys, sort=False).max()
+        user_keys, max_durations = maxima.index.to_numpy(), maxima.to_numpy()
+    user_days = user_keys // user_count
+
+    # Users without any duration count towards the day's users only
+    timed = ~np.isnan(max_durations)
+    buckets = np.searchsorted(edges, max_durations[timed], side='left')
+    bucket_count = len(edges) + 1
+    counts = np.bincount(
+        user_days[timed] * bucket_count + buckets, minlength=len(day_values) * bucket_count
+    ).reshape(len(day_values), bucket_count)
+    totals = np.bincount(user_days, minlength=len(day_values))[:, None]
+
+    shares = np.divide(counts * 100.0, totals, out=np.zeros(counts.shape), where=totals > 0)
+    return pd.DataFrame(shares, index=pd.Index(day_values, name='event_date'), columns=watch_duration_columns(edges))
+
+
+# Explore Journey table: share of the day's logged-in users taking each
+# action, and how long they watched the explainer video
+def explore_journey_table(df, column_order, edges=WATCH_DURATION_EDGES):
+    # Users per day and action, and per day in Total Users
+    counts = on_engine(df, "distinct_pivot", 'event_date', 'actions', 'newly_loggedin_user')
+    if counts is None:
+        counts = distinct_pivot(df, 'event_date', 'actions', 'newly_loggedin_user')
+    pivot_df, totals = counts
+    pivot_df = pivot_df.reindex(totals.index, fill_value=0)
+
+    # Percentages of the day's users for every action, in one division
+    total_users = totals.to_numpy(dtype='float64')[:, None]
+    shares = np.divide(
+        pivot_df.to_numpy(dtype='float64') * 100, total_users,
+        out=np.zeros(pivot_df.shape), where=total_users > 0,
+    )
+    pivot_df = pd.DataFrame(shares, index=pivot_df.index, columns=pivot_df.columns)
+    pivot_df['Total Users'] = totals
+
+    watch_durations = watch_duration_histogram(df, edges)
+    pivot_df = pivot_df.join(watch_durations, how='left').fillna(0)
+
+    # Reorder columns, keeping only those that exist in the data
+    pivot_df = pivot_df.reset_index()
+    pivot_df = pivot_df.reindex(columns=[col for col in column_order if col in pivot_df.columns])
+
+    # Format the pivot table
+    pivot_df = pivot_df.sort_values('event_date', ascending=False)
+    pivot_df['event_date'] = pivot_df['event_date'].dt.strftime('%Y-%m-%d')
+    pivot_df = pivot_df.set_index('event_date')
+    pivot_df.index.name = 'Dates'
+    return pivot_df
+
+
+scroll_percentages = [20, 40, 60, 80, 100]
+
+
+# Scroll Depth table: bounce rate and share of users reaching each depth
+def process_scroll_data(df):
+    total_users = on_engine(df, "scroll_depth", scroll_percentages, pd.Timestamp.now().normalize())
+    if total_users is None:
+        df = df.copy()
+        df.loc[:, 'Dates'] = df['Dates'].fillna(pd.Timestamp.now().date())
+
+        total_users = distinct_per(df, 'Dates', 'User_ID').reset_index(name='user_count')
+
+        interacted_users = distinct_per(df[df['max_scroll_percent'] > 0], 'Dates', 'User_ID').reset_index(name='interacted_users')
+        total_users = pd.merge(total_users, interacted_users, on='Dates', how='left')
+        total_users['interacted_users'] = total_users['interacted_users'].fillna(0)
+
+        for percent in scroll_percentages:
+            users_scrolled = distinct_per(df[df['max_scroll_percent'] >= percent], 'Dates', 'User_ID').reset_index(name=f'scrolled_{percent}')
+            total_users = pd.merge(total_users, users_scrolled, on='Dates', how='left')
+
+    total_users['bounce_percent'] = ((total_users['user_count'] - total_users['interacted_users']) / total_users['user_count'] * 100).round(2)
+    for percent in scroll_percentages:
+        total_users[f'percent_scrolled_{percent}'] = (total_users[f'scrolled_{percent}'] / total_users['user_count'] * 100).round(2)
+
+    total_users = total_users.sort_values('Dates', ascending=False)
+    total_users['Dates'] = total_users['Dates'].dt.strftime('%Y-%m-%d')
+    return total_users
+
+
+# WebApp All Users table: distinct users per day and event
+def webapp_event_pivot(df, column_order):
+    # A missing User_ID counts as one more user
+    counts = on_engine(df, "distinct_pivot", 'Dates', 'Event_Name', 'User_ID', count_missing=True)
+    if counts is None:
+        counts = distinct_pivot(df, 'Dates', 'Event_Name', 'User_ID', count_missing=True)
+    pivot_df = counts[0]
+
+    pivot_df = pivot_df.sort_index(ascending=False)
+    pivot_df.index = pivot_df.index.strftime('%Y-%m-%d')
+    pivot_df.index.name = 'Dates'
+    return pivot_df.reindex(columns=column_order)
+
+
+goal_categories = [
+    'iPhone', 'Gadgets', 'Electronics', 'Laptop', 'Travel', 'Luxury',
+    'Shopping', 'Jewellery', 'Savings', 'Host Party', 'Bike', 'Car',
+    'Online Education'
+]
+
+
+def categorize_goal(row):
+    if row['is_custom_goal'] == 1:
+        return 'Others'
+    for category in goal_categories:
+        if category.lower() in row['goal_selected'].lower():
+            return category
+    return 'Others'
+
+
+# Set Goal: the goals picked on the bottom sheet, one row per user holding
+# their latest goal and its category
+def latest_goals(goals_df):
+    # Create a single boolean mask
+    mask = (
+        (goals_df['event_name'] == 'view_click') &
+        (goals_df['screen_name'] == 'set_goal_bottomsheet') &
+        (goals_df['goal_selected'].notnull())
+    )
+
+    # Apply the mask in a single operation
+    goals_df = goals_df[mask]
+    if goals_df.empty:
+        return goals_df
+
+    goals_df = goals_df.copy()
+    goals_df['goal_category'] = goals_df.apply(categorize_goal, axis=1)
+
+    # Get the latest goal for each user
+    return goals_df.sort_values('event_date').groupby('beesi_user_id', observed=True).last().reset_index()
+
+
+# Set Goal table: users with a goal and the share of them in each category
+def goal_table(goals_df):
+    total_users = goals_df['beesi_user_id'].nunique()
+    goal_counts = goals_df['goal_category'].value_counts()
+    goal_percentages = (goal_counts / total_users * 100).round(2)
+
+    return pd.DataFrame({
+        'Total Users': [total_users],
+        **{goal: [percentage] for goal, percentage in goal_percentages.items()}
+    })
+
+
+source_categories = {
+    'Home Screen': ['set_now_home_screen', 'create_beesi_home_screen'],
+    'Settings Screen': ['edit_goal_settings_screen'],
+    'Group Screen': ['set_now_groups_screen', 'create_beesi_groups_screen'],
+    'Reward Screen Flow': ['set_goal_reward_screen']
+}
+
+
+def categorize_source(source):
+    for category, sources in source_categories.items():
+        if source in sources:
+            return category
+    return None
+
+
+# Set Goal sources table: logged-in users, those with a goal and the share of
+# the latter setting it from each source category; empty when no row comes
+# from a known source
+def source_table(sources_df):
+    total_logged_in = sources_df['beesi_user_id'].nunique()
+    users_with_goals = sources_df[sources_df['goal_selected'].notnull()]['beesi_user_id'].nunique()
+
+    sources_df = sources_df[sources_df['sources'].notnull()].copy()
+    sources_df['source_category'] = sources_df['sources'].apply(categorize_source)
+    sources_df = sources_df[sources_df['source_category'].notnull()]  # Keep only the specified categories
+    if sources_df.empty:
+        return pd.DataFrame()
+
+    source_counts = sources_df.groupby('source_category', observed=True)['beesi_user_id'].nunique()
+    source_percentages = (source_counts / users_with_goals * 100).round(2)
+
+    sources_pivot = pd.DataFrame({
+        'Total Logged-in Users': [total_logged_in],
+        'Users Who Set Goals': [users_with_goals],
+        **{f'{category} %': [percentage] for category, percentage in source_percentages.items()}
+    })
+
+    # Reorder columns
+    column_order = ['Total Logged-in Users', 'Users Who Set Goals'] + \
+                   [col for col in sources_pivot.columns if col not in ['Total Logged-in Users', 'Users Who Set Goals']]
+    return sources_pivot[column_order]
+
+
+# The funnel tables' look: counts in `count_columns`, every other column a percentage
+def percentage_table_style(df, count_columns=('Total Users',), count_format='{:.0f}'):
+    return (
+        df.style
+        .format({col: count_format for col in count_columns})
+        .format({col: '{:.2f}%' for col in df.columns if col not in count_columns})
+        .set_properties(**{'text-align': 'right'})
+        .set_table_styles([
+            {'selector': 'th', 'props': [('text-align', 'left')]},
+            {'selector': 'td', 'props': [('text-align', 'right')]},
+        ])
+    )
+
+
+# The WebApp pages' striped blue-header look
+def striped_table_style(df, formats):
+    return df.style.set_properties(**{
+        'background-color': '#f0f2f6',
+        'color': 'black',
+        'border-color': 'white',
+        'text-align': 'center'
+    }).set_table_styles([
+        {'selector': 'th', 'props': [('background-color', '#4e73df'), ('color', 'white')]},
+        {'selector': 'tr:nth-of-type(even)', 'props': [('background-color', '#e6e9f0')]},
+        {'selector': 'td', 'props': [('padding', '10px')]},
+    ]).format(formats)
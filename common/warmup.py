@@ -0,0 +1,149 @@
+import datetime
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import streamlit as st
+
+from common import queries
+from common.timing import start_page
+from common.data_access import default_date_range, load_filter_options, run_queries, run_query
+
+# Every page's default load is re-run in the background, so the caches are
+# refreshed (and, once a source table changes, refetched) before a viewer
+# opens the page. Runs are spread out by a random jitter so the tasks do not
+# all hit BigQuery at the same moment.
+CACHE_WARMING = os.environ.get("DASHBOARD_CACHE_WARMING", "1") != "0"
+WARM_INTERVAL = int(os.environ.get("DASHBOARD_WARM_INTERVAL", 300))
+WARM_JITTER = 0.2
+# Kept apart from the query executor, whose workers the tasks wait on
+WARM_WORKERS = 2
+
+
+def no_filters(columns):
+    return {name: [] for name in columns}
+
+
+# What each page loads when it is opened with its default selections, keyed
+# by page name (which also selects the page's byte budget)
+def warm_overview(start_date, end_date):
+    run_query(queries.OVERVIEW_QUERY, start_date, end_date, 'event_date')
+
+
+def warm_new_user_onboarding(start_date, end_date):
+    run_query(queries.NEW_USER_ONBOARDING_QUERY, start_date, end_date, 'event_date')
+
+
+def warm_total_users_onboarding(start_date, end_date):
+    columns = queries.TOTAL_USERS_ONBOARDING_FILTERS
+    load_filter_options(queries.TOTAL_USERS_ONBOARDING_QUERY, start_date, end_date, 'Dates', columns)
+    run_query(queries.TOTAL_USERS_AGGREGATE_QUERY, start_date, end_date, 'Dates', no_filters(columns), exact_filters=True)
+
+
+def warm_explore_journey(start_date, end_date):
+    columns = queries.EXPLORE_JOURNEY_FILTERS
+    load_filter_options(queries.EXPLORE_JOURNEY_QUERY, start_date, end_date, 'event_date', columns)
+    run_query(queries.EXPLORE_JOURNEY_QUERY, start_date, end_date, 'event_date', no_filters(columns))
+
+
+def warm_set_goal(start_date, end_date):
+    columns = queries.SET_GOAL_FILTERS
+    load_filter_options(queries.SET_GOAL_QUERY, start_date, end_date, 'event_date', columns)
+    run_query(queries.SET_GOAL_QUERY, start_date, end_date, 'event_date', no_filters(columns))
+
+
+def warm_scroll_depth(start_date, end_date):
+    run_query(queries.SCROLL_DEPTH_QUERY, start_date, end_date, 'Dates')
+
+
+def warm_webapp_all_users(start_date, end_date):
+    run_queries({'event_df': queries.WEBAPP_EVENTS_QUERY})
+
+
+WARM_TASKS = {
+    'Overview': warm_overview,
+    'New User Onboarding': warm_new_user_onboarding,
+    'Total User Onboarding': warm_total_users_onboarding,
+    'Explore Journey': warm_explore_journey,
+    'Set Goal Dashboard': warm_set_goal,
+    'Scroll Depth Analytics': warm_scroll_depth,
+    'Web App All Users': warm_webapp_all_users,
+}
+
+
+# Runs each task every `interval` seconds, or its own interval from
+# `task_intervals` (give or take the jitter), on a small worker pool, never
+# running the same task twice at once, and keeps the outcome of the latest
+# run of each for display
+class CacheWarmer:
+    def __init__(self, tasks, interval=WARM_INTERVAL, jitter=WARM_JITTER, workers=WARM_WORKERS, task_intervals=None):
+        self.tasks = tasks
+        self.interval = interval
+        self.task_intervals = task_intervals or {}
+        self.jitter = jitter
+        self.status = {
+            name: {'last_run': None, 'duration_s': None, 'runs': 0, 'error': None}
+            for name in tasks
+        }
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="warmup")
+        self._running = set()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._schedule, name="warmup-scheduler", daemon=True)
+            self._thread.start()
+
+    def _next_delay(self, name):
+        return self.task_intervals.get(name, self.interval) * (1 + random.uniform(-self.jitter, self.jitter))
+
+    def _schedule(self):
+        now = time.monotonic()
+        # The first round is staggered too, so a restart does not burst
+        next_runs = {name: now + random.uniform(0, self.jitter * self.interval) for name in self.tasks}
+        while True:
+            now = time.monotonic()
+            for name, due in next_runs.items():
+                with self._lock:
+                    if due > now or name in self._running:
+                        continue
+                    self._running.add(name)
+                self._pool.submit(self._run, name)
+                next_runs[name] = now + self._next_delay(name)
+            time.sleep(1)
+
+    def _run(self, name):
+        started_at = datetime.datetime.now()
+        started = time.monotonic()
+        error = None
+        try:
+            _, timer = start_page(name)
+            start_date, end_date = default_date_range()
+            self.tasks[name](start_date, end_date)
+            timer.lap("load")
+            timer.finish(panel=False)
+        except Exception as exc:
+            error = str(exc)
+        with self._lock:
+            self._running.discard(name)
+            status = self.status[name]
+            status['last_run'] = started_at
+            status['duration_s'] = round(time.monotonic() - started, 2)
+            status['runs'] += 1
+            status['error'] = error
+
+    def snapshot(self):
+        with self._lock:
+            return [{'task': name, 'running': name in self._running, **status} for name, status in self.status.items()]
+
+
+# One scheduler per process, started the first time the home page runs
+@st.cache_resource
+def start_cache_warmer():
+    warmer = CacheWarmer(WARM_TASKS)
+    if CACHE_WARMING:
+        warmer.start()
+    return warmer
@@ -1,10 +1,18 @@
 import streamlit as st
 import pandas as pd
-from google.oauth2 import service_account
-from google.cloud import bigquery
+from common.data_access import data_watermark, default_date_range, frame_filter_options, frame_row_index, run_query
+from common import queries
+from common.funnels import NEW_USER_COLUMNS, ONBOARDING_LABELS
+from common.budget import stop_over_budget
+from common.memo import memoize_transform
+from common.ordered_funnel import STEP_WINDOW_SECONDS
+from common.timing import start_page
+from common.transforms import filter_rows, new_user_funnel, new_user_ordered_funnel, percentage_table_style
 
 st.set_page_config(page_title="Android App New User Events Dashboard", page_icon="📊", layout="wide", initial_sidebar_state="collapsed")
 
+usage, timer = start_page("New User Onboarding")
+
 # if st.button("← Back to Home"):
 #     st.switch_page("home.py")
 
@@ -30,240 +38,95 @@ st.markdown("""
 
 st.title("Android App New User Events Dashboard")
 
-credentials = service_account.Credentials.from_service_account_info(
-    st.secrets["gcp_service_account"]
-)
-client = bigquery.Client(credentials=credentials)
-
-@st.cache_data(ttl=3600)
-def run_query(query):
-    query_job = client.query(query)
-    return query_job.to_dataframe()
-
-sql_query = """
-WITH
-  new_user AS (
-  SELECT
-    event_date,
-    user_pseudo_id,
-    CASE
-      WHEN ( SELECT value.int_value FROM UNNEST(event_params) WHERE KEY = 'previous_first_open_count') > 0 THEN 'reinstall'
-      ELSE 'fresh_install'
-  END
-    AS install_type
-  FROM
-    `swap-vc-prod.analytics_325691371.events_*`
-  WHERE
-    event_name = 'first_open'
-    AND platform = 'ANDROID'),
-  custom_events AS (
-  SELECT
-    user_pseudo_id,
-    event_date,
-    event_name,
-    ( SELECT
-      value.string_value
-    FROM
-      UNNEST(event_params)
-    WHERE
-      KEY = 'screen_name') AS screen_name,
-    geo.country AS Country,
-    geo.region AS Region,
-    geo.city AS City,
-    app_info.version AS App_Version,
-    device.operating_system_version AS OS_Version,
-  FROM
-    `swap-vc-prod.analytics_325691371.events_*`
-  WHERE
-    platform = 'ANDROID'
-    AND event_name IN ('screen_load',
-      'view_click')
-    AND (
-    SELECT
-      value.string_value
-    FROM
-      UNNEST(event_params)
-    WHERE
-      KEY = 'screen_name') IN ( 'splash_screen',
-      'initial_login_screen',
-      'login_screen',
-      'verify_otp_screen',
-      'create_profile_screen',
-      'bina_savings_tode',
-      'dost_hain',
-      'to_beesi_karo_na',
-      'how_beesi_works',
-      'home_screen' ))
-SELECT
-  n.event_date,
-  n.user_pseudo_id,
-  n.install_type,
-  c.event_name,
-  c.screen_name, 
-  c.App_Version,
-  c.OS_Version,
-  c.Country,
-  c.Region,
-  c.City,
-  CASE
-    WHEN c.Event_Name = 'screen_load' AND c.Screen_Name = 'splash_screen' THEN 'Splash'
-    WHEN c.Event_Name = 'screen_load' AND c.Screen_Name = 'initial_login_screen' THEN 'Initial login screen'
-    WHEN c.Event_Name = 'view_click' AND c.Screen_Name = 'initial_login_screen' THEN 'User click on login button'
-    WHEN c.Event_Name = 'screen_load' AND c.Screen_Name = 'login_screen' THEN 'Login screen load'
-    WHEN c.Event_Name = 'view_click' AND c.Screen_Name = 'login_screen' THEN 'User click on continue button after login screen'
-    WHEN c.Event_Name = 'screen_load' AND c.Screen_Name = 'verify_otp_screen' THEN 'Land on OTP screen'
-    WHEN c.Event_Name = 'view_click' AND c.Screen_Name = 'verify_otp_screen' THEN 'User click on continue button after otp'
-    WHEN c.Event_Name = 'screen_load' AND c.Screen_Name = 'create_profile_screen' THEN 'Profile Screen'
-    WHEN c.Event_Name = 'view_click' AND c.Screen_Name = 'create_profile_screen' THEN 'User click on Continue button after profile screen'
-    WHEN c.Event_Name = 'screen_load' AND c.Screen_Name = 'bina_savings_tode' THEN 'User land on Bina Savings tode screen'
-    WHEN c.Event_Name = 'view_click' AND c.Screen_Name = 'bina_savings_tode' THEN 'User clicks on Yes But kaise'
-    WHEN c.Event_Name = 'screen_load' AND c.Screen_Name = 'dost_hain' THEN 'User land on Dost hain Screen'
-    WHEN c.Event_Name = 'view_click' AND c.Screen_Name = 'dost_hain' THEN 'User clicks on haan dost hain'
-    WHEN c.Event_Name = 'screen_load' AND c.Screen_Name = 'to_beesi_karo_na' THEN 'User land on To Beesi Karo na Screen'
-    WHEN c.Event_Name = 'view_click' AND c.Screen_Name = 'to_beesi_karo_na' THEN 'User clicks on nice'
-    WHEN c.Event_Name = 'screen_load' AND c.Screen_Name = 'how_beesi_works' THEN 'User land on How Beesi Works Screen'
-    WHEN c.Event_Name = 'view_click' AND c.Screen_Name = 'how_beesi_works' THEN 'User clicks on got it btn'
-    WHEN c.Event_Name = 'screen_load' AND c.Screen_Name = 'home_screen' THEN 'User lands on Home Screen'
-    WHEN c.Event_Name IS NULL THEN 'No custom event'
-    ELSE 'Other: ' || c.Event_Name || ' - ' || c.Screen_Name
-  END AS Descriptive_Event
-FROM
-  new_user AS n
-LEFT JOIN
-  custom_events AS c
-ON
-  n.user_pseudo_id = c.user_pseudo_id
-  AND n.event_date = c.event_date
-"""
-
-df = run_query(sql_query)
-df['event_date'] = pd.to_datetime(df['event_date'], format='%Y%m%d')
-
-# Function to clean options
-def clean_options(options):
-    return sorted([opt for opt in options if opt is not None and opt != ''])
+sql_query = queries.NEW_USER_ONBOARDING_QUERY
+
+# Columns the filters below select on
+filter_columns = ['OS_Version', 'App_Version', 'install_type', 'Country', 'Region', 'City']
 
 # Create columns for filter categories
 col1, col2 = st.columns(2)
 
+default_start_date, default_end_date = default_date_range()
+
 # Date Filter
 with col1:
     with st.expander("Date Filter", expanded=True):
-        start_date = st.date_input("Start Date", value=df['event_date'].min().date(), key='event_start_date')
-        end_date = st.date_input("End Date", value=df['event_date'].max().date(), key='event_end_date')
+        start_date = st.date_input("Start Date", value=default_start_date, key='event_start_date')
+        end_date = st.date_input("End Date", value=default_end_date, key='event_end_date')
+
+# Only the selected days are scanned, and days already cached are not queried again
+def load_events():
+    df = run_query(sql_query, start_date, end_date, 'event_date')
+    df['event_date'] = pd.to_datetime(df['event_date'], format='%Y%m%d')
+    return df
+
+# The loaded, typed events are shared by every rerun and viewer with the same
+# days and data version, so changing a filter or a window reloads nothing
+with stop_over_budget():
+    df = memoize_transform("New User Onboarding", data_watermark(sql_query, start_date, end_date), load_events, 'events', start_date, end_date)
+timer.lap("load")
+
+# Sorted options and matching rows per filter, indexed once per date range
+# and data version
+filter_options = frame_filter_options(df, sql_query, filter_columns, start_date, end_date)
+row_index = frame_row_index(df, sql_query, filter_columns, start_date=start_date, end_date=end_date)
+timer.lap("filter_options")
 
 # Version Type Filter
 with col2:
     with st.expander("Version Type Filter", expanded=True):
-        os_version_options = clean_options(df['OS_Version'].unique())
+        os_version_options = filter_options.options('OS_Version')
         os_version_filter = st.multiselect('OS Version', options=os_version_options, key='os_version_filter')
         
-        app_version_options = clean_options(df['App_Version'].unique())
+        app_version_options = filter_options.options('App_Version')
         app_version_filter = st.multiselect('App Version', options=app_version_options, key='app_version_filter')
 
 # Install Type Filter (in a new row)
 with st.expander("Install Type Filter", expanded=True):
-    install_type_options = clean_options(df['install_type'].unique())
+    install_type_options = filter_options.options('install_type')
     install_type_filter = st.multiselect('Install Type', options=install_type_options, key='install_type_filter')
 
 # Location Filter (in a new row)
 with st.expander("Location Filter", expanded=True):
     col1, col2, col3 = st.columns(3)
     with col1:
-        country_options = clean_options(df['Country'].unique())
+        country_options = filter_options.options('Country')
         country_filter = st.multiselect('Country', options=country_options, key='country_filter')
     with col2:
-        region_options = clean_options(df['Region'].unique())
+        region_options = filter_options.options('Region')
         region_filter = st.multiselect('Region', options=region_options, key='region_filter')
     with col3:
-        city_options = clean_options(df['City'].unique())
+        city_options = filter_options.options('City')
         city_filter = st.multiselect('City', options=city_options, key='city_filter')        
-# Apply filters
-df = df[(df['event_date'].dt.date >= start_date) & (df['event_date'].dt.date <= end_date)]
-
-if install_type_filter:
-    df = df[df['install_type'].isin(install_type_filter)]
-if app_version_filter:
-    df = df[df['App_Version'].isin(app_version_filter)]
-if os_version_filter:
-    df = df[df['OS_Version'].isin(os_version_filter)]
-if country_filter:
-    df = df[df['Country'].isin(country_filter)]
-if region_filter:
-    df = df[df['Region'].isin(region_filter)]
-if city_filter:
-    df = df[df['City'].isin(city_filter)]
-
-# After applying filters
-pivot_df = df.pivot_table(
-    values='user_pseudo_id',
-    index='event_date',
-    columns='Descriptive_Event',
-    aggfunc='nunique',
-    fill_value=0
+filters = {
+    'install_type': install_type_filter,
+    'App_Version': app_version_filter,
+    'OS_Version': os_version_filter,
+    'Country': country_filter,
+    'Region': region_filter,
+    'City': city_filter,
+}
+
+# Funnel steps in order (see common.funnels)
+column_order = NEW_USER_COLUMNS
+
+# Apply filters and build the funnel; the table is shared by every rerun and
+# viewer with the same days, data version and selections
+pivot_df = memoize_transform(
+    "New User Onboarding",
+    data_watermark(sql_query, start_date, end_date),
+    lambda: new_user_funnel(filter_rows(df, filters, index=row_index), column_order),
+    start_date, end_date, filters,
 )
-
-# Calculate Total Users correctly
-pivot_df['Total Users'] = df.groupby('event_date')['user_pseudo_id'].nunique()
-
-# Calculate percentages
-for col in pivot_df.columns:
-    if col != 'Total Users':
-        pivot_df[f'{col} (%)'] = pivot_df[col] / pivot_df['Total Users'] * 100
-
-# Select percentage columns and Total Users
-percentage_cols = [col for col in pivot_df.columns if '(%)' in col or col == 'Total Users']
-pivot_df = pivot_df[percentage_cols]
-
-# Rename columns
-pivot_df.columns = [col.replace(' (%)', '') for col in pivot_df.columns]
-
-pivot_df = pivot_df.sort_index(ascending=False)
-pivot_df.index = pivot_df.index.strftime('%Y-%m-%d')
-pivot_df.index.name = 'Dates'
-
-column_order = [
-    'Dates',
-    'Total Users',
-    'Splash',
-    'Initial login screen',
-    'User click on login button',
-    'Login screen load',
-    'User click on continue button after login screen',
-    'Land on OTP screen',
-    'User click on continue button after otp',
-    'Profile Screen',
-    'User click on Continue button after profile screen',
-    'User land on Bina Savings tode screen',
-    'User clicks on Yes But kaise',
-    'User land on Dost hain Screen',
-    'User clicks on haan dost hain',
-    'User land on To Beesi Karo na Screen',
-    'User clicks on nice',
-    'User land on How Beesi Works Screen',
-    'User clicks on got it btn',
-    'User lands on Home Screen',
-    'No custom event'
-]
-
-for col in column_order:
-    if col not in pivot_df.columns and col != 'Dates':
-        pivot_df[col] = 0
-
-pivot_df = pivot_df.reindex(columns=[col for col in column_order if col in pivot_df.columns])
+timer.lap("transform")
 
 st.dataframe(
-    pivot_df.style
-    .format({col: '{:.0f}' for col in ['Total Users']})
-    .format({col: '{:.2f}%' for col in pivot_df.columns if col not in ['Dates', 'Total Users']})
-    .set_properties(**{'text-align': 'right'})
-    .set_table_styles([
-        {'selector': 'th', 'props': [('text-align', 'left')]},
-        {'selector': 'td', 'props': [('text-align', 'right')]},
-    ]),
+    percentage_table_style(pivot_df),
     use_container_width=True,
     height=600
 )
+timer.lap("render")
+st.caption(usage.summary())
 
 csv = pivot_df.to_csv(index=True)
 st.download_button(
@@ -273,6 +136,42 @@ st.download_button(
     mime="text/csv",
 )
 
+# Ordered funnel over the whole date range: users count for a step only after
+# doing every earlier step in order, each within the window of the previous one
+st.header("Ordered Funnel")
+
+# One conversion window per step, the time allowed since the previous step;
+# the first step has no previous one, so it has no window
+with st.expander("Conversion windows", expanded=False):
+    window_table = st.data_editor(
+        pd.DataFrame({'Step': ONBOARDING_LABELS[1:], 'Window (minutes)': STEP_WINDOW_SECONDS // 60}),
+        column_config={
+            'Step': st.column_config.TextColumn(disabled=True),
+            'Window (minutes)': st.column_config.NumberColumn(min_value=1, step=5, required=True),
+        },
+        hide_index=True,
+        use_container_width=True,
+        key='step_window_minutes',
+    )
+window_minutes = tuple(
+    int(minutes) if pd.notna(minutes) else STEP_WINDOW_SECONDS // 60
+    for minutes in window_table['Window (minutes)']
+)
+step_windows = {label: minutes * 60 for label, minutes in zip(ONBOARDING_LABELS[1:], window_minutes)}
+
+ordered_df = memoize_transform(
+    "New User Onboarding",
+    data_watermark(sql_query, start_date, end_date),
+    lambda: new_user_ordered_funnel(filter_rows(df, filters, index=row_index), step_windows),
+    'ordered', window_minutes, start_date, end_date, filters,
+)
+timer.lap("ordered_funnel")
+
+st.dataframe(
+    percentage_table_style(ordered_df, ['Users', 'Median seconds from previous step'], '{:,.0f}'),
+    use_container_width=True,
+)
+
 
 st.header("Documentation")
 
@@ -307,6 +206,13 @@ with st.expander("Dashboard Documentation"):
     - Primary metric: Distinct count of **user_pseudo_id** for each event.
     - Calculation: (Number of unique new users for the event / Total new Users) * 100
     - All percentages are relative to the Total Users count for each date.
+
+    ### Ordered Funnel
+    The table above counts a user for every step seen that day, in any order. The ordered funnel counts a user for a step only after every earlier step was done in order (by `event_timestamp`), each within that step's conversion window of the previous one, over the whole date range. Each step's window is set in the **Conversion windows** table and defaults to the `DASHBOARD_FUNNEL_STEP_WINDOW_SECONDS` setting (24 hours).
+    - **Users**: New users reaching the step in order.
+    - **Conversion**: Share of the first step's users reaching the step.
+    - **Step conversion** / **Drop-off**: Share of the previous step's users reaching / not reaching the step.
+    - **Median seconds from previous step**: Median time users took from the previous step.
     """)
 
 with st.expander("SQL Query Documentation"):
@@ -316,6 +222,10 @@ with st.expander("SQL Query Documentation"):
 
     ```sql
     WITH
+      funnel_steps AS (SELECT * FROM UNNEST([
+        STRUCT('Splash' AS label, 'screen_load' AS event_name, 'splash_screen' AS screen_name, CAST(NULL AS STRING) AS view_id),
+        -- one row per funnel step --
+      ])),
       new_user AS (
       SELECT
         event_date,
@@ -325,7 +235,8 @@ with st.expander("SQL Query Documentation"):
           ELSE 'fresh_install'
       END AS install_type
       FROM `swap-vc-prod.analytics_325691371.events_*`
-      WHERE event_name = 'first_open' AND platform = 'ANDROID'),
+      WHERE event_name = 'first_open' AND platform = 'ANDROID'
+        AND _TABLE_SUFFIX BETWEEN @start_suffix AND @end_suffix),
       custom_events AS (
       SELECT
         user_pseudo_id,
@@ -339,6 +250,7 @@ with st.expander("SQL Query Documentation"):
         device.operating_system_version AS OS_Version
       FROM `swap-vc-prod.analytics_325691371.events_*`
       WHERE platform = 'ANDROID' AND event_name IN ('screen_load', 'view_click')
+        AND _TABLE_SUFFIX BETWEEN @start_suffix AND @end_suffix
         AND (SELECT value.string_value FROM UNNEST(event_params) WHERE KEY = 'screen_name')
           IN ('splash_screen', 'initial_login_screen', 'login_screen', 'verify_otp_screen', 'create_profile_screen', 
               'bina_savings_tode', 'dost_hain', 'to_beesi_karo_na', 'how_beesi_works', 'home_screen'))
@@ -346,20 +258,19 @@ with st.expander("SQL Query Documentation"):
       n.event_date,
       n.user_pseudo_id,
       n.install_type,
-      c.event_name,
-      c.screen_name, 
       c.App_Version,
       c.OS_Version,
       c.Country,
       c.Region,
       c.City,
       CASE
-        WHEN c.event_name = 'screen_load' AND c.screen_name = 'splash_screen' THEN 'Splash'
-        -- Additional cases for other events --
+        WHEN s.label IS NOT NULL THEN s.label
+        WHEN c.event_name IS NULL THEN 'No custom event'
         ELSE 'Other: ' || c.event_name || ' - ' || c.screen_name
       END AS Descriptive_Event
     FROM new_user AS n
     LEFT JOIN custom_events AS c ON n.user_pseudo_id = c.user_pseudo_id AND n.event_date = c.event_date
+    LEFT JOIN funnel_steps AS s ON c.event_name = s.event_name AND c.screen_name = s.screen_name
     ```
 
     ### GA4 Events and Parameters Explanation:
@@ -372,6 +283,8 @@ with st.expander("SQL Query Documentation"):
     4. **screen_name**: A custom parameter indicating the specific screen where an event occurred.
 
     ### Query Logic:
+    Both CTEs restrict `_TABLE_SUFFIX` to the selected dates (daily and intraday shards), so only those days are scanned.
+
     1. **Identifying New Users (`new_user` CTE)**:
        - Uses the 'first_open' event to identify new users.
        - Determines if it's a fresh install or reinstall based on 'previous_first_open_count'.
@@ -382,7 +295,7 @@ with st.expander("SQL Query Documentation"):
     
     3. **Joining and Categorizing Data (Main SELECT)**:
        - Combines new user data with their corresponding events.
-       - Creates a descriptive label for each interaction for easier analysis.
+       - Labels each event by joining it to `funnel_steps`, a small inline table generated from the funnel step registry (`common.funnels`), which also orders the dashboard's columns. Events of no step are labelled 'Other: event - screen'.
 
     This query enables a comprehensive view of new user behavior, tracking their journey from app installation through various onboarding screens.
     """)
@@ -396,79 +309,58 @@ with st.expander("Streamlit Page Code Documentation"):
 
     1. **BigQuery Client Setup**:
        ```python
-       credentials = service_account.Credentials.from_service_account_info(
-           st.secrets["gcp_service_account"]
-       )
-       client = bigquery.Client(credentials=credentials)
+       from common.data_access import run_query
        ```
-       Explanation: Sets up a secure connection to BigQuery using service account credentials stored in Streamlit secrets.
+       Explanation: The shared `common.data_access` module builds one BigQuery client per process from the service account credentials stored in Streamlit secrets, backed by a pooled HTTP session and a lazily created BigQuery Storage read client.
 
     2. **Query Execution**:
        ```python
-       @st.cache_data(ttl=3600)
-       def run_query(query):
-           query_job = client.query(query)
-           return query_job.to_dataframe()
+       def load_events():
+           df = run_query(sql_query, start_date, end_date, 'event_date')
+           df['event_date'] = pd.to_datetime(df['event_date'], format='%Y%m%d')
+           return df
 
-       df = run_query(sql_query)
+       df = memoize_transform("New User Onboarding", data_watermark(sql_query, start_date, end_date), load_events, 'events', start_date, end_date)
        ```
-       Explanation: Executes the SQL query against BigQuery and caches the result for an hour to improve performance.
+       Explanation: Executes the SQL query against BigQuery through the shared client for the selected dates only, and converts the date strings to datetime objects. Results are stored per day: finished days are saved locally as Parquet and never re-queried, while the last few (still changing) days are re-queried as soon as the version of their GA4 shards changes. Widening the date range only queries the days not already stored. The loaded dataframe is kept per date range and the version of those days' shards (`data_watermark` with the dates), so changing a filter does not load it again, and intraday updates to other days do not invalidate it.
 
-    3. **Data Preprocessing**:
+    3. **Filter Options and Row Index**:
        ```python
-       df['event_date'] = pd.to_datetime(df['event_date'], format='%Y%m%d')
-
-       def clean_options(options):
-           return sorted([opt for opt in options if opt is not None and opt != ''])
+       filter_options = frame_filter_options(df, sql_query, filter_columns, start_date, end_date)
+       row_index = frame_row_index(df, sql_query, filter_columns, start_date=start_date, end_date=end_date)
        ```
-       Explanation: Converts date strings to datetime objects and defines a function to clean filter options.
+       Explanation: The option index (`OptionIndex`, see `common.options`) holds each filter column's sorted values, and the row index (`RowIndex`, see `common.row_index`) the rows holding each value. Both are built once per date range and data version and shared by every rerun and viewer.
 
     4. **Filtering Mechanism**:
        ```python
-       start_date = st.date_input("Start Date", value=df['event_date'].min().date())
-       end_date = st.date_input("End Date", value=df['event_date'].max().date())
+       start_date = st.date_input("Start Date", value=default_start_date)
+       end_date = st.date_input("End Date", value=default_end_date)
 
-       os_version_filter = st.multiselect('OS Version', options=os_version_options)
-       app_version_filter = st.multiselect('App Version', options=app_version_options)
-       install_type_filter = st.multiselect('Install Type', options=install_type_options)
+       os_version_filter = st.multiselect('OS Version', options=filter_options.options('OS_Version'))
+       app_version_filter = st.multiselect('App Version', options=filter_options.options('App_Version'))
+       install_type_filter = st.multiselect('Install Type', options=filter_options.options('install_type'))
+       # ... (similar for country, region and city)
 
-       df = df[(df['event_date'].dt.date >= start_date) & (df['event_date'].dt.date <= end_date)]
-       if install_type_filter:
-           df = df[df['install_type'].isin(install_type_filter)]
-       # Additional filter applications...
+       filter_rows(df, filters, index=row_index)
        ```
-       Explanation: Creates interactive filters for date range, OS version, app version, and install type, then applies these filters to the dataframe.
+       Explanation: Creates interactive filters for date range, OS version, app version, install type and location. The date range is applied in the query itself; the other selections are applied through the row index by combining row positions, instead of scanning the dataframe once per filter.
 
     5. **Data Transformation and Display**:
        ```python
-       pivot_df = df.pivot_table(
-           values='user_pseudo_id',
-           index='event_date',
-           columns='Descriptive_Event',
-           aggfunc='nunique',
-           fill_value=0
+       pivot_df = memoize_transform(
+           "New User Onboarding",
+           data_watermark(sql_query, start_date, end_date),
+           lambda: new_user_funnel(filter_rows(df, filters, index=row_index), column_order),
+           start_date, end_date, filters,
        )
 
-       pivot_df['Total Users'] = df.groupby('event_date')['user_pseudo_id'].nunique()
-
-       for col in pivot_df.columns:
-           if col != 'Total Users':
-               pivot_df[f'{col} (%)'] = pivot_df[col] / pivot_df['Total Users'] * 100
-
        st.dataframe(
-           pivot_df.style
-           .format({col: '{:.0f}' for col in ['Total Users']})
-           .format({col: '{:.2f}%' for col in pivot_df.columns if col not in ['Dates', 'Total Users']})
-           .set_properties(**{'text-align': 'right'})
-           .set_table_styles([
-               {'selector': 'th', 'props': [('text-align', 'left')]},
-               {'selector': 'td', 'props': [('text-align', 'right')]},
-           ]),
+           percentage_table_style(pivot_df),
            use_container_width=True,
            height=600
        )
        ```
-       Explanation: Pivots the dataframe to show unique users per event per day, calculates percentages, and displays the result in a formatted Streamlit dataframe.
+       Explanation: `new_user_funnel` counts unique users per event per day, and per day, with `distinct_pivot` (see `common.distinct`), which counts integer user codes instead of hashing user IDs per cell; it then turns the counts into percentages of the day's users in funnel order. The table is kept per data version and selections until the source tables change.
 
     6. **Data Download Feature**:
        ```python
@@ -482,4 +374,6 @@ with st.expander("Streamlit Page Code Documentation"):
        ```
        Explanation: Provides a button to download the displayed data as a CSV file.
 
-""")
\ No newline at end of file
+""")
+
+timer.finish()
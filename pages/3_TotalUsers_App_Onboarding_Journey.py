@@ -1,10 +1,19 @@
 import streamlit as st
 import pandas as pd
-from google.oauth2 import service_account
-from google.cloud import bigquery
+from common.data_access import data_watermark, default_date_range, load_filter_options, run_query
+from common import queries
+from common.funnels import TOTAL_USERS_COLUMNS
+from common.budget import stop_over_budget
+from common.memo import memoize_transform
+from common.timing import start_page
+from common.filters import narrow, normalize_filters
+from common.hll import count_distinct_by, relative_error
+from common.transforms import distinct_users_pivot, percentage_table_style, total_users_funnel
 
 st.set_page_config(page_title="Android App Total User Events Dashboard", page_icon="📊", layout="wide", initial_sidebar_state="collapsed")
 
+usage, timer = start_page("Total User Onboarding")
+
 # if st.button("← Back to Home"):
 #     st.switch_page("home.py")
 
@@ -30,175 +39,145 @@ st.markdown("""
 
 st.title("Android App Total User Events Dashboard")
 
-credentials = service_account.Credentials.from_service_account_info(
-    st.secrets["gcp_service_account"]
-)
-client = bigquery.Client(credentials=credentials)
-
-@st.cache_data(ttl=3600)
-def run_query(query):
-    query_job = client.query(query)
-    return query_job.to_dataframe()
-
-sql_query = """
-  SELECT
-    event_date AS Dates,
-    user_pseudo_id AS User_ID,
-    geo.country as Country,
-    geo.region as Region,
-    geo.city as City,
-    app_info.version as App_Version,
-    device.operating_system_version as OS_Version,
-    CASE
-      WHEN event_name = 'screen_load' AND (SELECT value.string_value FROM UNNEST(event_params) WHERE KEY = 'screen_name') = 'splash_screen' THEN 'Splash'
-      WHEN event_name = 'screen_load' AND (SELECT value.string_value FROM UNNEST(event_params) WHERE KEY = 'screen_name') = 'initial_login_screen' THEN 'Initial login screen'
-      WHEN event_name = 'view_click' AND (SELECT value.string_value FROM UNNEST(event_params) WHERE KEY = 'screen_name') = 'initial_login_screen' THEN 'User click on login button'
-      WHEN event_name = 'screen_load' AND (SELECT value.string_value FROM UNNEST(event_params) WHERE KEY = 'screen_name') = 'login_screen' THEN 'Login screen load'
-      WHEN event_name = 'view_click' AND (SELECT value.string_value FROM UNNEST(event_params) WHERE KEY = 'screen_name') = 'login_screen' THEN 'User click on continue button after login screen'
-      WHEN event_name = 'screen_load' AND (SELECT value.string_value FROM UNNEST(event_params) WHERE KEY = 'screen_name') = 'verify_otp_screen' THEN 'Land on OTP screen'
-      WHEN event_name = 'view_click' AND (SELECT value.string_value FROM UNNEST(event_params) WHERE KEY = 'screen_name') = 'verify_otp_screen' THEN 'User click on continue button after otp'
-      WHEN event_name = 'screen_load' AND (SELECT value.string_value FROM UNNEST(event_params) WHERE KEY = 'screen_name') = 'create_profile_screen' THEN 'Profile Screen'
-      WHEN event_name = 'view_click' AND (SELECT value.string_value FROM UNNEST(event_params) WHERE KEY = 'screen_name') = 'create_profile_screen' THEN 'User click on Continue button after profile screen'
-      WHEN event_name = 'screen_load' AND (SELECT value.string_value FROM UNNEST(event_params) WHERE KEY = 'screen_name') = 'bina_savings_tode' THEN 'User land on Bina Savings tode screen'
-      WHEN event_name = 'view_click' AND (SELECT value.string_value FROM UNNEST(event_params) WHERE KEY = 'screen_name') = 'bina_savings_tode' THEN 'User clicks on Yes But kaise'
-      WHEN event_name = 'screen_load' AND (SELECT value.string_value FROM UNNEST(event_params) WHERE KEY = 'screen_name') = 'dost_hain' THEN 'User land on Dost hain Screen'
-      WHEN event_name = 'view_click' AND (SELECT value.string_value FROM UNNEST(event_params) WHERE KEY = 'screen_name') = 'dost_hain' THEN 'User clicks on haan dost hain'
-      WHEN event_name = 'screen_load' AND (SELECT value.string_value FROM UNNEST(event_params) WHERE KEY = 'screen_name') = 'to_beesi_karo_na' THEN 'User land on To Beesi Karo na Screen'
-      WHEN event_name = 'view_click' AND (SELECT value.string_value FROM UNNEST(event_params) WHERE KEY = 'screen_name') = 'to_beesi_karo_na' THEN 'User clicks on nice'
-      WHEN event_name = 'screen_load' AND (SELECT value.string_value FROM UNNEST(event_params) WHERE KEY = 'screen_name') = 'how_beesi_works' THEN 'User land on How Beesi Works Screen'
-      WHEN event_name = 'view_click' AND (SELECT value.string_value FROM UNNEST(event_params) WHERE KEY = 'screen_name') = 'how_beesi_works' THEN 'User clicks on got it btn'
-      WHEN event_name = 'screen_load' AND (SELECT value.string_value FROM UNNEST(event_params) WHERE KEY = 'screen_name') = 'home_screen' THEN 'User lands on Home Screen'
-      WHEN event_name IS NULL THEN 'No custom event'
-      ELSE 'Other: ' || event_name || ' - ' || (SELECT value.string_value FROM UNNEST(event_params) WHERE KEY = 'screen_name')
-    END AS App_Event
-  FROM
-    `swap-vc-prod.analytics_325691371.events_*`
-  WHERE
-    platform = 'ANDROID'
-"""
-
-df = run_query(sql_query)
-df['Dates'] = pd.to_datetime(df['Dates'], format='%Y%m%d')
-
-# Function to clean options
-def clean_options(options):
-    return sorted([opt for opt in options if opt is not None and opt != ''])
+# Raw event rows, the exact per-step aggregate and the HLL sketches; see
+# common.queries
+sql_query = queries.TOTAL_USERS_ONBOARDING_QUERY
+aggregate_query = queries.TOTAL_USERS_AGGREGATE_QUERY
+sketch_query = queries.TOTAL_USERS_SKETCH_QUERY
+
+# Columns whose filters are pushed down into the query as array parameters
+filter_columns = queries.TOTAL_USERS_ONBOARDING_FILTERS
 
 # Create columns for filter categories
 col1, col2 = st.columns(2)
 
+default_start_date, default_end_date = default_date_range()
+
 # Date Filter
 with col1:
     with st.expander("Date Filter", expanded=True):
-        start_date = st.date_input("Start Date", value=df['Dates'].min(), key='event_start_date')
-        end_date = st.date_input("End Date", value=df['Dates'].max(), key='event_end_date')
+        start_date = st.date_input("Start Date", value=default_start_date, key='event_start_date')
+        end_date = st.date_input("End Date", value=default_end_date, key='event_end_date')
+
+# Options list every value in the selected days, not just the filtered rows
+with stop_over_budget():
+    filter_options = load_filter_options(sql_query, start_date, end_date, 'Dates', filter_columns)
+timer.lap("filter_options")
 
 # Other Filters
 with col2:
     with st.expander("Version Filters", expanded=True):
-        os_version_options = clean_options(df['OS_Version'].unique())
+        os_version_options = filter_options.options('OS_Version')
         os_version_filter = st.multiselect('OS Version', options=os_version_options, key='os_version_filter')
-        app_version_options = clean_options(df['App_Version'].unique())
+        app_version_options = filter_options.options('App_Version')
         app_version_filter = st.multiselect('App Version', options=app_version_options, key='app_version_filter')
 
 # Location Filter
 with st.expander("Location Filter", expanded=True):
     col1, col2, col3 = st.columns(3)
     with col1:
-        country_options = clean_options(df['Country'].unique())
+        country_options = filter_options.options('Country')
         country_filter = st.multiselect('Country', options=country_options, key='country_filter')
     with col2:
-        region_options = clean_options(df['Region'].unique())
+        region_options = filter_options.options('Region')
         region_filter = st.multiselect('Region', options=region_options, key='region_filter')
     with col3:
-        city_options = clean_options(df['City'].unique())
+        city_options = filter_options.options('City')
         city_filter = st.multiselect('City', options=city_options, key='city_filter')
 
-# Apply filters
-df = df[(df['Dates'].dt.date >= start_date) & (df['Dates'].dt.date <= end_date)]
-
-if country_filter:
-    df = df[df['Country'].isin(country_filter)]
-if region_filter:
-    df = df[df['Region'].isin(region_filter)]
-if city_filter:
-    df = df[df['City'].isin(city_filter)]
-if os_version_filter:
-    df = df[df['OS_Version'].isin(os_version_filter)]
-if app_version_filter:
-    df = df[df['App_Version'].isin(app_version_filter)]
-
-# Add a default value for empty App_Events
-df['App_Event'] = df['App_Event'].fillna('No Event')
-
-# Create pivot table
-pivot_df = df.pivot_table(
-    values='User_ID',
-    index='Dates',
-    columns='App_Event',
-    aggfunc='nunique',
-    fill_value=0
+approximate_mode = st.toggle(
+    "Approximate counts (HLL sketches)",
+    key='approximate_mode',
+    help=f"Instant filtering from pre-aggregated sketches; counts are within ±{2 * relative_error():.2%} (95% confidence).",
 )
 
-# Add Total Users column
-pivot_df['Total Users'] = df.groupby('Dates')['User_ID'].nunique()
-
-# Define column order
-column_order = [
-    'Total Users',
-    'Splash',
-    'Initial login screen',
-    'User click on login button',
-    'Login screen load',
-    'User click on continue button after login screen',
-    'Land on OTP screen',
-    'User click on continue button after otp',
-    'Profile Screen',
-    'User click on Continue button after profile screen',
-    'User land on Bina Savings tode screen',
-    'User clicks on Yes But kaise',
-    'User land on Dost hain Screen',
-    'User clicks on haan dost hain',
-    'User land on To Beesi Karo na Screen',
-    'User clicks on nice',
-    'User land on How Beesi Works Screen',
-    'User clicks on got it btn',
-    'User lands on Home Screen',
-    'No Event',
-    'No custom event'
-]
-
-# Ensure all columns are present, add missing ones with 0s
-for col in column_order:
-    if col not in pivot_df.columns:
-        pivot_df[col] = 0
-
-# Reorder columns
-pivot_df = pivot_df.reindex(columns=[col for col in column_order if col in pivot_df.columns])
-
-# Calculate percentages
-for col in pivot_df.columns:
-    if col != 'Total Users':
-        pivot_df[col] = (pivot_df[col] / pivot_df['Total Users']).fillna(0) * 100
-
-# Format the pivot table
-pivot_df = pivot_df.sort_index(ascending=False)
-pivot_df.index = pivot_df.index.strftime('%Y-%m-%d')
-pivot_df.index.name = 'Dates'
+# Raw rows mode downloads every event row and counts users locally; it is
+# much slower and only meant for debugging the aggregate
+with st.expander("Debug", expanded=False):
+    raw_rows_mode = st.toggle("Raw rows mode", key='raw_rows_mode')
+
+filters = {
+    'Country': country_filter,
+    'Region': region_filter,
+    'City': city_filter,
+    'OS_Version': os_version_filter,
+    'App_Version': app_version_filter,
+}
+
+# Funnel steps in order (see common.funnels)
+column_order = TOTAL_USERS_COLUMNS
+
+# Counts per day and step for the selected mode, as shares of the day's
+# users; the table is shared by every rerun and viewer with the same mode,
+# days, data version and selections
+def build_table():
+    if raw_rows_mode:
+        # Apply filters: only the selected days and matching rows are fetched from
+        # BigQuery, or narrowed in pandas from an already cached superset
+        df = run_query(sql_query, start_date, end_date, 'Dates', filters)
+        timer.lap("load")
+        df['Dates'] = pd.to_datetime(df['Dates'], format='%Y%m%d')
+
+        # Add a default value for empty App_Events
+        df['App_Event'] = df['App_Event'].fillna('No Event')
+
+        # Create pivot table, with a Total Users column
+        pivot_df = distinct_users_pivot(df, 'Dates', 'App_Event', 'User_ID')
+    elif approximate_mode:
+        # Sketches are always fetched unfiltered and narrowed locally
+        sketch_df = run_query(sketch_query, start_date, end_date, 'Dates', {name: [] for name in filter_columns})
+        timer.lap("load")
+        sketch_df = narrow(sketch_df, (), normalize_filters(filters))
+        counts_df = count_distinct_by(sketch_df, ['Dates', 'App_Event'], 'user_sketch').reset_index(name='Users')
+        counts_df['Dates'] = pd.to_datetime(counts_df['Dates'], format='%Y%m%d')
+
+        # Create pivot table (one count per cell, 'Total Users' included)
+        pivot_df = counts_df.pivot_table(
+            values='Users',
+            index='Dates',
+            columns='App_Event',
+            aggfunc='sum',
+            fill_value=0,
+            observed=True
+        )
+    else:
+        # Distinct counts cannot be re-aggregated, so the aggregate is always
+        # computed for exactly the selected filters
+        counts_df = run_query(aggregate_query, start_date, end_date, 'Dates', filters, exact_filters=True)
+        timer.lap("load")
+        counts_df['Dates'] = pd.to_datetime(counts_df['Dates'], format='%Y%m%d')
+
+        # Create pivot table (one count per cell, 'Total Users' included)
+        pivot_df = counts_df.pivot_table(
+            values='Users',
+            index='Dates',
+            columns='App_Event',
+            aggfunc='sum',
+            fill_value=0,
+            observed=True
+        )
+
+    # Percentages of the day's users, in column order
+    return total_users_funnel(pivot_df, column_order)
+
+with stop_over_budget():
+    pivot_df = memoize_transform(
+        "Total User Onboarding",
+        data_watermark(sql_query, start_date, end_date),
+        build_table,
+        'raw' if raw_rows_mode else 'approximate' if approximate_mode else 'exact',
+        start_date, end_date, filters,
+    )
+timer.lap("transform")
 
 # Display the pivot table
 st.dataframe(
-    pivot_df.style
-    .format({col: '{:.0f}' for col in ['Total Users']})
-    .format({col: '{:.2f}%' for col in pivot_df.columns if col != 'Total Users'})
-    .set_properties(**{'text-align': 'right'})
-    .set_table_styles([
-        {'selector': 'th', 'props': [('text-align', 'left')]},
-        {'selector': 'td', 'props': [('text-align', 'right')]},
-    ]),
+    percentage_table_style(pivot_df),
     use_container_width=True,
     height=600
 )
+timer.lap("render")
+st.caption(usage.summary())
 
 # Download button
 csv = pivot_df.to_csv(index=True)
@@ -242,6 +221,11 @@ with st.expander("Dashboard Documentation"):
 
     ### Calculations
     For each event: (Number of unique users for the event / Total Users) * 100
+
+    ### Approximate counts
+    With "Approximate counts (HLL sketches)" enabled, BigQuery returns one `HLL_COUNT.INIT` sketch of users per date, event and (Country, Region, City, OS Version, App Version) combination. The sketches for the selected filters are merged in the app, so changing filters does not run a new query.
+    - Error bound: HyperLogLog++ at precision 15 has a relative standard error of 1.04 / √32768 ≈ 0.57%, so counts are within about ±1.15% at 95% confidence.
+    - Small counts (up to tens of thousands of users per cell) are counted at the sparse precision of 20 and are practically exact.
     """)
 
 with st.expander("SQL Query Documentation"):
@@ -249,25 +233,38 @@ with st.expander("SQL Query Documentation"):
     ### Query:
     ```sql
     SELECT
-      event_date AS Dates,
-      user_pseudo_id AS User_ID,
-      geo.country as Country,
-      geo.region as Region,
-      geo.city as City,
-      app_info.version as App_Version,
-      device.operating_system_version as OS_Version,
+      e.Dates, e.User_ID, e.Country, e.Region, e.City, e.App_Version, e.OS_Version,
       CASE
-        WHEN event_name = 'screen_load' AND (SELECT value.string_value FROM UNNEST(event_params) WHERE KEY = 'screen_name') = 'splash_screen' THEN 'Splash'
-        WHEN event_name = 'screen_load' AND (SELECT value.string_value FROM UNNEST(event_params) WHERE KEY = 'screen_name') = 'initial_login_screen' THEN 'Initial login screen'
-        WHEN event_name = 'view_click' AND (SELECT value.string_value FROM UNNEST(event_params) WHERE KEY = 'screen_name') = 'initial_login_screen' THEN 'User click on login button'
-        -- ... (other cases) ...
-        WHEN event_name IS NULL THEN 'No custom event'
-        ELSE 'Other: ' || event_name || ' - ' || (SELECT value.string_value FROM UNNEST(event_params) WHERE KEY = 'screen_name')
+        WHEN s.label IS NOT NULL THEN s.label
+        WHEN e.event_name IS NULL THEN 'No custom event'
+        ELSE 'Other: ' || e.event_name || ' - ' || e.screen_name
       END AS App_Event
-    FROM
-      `swap-vc-prod.analytics_325691371.complete_ga4_data`
-    WHERE
-      platform = 'ANDROID'
+    FROM (
+      SELECT
+        event_date AS Dates,
+        user_pseudo_id AS User_ID,
+        geo.country as Country,
+        geo.region as Region,
+        geo.city as City,
+        app_info.version as App_Version,
+        device.operating_system_version as OS_Version,
+        event_name,
+        (SELECT value.string_value FROM UNNEST(event_params) WHERE KEY = 'screen_name') AS screen_name
+      FROM
+        `swap-vc-prod.analytics_325691371.events_*`
+      WHERE
+        platform = 'ANDROID'
+        AND _TABLE_SUFFIX BETWEEN @start_suffix AND @end_suffix
+        AND (ARRAY_LENGTH(@Country) = 0 OR geo.country IN UNNEST(@Country))
+        -- ... (same for Region, City, OS_Version, App_Version) ...
+    ) AS e
+    LEFT JOIN (
+      SELECT * FROM UNNEST([
+        STRUCT('Splash' AS label, 'screen_load' AS event_name, 'splash_screen' AS screen_name, CAST(NULL AS STRING) AS view_id),
+        -- ... (one row per funnel step) ...
+      ])
+    ) AS s
+    ON e.event_name = s.event_name AND e.screen_name = s.screen_name
     ```
 
     ### Attributes:
@@ -279,7 +276,12 @@ with st.expander("SQL Query Documentation"):
     6. **App_Event**: Descriptive name of the event based on event_name and screen_name.
 
     ### Query Logic:
+    - By default the query is wrapped in an aggregate that counts distinct users per date and App_Event in BigQuery (`GROUP BY GROUPING SETS ((Dates, App_Event), (Dates))`), so only the small count table is downloaded. The "Raw rows mode" debug toggle downloads the event rows instead.
     - The query selects data from the complete_ga4_data table for Android platform.
-    - It uses a CASE statement to categorize different events based on event_name and screen_name.
+    - Events are labelled by joining them to a small inline table of funnel steps (event_name, screen_name → label) generated from the step registry in `common.funnels`, which also orders the dashboard's columns; `screen_name` is extracted once per row. Events of no step are labelled 'Other: event - screen'.
     - Location and version information are included for filtering purposes.
-    """)
\ No newline at end of file
+    - `_TABLE_SUFFIX` is restricted to the selected dates, so only those days are scanned.
+    - Location and version filters are passed as array parameters; an empty selection means no filter.
+    """)
+
+timer.finish()
@@ -1,11 +1,16 @@
 import streamlit as st
 import pandas as pd
-from google.oauth2 import service_account
-from google.cloud import bigquery
-import asyncio
+from common.data_access import data_watermark, frame_filter_options, frame_row_index, run_queries
+from common import queries
+from common.budget import stop_over_budget
+from common.memo import memoize_transform
+from common.timing import start_page
+from common.transforms import filter_events, striped_table_style, webapp_event_pivot
 
 st.set_page_config(page_title="WebApp User Analytics Dashboard", page_icon="📊", layout="wide", initial_sidebar_state="collapsed")
 
+usage, timer = start_page("Web App All Users")
+
 # if st.button("← Back to Home"):
 #     st.switch_page("home.py")
 
@@ -29,75 +34,13 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-# Set up Google Cloud credentials
-def get_bigquery_client():
-    try:
-        credentials = service_account.Credentials.from_service_account_info(
-            st.secrets["gcp_service_account"]
-        )
-        return bigquery.Client(credentials=credentials)
-    except Exception as e:
-        st.error(f"Failed to set up BigQuery client: {str(e)}")
-        return None
-
-client = get_bigquery_client()
-
-if client is None:
-    st.error("Unable to proceed without BigQuery client. Please check your credentials and try again.")
-    st.stop()
-
-# Asynchronous query execution
-async def run_query_async(query):
-    query_job = client.query(query)
-    while True:
-        query_job.reload()
-        if query_job.state == 'DONE':
-            if query_job.error_result:
-                raise Exception(query_job.error_result)
-            break
-        await asyncio.sleep(1)
-    return query_job.to_dataframe()
-
-# Your event_query goes here (removed for brevity)
-event_query = """
-SELECT
-    COALESCE(CAST(t1.Dates AS STRING), CAST(CURRENT_DATE() AS STRING)) AS Dates,
-    t1.Event_Name,
-    COALESCE(t1.Device, 'Unknown') AS Device,
-    COALESCE(t1.Country, 'Unknown') AS Country,
-    COALESCE(t1.Region, 'Unknown') AS Region,
-    COALESCE(t1.City, 'Unknown') AS City,
-    t1.User_ID as User_ID,
-    (CASE 
-        WHEN t1.Dates = t2.Dates THEN 'New User'
-        ELSE 'Returning User'
-    END) as User_Type
-FROM
-    `swap-vc-prod.analytics_325691371.WebApp_UserData` AS t1
-LEFT JOIN 
-    `swap-vc-prod.analytics_325691371.New_User` AS t2
-ON
-    t1.User_ID = t2.User_ID 
-WHERE
-    t1.Event_Name IN (
-        'home_page_view',
-        'Open_App_Playstore',
-        'Open_App_Appstore',
-        'Open_App_Yes_But_Kaise',
-        'Open_App_Haan_Dost_Hain',
-        'Open_App_Nudge_Floating',
-        'Open_App_Nudge_1',
-        'Open_App_Nudge_2',
-        'Open_App_Whatsapp_Share_App_With_Friends'
-    )
-"""
-
-@st.cache_data(ttl=3600) 
-def get_processed_data():
-    # Execute query
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
-    event_df = loop.run_until_complete(run_query_async(event_query))
+event_query = queries.WEBAPP_EVENTS_QUERY
+
+# Cached until WebApp_UserData or New_User change
+@st.cache_data(max_entries=2)
+def get_processed_data(watermark):
+    # Execute query on the shared executor
+    event_df = run_queries({'event_df': event_query})['event_df']
     
     # Process data
     event_df['Dates'] = pd.to_datetime(event_df['Dates'])
@@ -105,14 +48,20 @@ def get_processed_data():
     return event_df
 
 # Get the processed data
-event_df = get_processed_data()
+with stop_over_budget():
+    event_df = get_processed_data(data_watermark(event_query))
+timer.lap("load")
 
 # Event Analytics
 st.header("WebApp Event Analytics")
 
-# Function to clean filter options
-def clean_options(options):
-    return sorted([opt for opt in options if opt and str(opt).lower() not in ['none', 'unknown', 'nan']])
+# Sorted options and matching rows per filter and day, indexed once per data
+# version; placeholder values are not offered
+filter_columns = ['Device', 'User_Type', 'Country', 'Region', 'City']
+hidden_options = ('none', 'unknown', 'nan')
+filter_options = frame_filter_options(event_df, event_query, filter_columns)
+row_index = frame_row_index(event_df, event_query, filter_columns, 'Dates')
+timer.lap("filter_options")
 
 # Create columns for filter categories
 col1, col2 = st.columns(2)
@@ -126,74 +75,55 @@ with col1:
 # Other Filters
 with col2:
     with st.expander("Other Filters", expanded=True):
-        device_options = clean_options(event_df['Device'].unique())
+        device_options = filter_options.options('Device', hidden_options)
         device_filter = st.multiselect('Device', options=device_options, key='device_filter')
-        user_type_options = clean_options(event_df['User_Type'].unique())
+        user_type_options = filter_options.options('User_Type', hidden_options)
         user_type_filter_event = st.multiselect('User Type', options=user_type_options, key='user_type_filter_event')
 
 # Location Filter
 with st.expander("Location Filter", expanded=True):
     col1, col2, col3 = st.columns(3)
     with col1:
-        country_options = clean_options(event_df['Country'].unique())
+        country_options = filter_options.options('Country', hidden_options)
         country_filter = st.multiselect('Country', options=country_options, key='country_filter')
     with col2:
-        region_options = clean_options(event_df['Region'].unique())
+        region_options = filter_options.options('Region', hidden_options)
         region_filter = st.multiselect('Region', options=region_options, key='region_filter')
     with col3:
-        city_options = clean_options(event_df['City'].unique())
+        city_options = filter_options.options('City', hidden_options)
         city_filter = st.multiselect('City', options=city_options, key='city_filter')
 
-# Apply filters for Event Analytics
-mask_event = (event_df['Dates'].dt.date >= start_date_event) & (event_df['Dates'].dt.date <= end_date_event)
-if country_filter:
-    mask_event &= event_df['Country'].fillna('Unknown').isin(country_filter)
-if region_filter:
-    mask_event &= event_df['Region'].fillna('Unknown').isin(region_filter)
-if city_filter:
-    mask_event &= event_df['City'].fillna('Unknown').isin(city_filter)
-if device_filter:
-    mask_event &= event_df['Device'].fillna('Unknown').isin(device_filter)
-if user_type_filter_event:
-    mask_event &= event_df['User_Type'].fillna('Unknown').isin(user_type_filter_event)
-
-filtered_event_df = event_df[mask_event].copy()
-
-# Process data for Event Analytics
-pivot_df = filtered_event_df.pivot_table(
-    values='User_ID',
-    index='Dates',
-    columns='Event_Name',
-    aggfunc=lambda x: len(x.unique()),
-    fill_value=0
-)
-
-pivot_df = pivot_df.sort_index(ascending=False)
-pivot_df.index = pivot_df.index.strftime('%Y-%m-%d')
-pivot_df.index.name = 'Dates'
+event_filters = {
+    'Country': country_filter,
+    'Region': region_filter,
+    'City': city_filter,
+    'Device': device_filter,
+    'User_Type': user_type_filter_event,
+}
 
+# Apply filters and process data for Event Analytics; the table is shared by
+# every rerun and viewer with the same data version and selections
 column_order = ['home_page_view', 'Open_App_Appstore', 'Open_App_Playstore',
                 'Open_App_Yes_But_Kaise', 'Open_App_Haan_Dost_Hain',
                 'Open_App_Nudge_1', 'Open_App_Nudge_2', 'Open_App_Nudge_Floating',
                 'Open_App_Whatsapp_Share_App_With_Friends']
-pivot_df = pivot_df.reindex(columns=column_order)
+pivot_df = memoize_transform(
+    "Web App All Users",
+    data_watermark(event_query),
+    lambda: webapp_event_pivot(filter_events(event_df, start_date_event, end_date_event, event_filters, index=row_index), column_order),
+    start_date_event, end_date_event, event_filters,
+)
 
 # Style the dataframe
 def style_dataframe(df):
-    return df.style.set_properties(**{
-        'background-color': '#f0f2f6',
-        'color': 'black',
-        'border-color': 'white',
-        'text-align': 'center'
-    }).set_table_styles([
-        {'selector': 'th', 'props': [('background-color', '#4e73df'), ('color', 'white')]},
-        {'selector': 'tr:nth-of-type(even)', 'props': [('background-color', '#e6e9f0')]},
-        {'selector': 'td', 'props': [('padding', '10px')]},
-    ]).format('{:,.0f}')
+    return striped_table_style(df, '{:,.0f}')
 
 styled_event_df = style_dataframe(pivot_df)
+timer.lap("transform")
 
 st.dataframe(styled_event_df, width=1500, height=500)
+timer.lap("render")
+st.caption(usage.summary())
 
 # Download button for event data
 csv_event = pivot_df.to_csv(index=True)
@@ -288,76 +218,52 @@ with st.expander("Streamlit Page Code Documentation"):
 
     ### Data Flow and Manipulations:
 
-    1. **BigQuery Client Setup**:
+    1. **Concurrent Query Execution**:
        ```python
-       def get_bigquery_client():
-           credentials = service_account.Credentials.from_service_account_info(
-               st.secrets["gcp_service_account"]
-           )
-           return bigquery.Client(credentials=credentials)
+       from common.data_access import run_queries
        ```
-       Explanation: Establishes a secure connection to BigQuery using service account credentials.
+       Explanation: `run_queries` submits BigQuery jobs to a shared worker pool and collects the results as each job finishes. Workers wait on BigQuery's long-polling result call rather than polling on a fixed interval, so several queries run in parallel without blocking on each other.
 
-    2. **Asynchronous Query Execution**:
+    2. **Data Retrieval and Caching**:
        ```python
-       async def run_query_async(query):
-           query_job = client.query(query)
-           while True:
-               query_job.reload()
-               if query_job.state == 'DONE':
-                   if query_job.error_result:
-                       raise Exception(query_job.error_result)
-                   break
-               await asyncio.sleep(1)
-           return query_job.to_dataframe()
-       ```
-       Explanation: Executes BigQuery queries asynchronously, allowing for better performance with large datasets.
-
-    3. **Data Retrieval and Caching**:
-       ```python
-       @st.cache_data(ttl=3600) 
-       def get_processed_data():
-           loop = asyncio.new_event_loop()
-           asyncio.set_event_loop(loop)
-           event_df = loop.run_until_complete(run_query_async(event_query))
+       @st.cache_data(max_entries=2)
+       def get_processed_data(watermark):
+           event_df = run_queries({'event_df': event_query})['event_df']
            event_df['Dates'] = pd.to_datetime(event_df['Dates'])
            return event_df
        ```
-       Explanation: Retrieves and processes data, caching results for an hour to improve performance.
+       Explanation: Retrieves and processes data. `watermark` is the version of the source tables from `data_watermark(event_query)`, so the cached result is reused until `WebApp_UserData` or `New_User` actually change.
 
-    4. **Filtering Mechanism**:
+    3. **Filtering Mechanism**:
        ```python
-       def clean_options(options):
-           return sorted([opt for opt in options if opt and str(opt).lower() not in ['none', 'unknown', 'nan']])
+       filter_options = frame_filter_options(event_df, event_query, filter_columns)
+       row_index = frame_row_index(event_df, event_query, filter_columns, 'Dates')
 
        # Date Filter
        start_date_event = st.date_input("Start Date", value=event_df['Dates'].min())
        end_date_event = st.date_input("End Date", value=event_df['Dates'].max())
 
        # Other Filters (Device, User Type, Location)
+       device_options = filter_options.options('Device', hidden_options)
        device_filter = st.multiselect('Device', options=device_options)
-       user_type_filter_event = st.multiselect('User Type', options=user_type_options)
-       country_filter = st.multiselect('Country', options=country_options)
-       # ... (similar for region and city)
+       # ... (similar for user type, country, region and city)
        ```
-       Explanation: Creates interactive filters for date range, device, user type, and location, cleaning options to remove irrelevant entries.
+       Explanation: The option index (`OptionIndex`, see `common.options`) holds each filter column's sorted values and row counts, built once per data version; `options` leaves out placeholders such as 'none', 'unknown' and 'nan'. The row index (`RowIndex`, see `common.row_index`) holds the rows of every value and day, so a combination of selections is applied by combining row positions instead of scanning the dataframe once per filter.
 
-    5. **Data Transformation and Display**:
+    4. **Data Transformation and Display**:
        ```python
-       pivot_df = filtered_event_df.pivot_table(
-           values='User_ID',
-           index='Dates',
-           columns='Event_Name',
-           aggfunc=lambda x: len(x.unique()),
-           fill_value=0
+       pivot_df = memoize_transform(
+           "Web App All Users",
+           data_watermark(event_query),
+           lambda: webapp_event_pivot(filter_events(event_df, start_date_event, end_date_event, event_filters, index=row_index), column_order),
+           start_date_event, end_date_event, event_filters,
        )
-       # ... (additional formatting)
        styled_event_df = style_dataframe(pivot_df)
        st.dataframe(styled_event_df, width=1500, height=500)
        ```
-       Explanation: Pivots the dataframe to show unique users per event per day, applies custom styling, and displays in Streamlit.
+       Explanation: `webapp_event_pivot` counts unique users per event per day with `distinct_pivot` (see `common.distinct`), which counts integer user codes instead of hashing user IDs per cell. The table is kept per data version and selections, so switching back to a selection, or another viewer opening it, reuses it until the source tables change.
 
-    6. **Data Download Feature**:
+    5. **Data Download Feature**:
        ```python
        csv_event = pivot_df.to_csv(index=True)
        st.download_button(
@@ -369,4 +275,6 @@ with st.expander("Streamlit Page Code Documentation"):
        ```
        Explanation: Provides a button to download the displayed data as a CSV file.
 
-""")
\ No newline at end of file
+""")
+
+timer.finish()